@@ -1,11 +1,12 @@
-from typing import List, Dict
-import statistics, math, time
-from collections import defaultdict, deque
+from typing import List, Dict, Optional
+from collections import OrderedDict
+from threading import Lock
+import math, os, time
 
-# Sliding windows for frequency analysis
-packet_times = deque(maxlen=1000)
-src_port_map = defaultdict(set)
-src_timestamps = defaultdict(list)
+from . import metrics
+from .rules import RuleEngine, rule_engine
+
+BURST_MAX_SOURCES = int(os.getenv("BURST_MAX_SOURCES", 50000))
 
 def shannon_entropy(data: str) -> float:
     """Compute Shannon entropy of a hex string payload."""
@@ -24,63 +25,140 @@ def shannon_entropy(data: str) -> float:
         entropy -= p * math.log2(p)
     return entropy
 
-def detect_anomalies(packets: List[Dict]) -> List[Dict]:
-    alerts = []
-    now = time.time()
+def histogram_entropy(counts, n: int) -> float:
+    """Entropy in bits per byte of a 256-bin byte histogram holding ``n`` bytes.
 
-    if not packets:
-        return alerts
+    Miller-Madow corrected: the plain estimate reads low on small samples
+    (random bytes score ~7.2 over 256 bytes rather than 8).
+    """
+    if n <= 0:
+        return 0.0
+    entropy = 0.0
+    seen = 0
+    for c in counts:
+        if c:
+            p = c / n
+            entropy -= p * math.log2(p)
+            seen += 1
+    return entropy + (seen - 1) / (2 * n * math.log(2))
 
-    # 1. Large packet detection
-    sizes = [p["length"] for p in packets if "length" in p]
-    if sizes:
-        avg_size = statistics.mean(sizes)
-        for p in packets:
-            if p["length"] > avg_size * 3:
-                alerts.append({
-                    "type": "Large Packet",
-                    "details": p,
-                    "anomaly_flag": True
-                })
+class _BurstState:
+    __slots__ = ("start", "count", "previous", "alerted")
 
-    # 2. Port scan detection per src IP
-    for p in packets:
-        src = p.get("src")
-        dport = p.get("dport")
-        if src and dport:
-            src_port_map[src].add(dport)
-            if len(src_port_map[src]) > 50:  # threshold for scan
-                alerts.append({
-                    "type": "Port Scan Detected",
-                    "details": {"src": src, "ports": list(src_port_map[src])[:20]},
-                    "anomaly_flag": True
-                })
+    def __init__(self, ts: float):
+        self.start = ts
+        self.count = 0
+        self.previous = 0
+        self.alerted = float("-inf")
+
+
+class BurstDetector:
+    """Per-source packet rate over the rules' burst_window (Traffic Burst).
+
+    Each source keeps this window's and the last window's packet count, and
+    the sliding count is estimated from the two, so memory per source is
+    fixed. Sources live in an LRU capped at BURST_MAX_SOURCES; a source
+    alerts at most once per window.
+    """
 
-    # 3. Frequency / burst detection
-    for p in packets:
-        packet_times.append(now)
-        src = p.get("src")
-        if src:
-            src_timestamps[src].append(now)
-            # keep window small
-            src_timestamps[src] = [t for t in src_timestamps[src] if now - t < 10]
-            if len(src_timestamps[src]) > 100:
+    def __init__(self, max_sources: int = BURST_MAX_SOURCES, rules: Optional[RuleEngine] = None):
+        self.rules = rules or rule_engine  # thresholds come from here
+        self.max_sources = max_sources
+        self.sources: "OrderedDict[str, _BurstState]" = OrderedDict()
+        self.lock = Lock()
+
+    def observe(self, pkt: Dict, weight: int = 1) -> List[Dict]:
+        """Count one decoded packet (standing for ``weight`` under sampling); returns any burst alert."""
+        src = pkt.get("src")
+        if not src:
+            return []
+        ts = pkt.get("ts") or time.time()
+        limits = self.rules.thresholds
+        window = limits["burst_window"]
+
+        with self.lock:
+            state = self.sources.get(src)
+            if state is None:
+                state = self.sources[src] = _BurstState(ts)
+                if len(self.sources) > self.max_sources:
+                    self.sources.popitem(last=False)
+            else:
+                self.sources.move_to_end(src)
+            elapsed = ts - state.start
+            if elapsed >= window:
+                state.previous = state.count if elapsed < 2 * window else 0
+                state.start += window * (elapsed // window)
+                state.count = 0
+                elapsed = ts - state.start
+            state.count += weight
+            overlap = min(1.0, max(0.0, 1 - elapsed / window))
+            rate = state.count + state.previous * overlap
+            if rate <= limits["burst_packets"] or ts - state.alerted < window:
+                return []
+            state.alerted = ts
+
+        return [{
+            "type": "Traffic Burst",
+            "details": {"src": src, "packets": round(rate), "window_seconds": window,
+                        "message": f"{src} sent ~{rate:.0f} packets in {window:g}s"},
+            "anomaly_flag": True,
+        }]
+
+
+def detect_flow_anomalies(flows: List[Dict], rules=None) -> List[Dict]:
+    """Run detectors over finished flow records (see flows.Flow.to_dict).
+
+    One check per flow instead of per packet, so this stays cheap at high pps.
+    ``rules`` defaults to the shared rules.rule_engine.
+    """
+    limits = (rules or rule_engine).thresholds
+    alerts = []
+
+    for f in flows:
+        src, dst, dport = f.get("src"), f.get("dst"), f.get("dport")
+        total_bytes = f.get("bytes", 0)
+        if total_bytes > limits["flow_bytes"]:
+            alerts.append({
+                "type": "Large Flow",
+                "details": {"src": src, "dst": dst, "dport": dport,
+                            "bytes": total_bytes, "bytes_fwd": f.get("bytes_fwd"),
+                            "bytes_rev": f.get("bytes_rev"),
+                            "message": f"{src} -> {dst}:{dport} moved {total_bytes} bytes"},
+                "anomaly_flag": True
+            })
+
+        duration = f.get("duration") or 0
+        if duration >= 1:
+            pps = f.get("packets", 0) / duration
+            if pps > limits["flow_pps"]:
                 alerts.append({
-                    "type": "Traffic Burst",
-                    "details": {"src": src, "rate": len(src_timestamps[src])},
+                    "type": "Flow Burst",
+                    "details": {"src": src, "dst": dst, "dport": dport, "rate": round(pps, 1),
+                                "message": f"{src} -> {dst}:{dport} at {pps:.0f} packets/s"},
                     "anomaly_flag": True
                 })
 
-    # 4. Entropy analysis
-    for p in packets:
-        payload = p.get("payload_sample")
-        if payload:
-            entropy = shannon_entropy(payload)
-            if entropy > 7.5:  # high entropy suspicious payload
+        # n bytes can't show more than log2(n) bits each, so the threshold
+        # (bits per byte over a large sample) scales down for short samples
+        entropy = f.get("entropy")
+        sampled = f.get("entropy_bytes") or 0
+        if entropy and sampled >= limits["flow_entropy_min_bytes"]:
+            limit = limits["flow_entropy"] * min(1.0, math.log2(sampled) / 8)
+            if entropy > limit:
                 alerts.append({
-                    "type": "High Entropy Payload",
-                    "details": {"src": p.get("src"), "entropy": entropy},
+                    "type": "High Entropy Flow",
+                    "details": {"src": src, "dst": dst, "dport": dport,
+                                "entropy": entropy, "sampled_bytes": sampled,
+                                "message": f"{src} -> {dst}:{dport} payload entropy {entropy:.2f} "
+                                           f"bits/byte over {sampled} bytes"},
                     "anomaly_flag": True
                 })
 
     return alerts
+
+
+# Shared instance for the live capture path
+burst_detector = BurstDetector()
+
+metrics.Gauge("nta_burst_tracked_sources", "Sources tracked by the traffic burst detector",
+              fn=lambda: len(burst_detector.sources))
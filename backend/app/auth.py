@@ -1,36 +1,56 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from . import models, utils
-from .database import SessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import os
+from . import metrics, models, schemas, utils
+from .cache import TTLCache
+from .database import get_async_db
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/users/login")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Resolved principals by user id, so polling dashboards don't hit `users` per
+# request. In-process changes call invalidate_principal; changes made outside
+# the server (delete_users.py, manual SQL) show up within PRINCIPAL_CACHE_TTL.
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 1024))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+metrics.Counter("nta_principal_cache_requests_total", "Resolved-principal cache lookups", ["result"],
+                fn=lambda: {("hit",): principal_cache.hits, ("miss",): principal_cache.misses})
+
+def invalidate_principal(user_id: Optional[int] = None):
+    """Drop a cached principal after its user or role changes (all if no id)."""
+    if user_id is None:
+        principal_cache.clear()
+    else:
+        principal_cache.pop(user_id)
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> schemas.UserOut:
     payload = utils.decode_token(token)
     if not payload or "sub" not in payload or "role" not in payload:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token"
         )
-    user = db.query(models.User).filter(models.User.id == int(payload["sub"])).first()
+    user_id = int(payload["sub"])
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+
+    user = await db.get(models.User, user_id)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
 
+    principal = schemas.UserOut.model_validate(user)
     # enforce role safety
-    if user.role not in ["admin", "viewer"]:
-        user.role = "viewer"
+    if principal.role not in ["admin", "viewer"]:
+        principal.role = "viewer"
 
-    return user
+    principal_cache.set(user_id, principal)
+    return principal
 
-def require_admin(current_user: models.User = Depends(get_current_user)):
+async def require_admin(current_user: schemas.UserOut = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
@@ -0,0 +1,208 @@
+"""Backtest: run a recorded capture through the live detection pipeline.
+
+    python -m app.backtest capture.pcap                            # as fast as possible
+    python -m app.backtest capture.pcap --speed 10                 # original pacing x10
+    python -m app.backtest capture.pcap --rules candidate.json --output result.json
+
+Packets take the same path as live capture - capture.packet_callback, the
+flow table and its detectors, alerts.detect_record (rules, DNS analytics,
+scan and burst detection) and alerts.build_alert for enrichment - keeping their
+recorded timestamps, so the windowed detectors see the capture's own
+timing. Detector state is fresh for every run and the rule set is loaded
+separately (RULES_PATH, or --rules to try a change), so a backtest never
+touches live windows or rule hit counts. Alerts are returned, not stored or
+broadcast.
+
+Enrichment runs in stub mode by default (see threat_intel.intel_mode): no
+lookups, so runs are repeatable and offline. ``--intel cache`` uses the
+offline IP databases and already-cached answers.
+
+The result has every alert, counts per type and per rule, and throughput:
+packets/s and, against the capture's own duration, the speed-up achieved.
+``max_seconds`` bounds the wall time of a run (paced runs especially);
+a run cut short reports ``time_limited``.
+"""
+from typing import Any, Dict, List, Optional
+from collections import Counter
+from datetime import datetime
+from threading import Lock
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from .analysis import BurstDetector, detect_flow_anomalies
+from .capture import load_scapy, packet_callback as decode_packet, read_pcap
+from .dns_analytics import DNSAnalytics
+from .flows import FlowTable, alert_record
+from .rules import RuleEngine, load_rule_config
+from .scans import ScanDetector
+from .threat_intel import CACHE, LIVE, STUB, using_intel_mode
+from .routes.alerts import build_alert, detect_record
+
+logger = logging.getLogger("app.backtest")
+
+# Wall-time limit for backtests started from the API (see routes/admin.py)
+BACKTEST_MAX_SECONDS = float(os.getenv("BACKTEST_MAX_SECONDS", 300))
+
+_running = Lock()
+
+
+class BacktestBusy(Exception):
+    pass
+
+
+def _iso(ts: float) -> str:
+    return datetime.utcfromtimestamp(ts).isoformat()
+
+
+def run_backtest(path: str, speed: float = 0.0, rules: Optional[Dict[str, Any]] = None,
+                 intel: str = STUB, limit: Optional[int] = None,
+                 max_alerts: Optional[int] = None, max_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """Replay ``path`` through detection and enrichment; one run at a time.
+
+    ``rules`` is a rule config (see rules.py), default the one at RULES_PATH.
+    ``limit`` stops after that many IP packets; ``max_alerts`` caps the
+    alerts listed (the counts still cover all of them); ``max_seconds``
+    stops reading the capture after that much wall time.
+    """
+    if not _running.acquire(blocking=False):
+        raise BacktestBusy()
+    try:
+        engine = RuleEngine(rules if rules is not None else load_rule_config())
+        dns = DNSAnalytics(rules=engine)
+        scans = ScanDetector(rules=engine)
+        bursts = BurstDetector(rules=engine)
+        flows = FlowTable()
+
+        alerts: List[Dict[str, Any]] = []
+        by_type: Counter = Counter()
+        stages = dict.fromkeys(("decode", "flows", "detect", "enrich"), 0.0)
+        packets = skipped = errors = 0
+        first_ts = last_ts = None
+        time_limited = False
+
+        def keep(alert: Dict[str, Any]):
+            by_type[alert["type"]] += 1
+            if max_alerts is None or len(alerts) < max_alerts:
+                alerts.append(alert)
+
+        def flow_alerts(finished, ts: float):
+            for flow in finished:
+                summary = flow.to_dict()
+                record = alert_record(summary)
+                for found in detect_flow_anomalies([summary], engine):
+                    details = found["details"]
+                    enriched = build_alert(record, found["type"], details["message"], details)
+                    keep({"created_at": _iso(ts), "type": enriched["type"], "source": "flow",
+                          "threat_score": enriched["threat_score"], "details": enriched["details"]})
+
+        load_scapy()  # keep the one-off import out of the throughput figures
+        clock = time.perf_counter
+        deadline = time.monotonic() + max_seconds if max_seconds else None
+
+        def capture():
+            nonlocal time_limited
+            time_limited = bool((yield from read_pcap(path, speed, deadline=deadline)))
+
+        started = clock()
+        with using_intel_mode(intel):
+            for pkt in capture():
+                t0 = clock()
+                record = decode_packet(pkt)
+                t1 = clock()
+                stages["decode"] += t1 - t0
+                if not record.get("src"):
+                    skipped += 1
+                    continue
+                packets += 1
+                ts = record["ts"]
+                first_ts = ts if first_ts is None else first_ts
+                last_ts = ts
+                try:
+                    finished = flows.observe(record)
+                    if finished:
+                        flow_alerts(finished, ts)
+                    t2 = clock()
+                    detections = detect_record(record, engine, dns, scans, bursts)
+                    t3 = clock()
+                    stages["flows"] += t2 - t1
+                    stages["detect"] += t3 - t2
+                    for alert_type, message, extra in detections:
+                        enriched = build_alert(record, alert_type, message, extra)
+                        keep({"created_at": _iso(ts), "type": enriched["type"], "source": "packet",
+                              "threat_score": enriched["threat_score"], "details": enriched["details"]})
+                    stages["enrich"] += clock() - t3
+                except Exception as e:  # same policy as the live pipeline: count it and move on
+                    errors += 1
+                    logger.exception(f"Error processing packet {packets}: {e}")
+                if limit and packets >= limit:
+                    break
+
+            # end of capture: whatever is still open finishes now
+            if last_ts is not None:
+                flow_alerts(flows.expire(float("inf")), last_ts)
+        elapsed = clock() - started
+        # the rest is reading the pcap (and pacing, when speed > 0)
+        stages = {"read": elapsed - sum(stages.values()), **stages}
+    finally:
+        _running.release()
+
+    span = (last_ts - first_ts) if packets else 0.0
+    return {
+        "pcap": os.path.basename(path),
+        "speed": speed,
+        "intel": intel,
+        "packets": packets,
+        "skipped": skipped,
+        "errors": errors,
+        "capture_start": _iso(first_ts) if packets else None,
+        "capture_seconds": round(span, 3),
+        "elapsed_seconds": round(elapsed, 3),
+        "packets_per_second": round(packets / elapsed, 1) if elapsed else 0.0,
+        "speedup": round(span / elapsed, 2) if elapsed and span else None,
+        "time_limited": time_limited,
+        "stage_seconds": {name: round(seconds, 3) for name, seconds in stages.items()},
+        "alerts_total": sum(by_type.values()),
+        "alerts_by_type": dict(by_type.most_common()),
+        "rule_hits": engine.stats(),
+        "alerts": alerts,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pcap")
+    parser.add_argument("--speed", type=float, default=0.0, help="pacing multiplier (0 = as fast as possible)")
+    parser.add_argument("--rules", help="rule set JSON to test instead of RULES_PATH")
+    parser.add_argument("--intel", choices=(STUB, CACHE, LIVE), default=STUB, help="enrichment mode")
+    parser.add_argument("--limit", type=int, help="stop after this many IP packets")
+    parser.add_argument("--max-seconds", type=float, help="stop reading the capture after this much wall time")
+    parser.add_argument("--output", help="write the full result (with every alert) to this JSON file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    result = run_backtest(args.pcap, args.speed, load_rule_config(args.rules) if args.rules else None,
+                          args.intel, args.limit, max_seconds=args.max_seconds)
+
+    print(f"{result['packets']} packets ({result['skipped']} non-IP skipped, {result['errors']} errors) "
+          f"in {result['elapsed_seconds']}s: {result['packets_per_second']:,.0f} packets/s")
+    if result["time_limited"]:
+        print(f"stopped after --max-seconds {args.max_seconds}, before the end of the capture")
+    if result["speedup"]:
+        print(f"capture spans {result['capture_seconds']}s, replayed at {result['speedup']}x real time")
+    print("stage seconds: " + ", ".join(f"{k} {v}" for k, v in result["stage_seconds"].items()))
+    print(f"{result['alerts_total']} alerts")
+    for alert_type, count in result["alerts_by_type"].items():
+        print(f"  {count:>7}  {alert_type}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, default=str)
+        print(f"wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+from typing import Any, Callable, Awaitable, Dict, Optional, Tuple
+from collections import OrderedDict
+from threading import Lock
+import asyncio
+import os
+import time
+
+import orjson
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from . import metrics
+
+# Distinguishes ETags across restarts, when version counters start over at 0
+_BOOT_ID = f"{os.getpid():x}{int(time.time()):x}"
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 1.0))
+
+
+class VersionCounter:
+    """Monotonic change counter for an in-memory store."""
+
+    def __init__(self):
+        self._value = 0
+        self._lock = Lock()
+
+    def bump(self) -> int:
+        with self._lock:
+            self._value += 1
+            return self._value
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+
+def make_etag(name: str, version: int) -> str:
+    return f'"{name}-{_BOOT_ID}-{version}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [t.strip() for t in header.split(",")]
+
+
+def _encode_fallback(obj: Any) -> Any:
+    # pydantic models and anything else orjson can't handle natively
+    return jsonable_encoder(obj)
+
+
+def encode_json(data: Any, adapter: Optional[TypeAdapter] = None) -> bytes:
+    """Serialize straight to JSON bytes; dicts, lists and datetimes never leave orjson.
+
+    With ``adapter`` (the route's response model), ``data`` is validated and
+    filtered through it first, as FastAPI would, and the dumped result is
+    what orjson writes.
+    """
+    if adapter is not None:
+        data = adapter.dump_python(adapter.validate_python(data))
+    return orjson.dumps(data, default=_encode_fallback, option=orjson.OPT_NON_STR_KEYS)
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Any, value: Any):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Any):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CachedBody:
+    __slots__ = ("version", "etag", "body", "created")
+
+    def __init__(self, version: int, etag: str, body: bytes):
+        self.version = version
+        self.etag = etag
+        self.body = body
+        self.created = time.monotonic()
+
+
+class ResponseCache:
+    """Shared, short-lived cache of serialized response bodies.
+
+    An entry is reused while its version is current, and for up to ``ttl``
+    seconds after the version moves on, so a store that changes on every
+    packet is still serialized at most once per tick no matter how many
+    dashboards are polling. Concurrent async misses for a key share one
+    build: later callers await the first caller's future, which only
+    exists while that build runs (one per event loop, since futures belong
+    to theirs).
+    """
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL):
+        self.ttl = ttl
+        self._entries: Dict[str, CachedBody] = {}
+        self._lock = Lock()
+        self._pending: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: str, version: int) -> Optional[CachedBody]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.version == version or time.monotonic() - entry.created < self.ttl:
+            self.hits += 1
+            return entry
+        return None
+
+    def _store(self, key: str, version: int, data: Any, adapter: Optional[TypeAdapter]) -> CachedBody:
+        self.misses += 1
+        entry = CachedBody(version, make_etag(key, version), encode_json(data, adapter))
+        self._entries[key] = entry
+        return entry
+
+    def get(self, key: str, version: int, build: Callable[[], Any],
+            adapter: Optional[TypeAdapter] = None) -> CachedBody:
+        entry = self._lookup(key, version)
+        if entry is not None:
+            return entry
+        with self._lock:
+            entry = self._lookup(key, version)
+            if entry is None:
+                entry = self._store(key, version, build(), adapter)
+            return entry
+
+    async def get_async(self, key: str, version: int, build: Callable[[], Awaitable[Any]],
+                        adapter: Optional[TypeAdapter] = None) -> CachedBody:
+        loop = asyncio.get_running_loop()
+        while True:
+            entry = self._lookup(key, version)
+            if entry is not None:
+                return entry
+            pending = self._pending.get((loop, key))
+            if pending is None:
+                break
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise  # this caller was cancelled, not the build
+                # the build was cancelled: look again, or build it here
+
+        pending = self._pending[(loop, key)] = loop.create_future()
+        try:
+            entry = self._store(key, version, await build(), adapter)
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            pending.exception()  # raised here; waiters still get it, no "never retrieved" warning
+            raise
+        finally:
+            del self._pending[(loop, key)]
+        pending.set_result(entry)
+        return entry
+
+    def invalidate(self, key: Optional[str] = None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+response_cache = ResponseCache()
+
+metrics.Counter("nta_response_cache_requests_total", "Shared response cache lookups", ["result"],
+                fn=lambda: {("hit",): response_cache.hits, ("miss",): response_cache.misses})
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+def cached_response(request: Request, entry: CachedBody) -> Response:
+    """Serve a cached body, or 304 if the client already has it."""
+    if etag_matches(request, entry.etag):
+        return not_modified(entry.etag)
+    return Response(
+        content=entry.body,
+        media_type="application/json",
+        headers={"ETag": entry.etag, "Cache-Control": "no-cache"},
+    )
@@ -1,10 +1,26 @@
-from scapy.all import sniff, IP, TCP, UDP, DNS, Raw
-from typing import Dict
+from typing import Dict, Optional
 from datetime import datetime
+import time
+
+# scapy takes most of a second to import, so the layers are bound on the first
+# decoded packet rather than when the API (or a script, or a test) imports us
+IP = TCP = UDP = DNS = Raw = None
+
+def load_scapy():
+    """Bind the scapy layers used for decoding; cheap after the first call."""
+    global IP, TCP, UDP, DNS, Raw
+    if IP is not None:
+        return
+    import scapy.all as scapy
+    TCP, UDP, DNS, Raw = scapy.TCP, scapy.UDP, scapy.DNS, scapy.Raw
+    IP = scapy.IP  # last: other threads test IP to see the layers are ready
 
 def packet_callback(pkt) -> Dict:
+    if IP is None:
+        load_scapy()
     data = {
         "timestamp": datetime.utcnow(),
+        "ts": float(getattr(pkt, "time", None) or time.time()),
         "src": pkt[IP].src if IP in pkt else None,
         "dst": pkt[IP].dst if IP in pkt else None,
         "proto": None,
@@ -25,16 +41,52 @@ def packet_callback(pkt) -> Dict:
     if TCP in pkt:
         data["sport"] = pkt[TCP].sport
         data["dport"] = pkt[TCP].dport
+        data["flags"] = int(pkt[TCP].flags)
     elif UDP in pkt:
         data["sport"] = pkt[UDP].sport
         data["dport"] = pkt[UDP].dport
 
-    if DNS in pkt:
-        data["dns"] = str(pkt[DNS].qd.qname)
+    if DNS in pkt and pkt[DNS].qd:
+        qd = pkt[DNS].qd
+        # scapy >= 2.6 holds the question section as a list
+        if not hasattr(qd, "qname"):
+            qd = qd[0]
+        # non-DNS payloads on port 53 decode to a Raw question
+        qname = getattr(qd, "qname", None)
+        if isinstance(qname, bytes):
+            data["dns"] = qname.decode(errors="replace").rstrip(".")
     if Raw in pkt:
         data["payload_sample"] = bytes(pkt[Raw].load)[:50].hex()
 
     return data
 
 def start_capture(callback, iface="eth0"):
+    from scapy.all import sniff
     sniff(prn=lambda x: callback(packet_callback(x)), store=False, iface=iface)
+
+def read_pcap(path: str, speed: float = 0.0, loops: int = 1, deadline: Optional[float] = None):
+    """Yield a capture's packets; ``speed`` > 0 keeps its original pacing (x speed).
+
+    ``deadline`` (time.monotonic()) stops the read early, without sleeping
+    past it for a packet that isn't due until later; the generator then
+    returns True.
+    """
+    from scapy.all import PcapReader
+
+    for _ in range(loops):
+        started = first_ts = None
+        with PcapReader(path) as reader:
+            for pkt in reader:
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    return True
+                if speed > 0:
+                    ts = float(pkt.time)
+                    if first_ts is None:
+                        started, first_ts = now, ts
+                    delay = (ts - first_ts) / speed - (now - started)
+                    if delay > 0:
+                        if deadline is not None and now + delay >= deadline:
+                            return True
+                        time.sleep(delay)
+                yield pkt
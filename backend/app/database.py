@@ -1,12 +1,118 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cyberanalyzer.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# SQLite tuning
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 64 * 1024))
 
+# Server database pool sizing (PostgreSQL)
+DB_WRITE_POOL_SIZE = int(os.getenv("DB_WRITE_POOL_SIZE", 2))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 5))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 10))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+
+# psycopg (3) serves both sides for PostgreSQL; a bare postgresql:// URL would
+# otherwise pick SQLAlchemy's default psycopg2 dialect, which isn't installed
+SYNC_DRIVERS = {"postgresql": "postgresql+psycopg"}
+# Async drivers used by the API routes
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+psycopg_async"}
+
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def _apply_sqlite_pragmas(dbapi_conn, connection_record):
+    cursor = dbapi_conn.cursor()
+    # only takes effect on a new database; maintenance.compact converts old ones
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    # negative cache_size is in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def sync_url(url: str = DATABASE_URL):
+    """Pin the sync driver when DATABASE_URL leaves it to the default; explicit drivers are kept."""
+    u = make_url(url)
+    return u.set(drivername=SYNC_DRIVERS.get(u.drivername, u.drivername))
+
+
+def make_engine(url: str = DATABASE_URL, pool_size: int = DB_READ_POOL_SIZE, **kwargs):
+    """Create an engine tuned for the backend named in ``url``.
+
+    SQLite gets WAL + pragmas on every new connection; server databases get
+    a bounded, pre-pinged connection pool.
+    """
+    if is_sqlite(url):
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            **kwargs,
+        )
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+        return engine
+
+    return create_engine(
+        sync_url(url),
+        pool_size=pool_size,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        **kwargs,
+    )
+
+
+def async_url(url: str = DATABASE_URL):
+    """Map a sync DATABASE_URL onto its asyncio driver."""
+    u = make_url(url)
+    return u.set(drivername=ASYNC_DRIVERS.get(u.get_backend_name(), u.drivername))
+
+
+def make_async_engine(url: str = DATABASE_URL, pool_size: int = DB_READ_POOL_SIZE, **kwargs):
+    """Async counterpart of make_engine for the API routes."""
+    if is_sqlite(url):
+        engine = create_async_engine(
+            async_url(url),
+            connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            **kwargs,
+        )
+        event.listen(engine.sync_engine, "connect", _apply_sqlite_pragmas)
+        return engine
+
+    return create_async_engine(
+        async_url(url),
+        pool_size=pool_size,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        **kwargs,
+    )
+
+
+# Capture-side writes (detection workers, maintenance) and API reads use
+# separate pools so a burst of alert inserts can't starve dashboard queries
+# (and vice versa): the sync engine below, and the async engine the API
+# routes run on.
+engine = make_engine(DATABASE_URL, pool_size=DB_WRITE_POOL_SIZE)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = make_async_engine(DATABASE_URL, pool_size=DB_READ_POOL_SIZE)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 def get_db():
@@ -16,6 +122,10 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def init_db():
     try:
         from app import models
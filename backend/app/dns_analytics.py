@@ -0,0 +1,181 @@
+"""Streaming DNS tunneling / DGA analytics with bounded memory.
+
+Per registered domain we keep a tumbling window of query counts, a
+HyperLogLog of distinct subdomains and running subdomain entropy; per
+query name we score the registrable label for DGA-like character
+statistics. Domains live in an LRU capped at DNS_MAX_DOMAINS, so memory is
+fixed (~400 bytes per tracked domain at the default precision).
+"""
+from typing import Dict, List, Optional, Tuple
+from collections import Counter, OrderedDict
+from threading import Lock
+import math
+import os
+import time
+
+from . import metrics
+from .rules import RuleEngine, rule_engine
+from .sketches import HyperLogLog, precision_for_error
+
+DNS_MAX_DOMAINS = int(os.getenv("DNS_MAX_DOMAINS", 10000))
+DNS_WINDOW_SECONDS = float(os.getenv("DNS_WINDOW_SECONDS", 60))
+DNS_SKETCH_ERROR = float(os.getenv("DNS_SKETCH_ERROR", 0.065))
+
+# Second-level suffixes where the registrable domain needs three labels
+MULTI_PART_SUFFIXES = {
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "me.uk", "com.au", "net.au", "org.au",
+    "co.nz", "co.jp", "ne.jp", "or.jp", "com.br", "com.cn", "net.cn", "co.in",
+    "co.za", "com.mx", "com.tr", "co.kr", "com.sg", "com.hk",
+}
+
+# Most frequent English letter bigrams; natural names are mostly made of these
+COMMON_BIGRAMS = frozenset(
+    "th he in er an re on at en nd ti es or te of ed is it al ar st to nt ng se ha as ou io le ve co me "
+    "de hi ri ro ic ne ea ra ce li ch ll be ma si om ur ca el ta la ns ge ly ei os no pe do su pa ec ac "
+    "ot di ol tr sh lo us il ad et rs ie mo ho ai ck ow un ss ct ee ue ni ke bo ba ap wo we ay gr fo "
+    "po mi ir am em pr lu op ut vi ab cl da ga na go nc ry ts id im ia ul ag ig".split()
+)
+
+
+def split_domain(qname: str) -> Tuple[str, str]:
+    """Return (registered_domain, subdomain_part) for a query name."""
+    labels = qname.lower().rstrip(".").split(".")
+    n = 3 if len(labels) >= 3 and ".".join(labels[-2:]) in MULTI_PART_SUFFIXES else 2
+    if len(labels) <= n:
+        return ".".join(labels), ""
+    return ".".join(labels[-n:]), ".".join(labels[:-n])
+
+
+def string_entropy(s: str) -> float:
+    if not s:
+        return 0.0
+    length = len(s)
+    return -sum((c / length) * math.log2(c / length) for c in Counter(s).values())
+
+
+def ngram_score(label: str) -> float:
+    """Share of character bigrams that are uncommon in English (0 = natural, 1 = random)."""
+    pairs = [label[i:i + 2] for i in range(len(label) - 1)]
+    if not pairs:
+        return 0.0
+    return sum(1 for p in pairs if p not in COMMON_BIGRAMS) / len(pairs)
+
+
+class DomainStats:
+    __slots__ = ("window_start", "queries", "subdomains", "entropy_sum", "entropy_samples",
+                 "total_queries", "tunnel_alerted", "dga_alerted")
+
+    def __init__(self, ts: float, precision: int):
+        self.window_start = ts
+        self.queries = 0
+        self.subdomains = HyperLogLog(precision)
+        self.entropy_sum = 0.0
+        self.entropy_samples = 0
+        self.total_queries = 0
+        self.tunnel_alerted = False
+        self.dga_alerted = False
+
+    def roll(self, ts: float):
+        self.window_start = ts
+        self.queries = 0
+        self.subdomains.clear()
+        self.entropy_sum = 0.0
+        self.entropy_samples = 0
+        self.tunnel_alerted = False
+
+
+class DNSAnalytics:
+    def __init__(self, max_domains: int = DNS_MAX_DOMAINS, window: float = DNS_WINDOW_SECONDS,
+                 sketch_error: float = DNS_SKETCH_ERROR, rules: Optional[RuleEngine] = None):
+        self.rules = rules or rule_engine  # thresholds come from here
+        self.max_domains = max_domains
+        self.window = window
+        self.precision = precision_for_error(sketch_error)
+        self.domains: "OrderedDict[str, DomainStats]" = OrderedDict()
+        self.lock = Lock()
+        self.queries_seen = 0
+
+    def observe(self, qname: str, src: Optional[str] = None, ts: Optional[float] = None) -> List[Dict]:
+        """Account one DNS query; returns any alerts it triggers."""
+        if not qname:
+            return []
+        ts = ts or time.time()
+        domain, sub = split_domain(qname)
+        limits = self.rules.thresholds
+        alerts = []
+
+        with self.lock:
+            self.queries_seen += 1
+            stats = self.domains.get(domain)
+            if stats is None:
+                stats = DomainStats(ts, self.precision)
+                self.domains[domain] = stats
+                if len(self.domains) > self.max_domains:
+                    self.domains.popitem(last=False)
+            else:
+                self.domains.move_to_end(domain)
+                if ts - stats.window_start >= self.window:
+                    stats.roll(ts)
+
+            stats.queries += 1
+            stats.total_queries += 1
+            if sub:
+                stats.subdomains.add(sub)
+                stats.entropy_sum += string_entropy(sub.replace(".", ""))
+                stats.entropy_samples += 1
+
+            # tunneling: many distinct, high-entropy subdomains under one domain per window
+            if not stats.tunnel_alerted and stats.queries >= limits["dns_tunnel_queries"] and stats.entropy_samples:
+                unique = stats.subdomains.count()
+                avg_entropy = stats.entropy_sum / stats.entropy_samples
+                if unique >= limits["dns_tunnel_subdomains"] and avg_entropy >= limits["dns_tunnel_entropy"]:
+                    stats.tunnel_alerted = True
+                    alerts.append({
+                        "type": "DNS Tunneling Suspected",
+                        "details": {
+                            "src": src,
+                            "domain": domain,
+                            "message": f"{unique} unique subdomains of {domain} in {self.window:g}s",
+                            "unique_subdomains": unique,
+                            "queries": stats.queries,
+                            "window_seconds": self.window,
+                            "subdomain_entropy": round(avg_entropy, 3),
+                        },
+                        "anomaly_flag": True,
+                    })
+
+            # DGA: long registrable label made of unusual character pairs
+            if not stats.dga_alerted:
+                label = domain.split(".", 1)[0]
+                if len(label) >= limits["dga_min_length"]:
+                    score = ngram_score(label)
+                    entropy = string_entropy(label)
+                    if score >= limits["dga_ngram_score"] and entropy >= limits["dga_entropy"]:
+                        stats.dga_alerted = True
+                        alerts.append({
+                            "type": "DGA Domain Suspected",
+                            "details": {
+                                "src": src,
+                                "domain": domain,
+                                "message": f"Generated-looking domain queried: {domain}",
+                                "ngram_score": round(score, 3),
+                                "entropy": round(entropy, 3),
+                            },
+                            "anomaly_flag": True,
+                        })
+
+        return alerts
+
+    def top_domains(self, n: int = 20) -> List[Dict]:
+        with self.lock:
+            items = [(d, s.queries, s.subdomains.count(), s.total_queries) for d, s in self.domains.items()]
+        items.sort(key=lambda x: x[1], reverse=True)
+        return [{"domain": d, "window_queries": q, "unique_subdomains": u, "total_queries": t}
+                for d, q, u, t in items[:n]]
+
+
+# Shared instance for the live capture path
+dns_analytics = DNSAnalytics()
+
+metrics.Gauge("nta_dns_tracked_domains", "Registered domains tracked by DNS analytics",
+              fn=lambda: len(dns_analytics.domains))
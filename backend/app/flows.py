@@ -0,0 +1,294 @@
+from typing import List, Dict, Optional, Tuple
+from array import array
+from collections import OrderedDict, deque
+from threading import Event, Lock, Thread
+import heapq
+import os
+import time
+
+from .analysis import histogram_entropy, detect_flow_anomalies
+from . import metrics
+
+FLOW_IDLE_TIMEOUT = float(os.getenv("FLOW_IDLE_TIMEOUT", 60))
+FLOW_ACTIVE_TIMEOUT = float(os.getenv("FLOW_ACTIVE_TIMEOUT", 300))
+FLOW_MAX_ENTRIES = int(os.getenv("FLOW_MAX_ENTRIES", 100000))
+# Payload bytes per flow fed into its byte histogram for the entropy detector;
+# at most 65535, what a uint16 histogram bin can count
+FLOW_ENTROPY_BYTES = min(int(os.getenv("FLOW_ENTROPY_BYTES", 4096)), 0xFFFF)
+FLOW_SWEEP_INTERVAL = 1.0
+# How often the background sweeper expires idle flows when no packets arrive
+FLOW_IDLE_SWEEP_SECONDS = float(os.getenv("FLOW_IDLE_SWEEP_SECONDS", 5))
+
+# TCP flag bits
+FIN, SYN, RST, PSH, ACK = 0x01, 0x02, 0x04, 0x08, 0x10
+
+FlowKey = Tuple[str, str, int, str, int]
+
+
+def flow_key(proto, src, sport, dst, dport) -> Tuple[FlowKey, bool]:
+    """Normalize a 5-tuple so both directions map to the same key.
+
+    Returns the key and whether the packet travels in key order (a -> b).
+    """
+    a = (src or "", sport or 0)
+    b = (dst or "", dport or 0)
+    if a <= b:
+        return (proto or "", a[0], a[1], b[0], b[1]), True
+    return (proto or "", b[0], b[1], a[0], a[1]), False
+
+
+class Flow:
+    __slots__ = (
+        "key", "initiator_fwd", "first_seen", "last_seen",
+        "packets_fwd", "packets_rev", "bytes_fwd", "bytes_rev",
+        "tcp_flags", "syn_count", "byte_hist", "payload_bytes", "end_reason",
+    )
+
+    def __init__(self, key: FlowKey, initiator_fwd: bool, ts: float):
+        self.key = key
+        # True when the first packet we saw travelled a -> b in key order
+        self.initiator_fwd = initiator_fwd
+        self.first_seen = ts
+        self.last_seen = ts
+        self.packets_fwd = 0
+        self.packets_rev = 0
+        self.bytes_fwd = 0
+        self.bytes_rev = 0
+        self.tcp_flags = 0
+        self.syn_count = 0
+        self.byte_hist = None  # allocated with the first payload
+        self.payload_bytes = 0
+        self.end_reason = None
+
+    def update(self, in_key_order: bool, length: int, ts: float,
+               flags: Optional[int] = None, payload: Optional[str] = None, weight: int = 1):
+        if in_key_order == self.initiator_fwd:
+            self.packets_fwd += weight
+            self.bytes_fwd += length * weight
+        else:
+            self.packets_rev += weight
+            self.bytes_rev += length * weight
+        if ts > self.last_seen:
+            self.last_seen = ts
+        if flags:
+            self.tcp_flags |= flags
+            if flags & SYN and not flags & ACK:
+                self.syn_count += weight
+        if payload and self.payload_bytes < FLOW_ENTROPY_BYTES:
+            data = bytes.fromhex(payload)[:FLOW_ENTROPY_BYTES - self.payload_bytes]
+            hist = self.byte_hist
+            if hist is None:
+                hist = self.byte_hist = array("H", bytes(512))
+            for b in data:
+                hist[b] += 1
+            self.payload_bytes += len(data)
+
+    def entropy(self) -> Optional[float]:
+        """Bits per byte over the payload bytes seen so far."""
+        if not self.payload_bytes:
+            return None
+        return histogram_entropy(self.byte_hist, self.payload_bytes)
+
+    def to_dict(self) -> Dict:
+        proto, a_ip, a_port, b_ip, b_port = self.key
+        if self.initiator_fwd:
+            src, sport, dst, dport = a_ip, a_port, b_ip, b_port
+        else:
+            src, sport, dst, dport = b_ip, b_port, a_ip, a_port
+        return {
+            "proto": proto,
+            "src": src,
+            "sport": sport or None,
+            "dst": dst,
+            "dport": dport or None,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "duration": round(self.last_seen - self.first_seen, 6),
+            "packets_fwd": self.packets_fwd,
+            "packets_rev": self.packets_rev,
+            "bytes_fwd": self.bytes_fwd,
+            "bytes_rev": self.bytes_rev,
+            "packets": self.packets_fwd + self.packets_rev,
+            "bytes": self.bytes_fwd + self.bytes_rev,
+            "tcp_flags": self.tcp_flags,
+            "syn_count": self.syn_count,
+            "entropy": round(self.entropy(), 4) if self.payload_bytes else None,
+            "entropy_bytes": self.payload_bytes,
+            "end_reason": self.end_reason,
+        }
+
+
+class FlowTable:
+    """Bidirectional flow table with idle/active timeouts and LRU eviction.
+
+    Flows are kept in an OrderedDict ordered by last update, so idle expiry
+    and LRU eviction both only ever touch the front of the table.
+
+    Expiry runs on packet time. observe() sweeps as packets arrive;
+    idle_sweep() covers the gaps when none do, carrying the last packet's
+    time forward by the ``clock`` time since (so replayed captures, whose
+    timestamps are in the past, expire on their own timeline too).
+    """
+
+    def __init__(self, idle_timeout: float = FLOW_IDLE_TIMEOUT,
+                 active_timeout: float = FLOW_ACTIVE_TIMEOUT,
+                 max_flows: int = FLOW_MAX_ENTRIES, clock=time.monotonic):
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.max_flows = max_flows
+        self.flows: "OrderedDict[FlowKey, Flow]" = OrderedDict()
+        self.lock = Lock()
+        self.evicted = 0
+        self.last_sweep = 0.0
+        self.clock = clock
+        self.last_ts: Optional[float] = None
+        self.last_ts_at = 0.0
+
+    def __len__(self):
+        return len(self.flows)
+
+    def add_packet(self, pkt: Dict, weight: int = 1) -> List[Flow]:
+        """Account a decoded packet (see capture.packet_callback).
+
+        ``weight`` > 1 for a packet kept by sampling: packet, byte and SYN
+        counts grow by that much (payload entropy only covers bytes seen).
+        Returns flows finished as a side effect (active timeout, FIN/RST or
+        LRU eviction).
+        """
+        ts = pkt.get("ts") or time.time()
+        key, in_key_order = flow_key(pkt.get("proto"), pkt.get("src"), pkt.get("sport"),
+                                     pkt.get("dst"), pkt.get("dport"))
+        flags = pkt.get("flags")
+        finished = []
+
+        with self.lock:
+            flow = self.flows.get(key)
+            if flow is not None and ts - flow.first_seen >= self.active_timeout:
+                del self.flows[key]
+                flow.end_reason = "active_timeout"
+                finished.append(flow)
+                flow = None
+
+            if flow is None:
+                flow = Flow(key, in_key_order, ts)
+                self.flows[key] = flow
+                while len(self.flows) > self.max_flows:
+                    _, old = self.flows.popitem(last=False)
+                    old.end_reason = "evicted"
+                    self.evicted += 1
+                    finished.append(old)
+            else:
+                self.flows.move_to_end(key)
+
+            flow.update(in_key_order, pkt.get("length") or 0, ts, flags, pkt.get("payload_sample"), weight)
+
+            if flags and flags & (FIN | RST):
+                del self.flows[key]
+                flow.end_reason = "rst" if flags & RST else "fin"
+                finished.append(flow)
+
+        return finished
+
+    def expire(self, now: Optional[float] = None) -> List[Flow]:
+        """Remove and return flows idle for longer than idle_timeout."""
+        now = now or time.time()
+        cutoff = now - self.idle_timeout
+        expired = []
+        with self.lock:
+            while self.flows:
+                key, flow = next(iter(self.flows.items()))
+                if flow.last_seen > cutoff:
+                    break
+                del self.flows[key]
+                flow.end_reason = "idle_timeout"
+                expired.append(flow)
+        return expired
+
+    def observe(self, pkt: Dict, weight: int = 1) -> List[Flow]:
+        """add_packet, plus an idle sweep every FLOW_SWEEP_INTERVAL of packet time."""
+        finished = self.add_packet(pkt, weight)
+        ts = pkt.get("ts") or time.time()
+        self.last_ts, self.last_ts_at = ts, self.clock()
+        if ts - self.last_sweep >= FLOW_SWEEP_INTERVAL:
+            self.last_sweep = ts
+            finished.extend(self.expire(ts))
+        return finished
+
+    def idle_sweep(self) -> List[Flow]:
+        """Expire idle flows while no packets arrive; see the class docstring."""
+        if self.last_ts is None:
+            return []
+        now = self.last_ts + (self.clock() - self.last_ts_at)
+        self.last_sweep = now
+        return self.expire(now)
+
+    def top(self, n: int = 20, by: str = "bytes") -> List[Dict]:
+        with self.lock:
+            flows = [f.to_dict() for f in self.flows.values()]
+        return heapq.nlargest(n, flows, key=lambda f: f.get(by) or 0)
+
+
+# ------------------------------
+# Shared table fed by the capture path
+# ------------------------------
+flow_table = FlowTable()
+completed_flows = deque(maxlen=500)
+flow_alerts = deque(maxlen=200)
+
+metrics.Gauge("nta_flow_table_size", "Active flows tracked", fn=lambda: len(flow_table.flows))
+metrics.Gauge("nta_completed_flows_buffer_size", "Finished flows held for /api/flows/completed",
+              fn=lambda: len(completed_flows))
+
+
+def alert_record(flow: Dict) -> Dict:
+    """Packet-shaped record for an alert raised on a finished flow (see alerts.store_alert)."""
+    return {"src": flow["src"], "dst": flow["dst"], "sport": flow["sport"], "dport": flow["dport"],
+            "proto": flow["proto"], "ts": flow["last_seen"]}
+
+
+def export_flows(flows: List[Flow]):
+    """Run per-flow detectors over finished flows; alerts are stored like any other."""
+    if not flows:
+        return
+    from .routes.alerts import submit_alert  # routes import this module
+
+    records = [f.to_dict() for f in flows]
+    completed_flows.extend(records)
+    for record in records:
+        for found in detect_flow_anomalies([record]):
+            flow_alerts.append(found)
+            details = found["details"]
+            submit_alert(alert_record(record), found["type"], details["message"], details)
+
+
+def observe(pkt: Dict, weight: int = 1):
+    """Feed one decoded packet (standing for ``weight`` packets) into the flow stage."""
+    export_flows(flow_table.observe(pkt, weight))
+
+
+_sweeper_stop = Event()
+_sweeper: Optional[Thread] = None
+
+
+def _sweep_loop(interval: float):
+    while not _sweeper_stop.wait(interval):
+        try:
+            export_flows(flow_table.idle_sweep())
+        except Exception as e:  # never let the sweep kill the thread
+            print(f"Flow sweep error: {e}")
+
+
+def start_sweeper(interval: float = FLOW_IDLE_SWEEP_SECONDS):
+    """Export flows that went idle once traffic stopped (from the app lifespan)."""
+    global _sweeper
+    if _sweeper and _sweeper.is_alive():
+        return
+    _sweeper_stop.clear()
+    _sweeper = Thread(target=_sweep_loop, args=(interval,), name="flow-sweeper", daemon=True)
+    _sweeper.start()
+
+
+def stop_sweeper(timeout: float = 5.0):
+    _sweeper_stop.set()
+    if _sweeper and _sweeper.is_alive():
+        _sweeper.join(timeout)
@@ -0,0 +1,343 @@
+"""Offline IP range database (geo / ASN) with memory-mapped lookups.
+
+Datasets are CSV files with one range per row, either ``start_ip,end_ip``
+or ``network`` (CIDR) plus any attribute columns (country, region, city,
+latitude, longitude, timezone, asn, org, ...). They are compiled once into
+a flat, columnar binary index:
+
+    header | IPv4 starts | ends | label refs | IPv6 starts | ends | label refs | labels
+
+IPv4 bounds are little-endian u32 columns, bisected in C straight off the
+mmap. IPv6 bounds are 16-byte big-endian strings, so comparing raw bytes
+orders them numerically. Label refs are (offset, length) u32 pairs into a
+blob of deduplicated JSON objects. Overlapping source ranges are split into
+disjoint records, the narrowest range winning (see _flatten).
+
+    python -m app.ipdb build ranges.csv ranges.ipdb
+    python -m app.ipdb lookup ranges.ipdb 8.8.8.8
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from functools import lru_cache
+from heapq import heappop, heappush
+from threading import Lock, Thread
+import csv
+import ipaddress
+import json
+import mmap
+import os
+import socket
+import struct
+import sys
+import time
+
+MAGIC = b"NTAIPDB2"
+# magic, v4 count, v6 count, v4 offset, v6 offset, label offset
+HEADER = struct.Struct(">8sIIQQQ")
+
+RELOAD_CHECK_INTERVAL = float(os.getenv("IPDB_RELOAD_CHECK_INTERVAL", 5))
+
+Range = Tuple[bytes, bytes, Dict]
+
+
+def pack_ip(ip: str) -> Optional[bytes]:
+    """Packed big-endian address; IPv4-mapped IPv6 collapses to IPv4."""
+    try:
+        return socket.inet_pton(socket.AF_INET, ip)
+    except OSError:
+        pass
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, ip)
+    except OSError:
+        return None
+    if packed[:12] == b"\x00" * 10 + b"\xff\xff":
+        return packed[12:]
+    return packed
+
+
+def _parse_row(row: Dict[str, str]) -> Optional[Range]:
+    if row.get("network"):
+        net = ipaddress.ip_network(row["network"].strip(), strict=False)
+        first, last = net.network_address, net.broadcast_address
+    else:
+        first = ipaddress.ip_address(row["start_ip"].strip())
+        last = ipaddress.ip_address(row["end_ip"].strip())
+    if first.version != last.version or int(first) > int(last):
+        return None
+    attrs = {
+        k: v for k, v in row.items()
+        if k not in ("network", "start_ip", "end_ip") and v not in (None, "")
+    }
+    for key in ("latitude", "longitude"):
+        if key in attrs:
+            try:
+                attrs[key] = float(attrs[key])
+            except ValueError:
+                del attrs[key]
+    return first.packed, last.packed, attrs
+
+
+def read_csv(path: str) -> List[Range]:
+    ranges = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            try:
+                parsed = _parse_row(row)
+            except (KeyError, ValueError):
+                continue
+            if parsed:
+                ranges.append(parsed)
+    return ranges
+
+
+def _flatten(items: List[Range], stats: Dict[str, int]) -> List[Tuple[int, int, Dict]]:
+    """Split overlapping ranges into disjoint segments.
+
+    Each address takes the narrowest range that covers it, then the one
+    listed first, so a /24 override inside a /16 keeps its own labels.
+    """
+    ranked = sorted(
+        ((int.from_bytes(start, "big"), int.from_bytes(end, "big"), order, attrs)
+         for order, (start, end, attrs) in enumerate(items)),
+        key=lambda r: r[0],
+    )
+    points = sorted({r[0] for r in ranked} | {r[1] + 1 for r in ranked})
+    active: List[Tuple[int, int, int, Dict]] = []  # (width, order, end, attrs)
+    segments: List[List] = []  # [start, end, order, attrs]
+    j = 0
+    for k in range(len(points) - 1):
+        point = points[k]
+        while j < len(ranked) and ranked[j][0] <= point:
+            start, end, order, attrs = ranked[j]
+            heappush(active, (end - start, order, end, attrs))
+            j += 1
+        while active and active[0][2] < point:
+            heappop(active)
+        if not active:
+            continue
+        _, order, _, attrs = active[0]
+        last = points[k + 1] - 1
+        if segments and segments[-1][2] == order and segments[-1][1] + 1 == point:
+            segments[-1][1] = last
+        else:
+            segments.append([point, last, order, attrs])
+
+    winners = Counter(seg[2] for seg in segments)
+    stats["shadowed"] += len(ranked) - len(winners)
+    stats["split"] += sum(1 for count in winners.values() if count > 1)
+    return [(start, end, attrs) for start, end, _, attrs in segments]
+
+
+def compile_ranges(ranges: Iterable[Range], out_path: str) -> Dict[str, int]:
+    """Write a compiled index; overlaps are resolved by _flatten.
+
+    Returns counts: ranges read, records written, ranges split around a
+    narrower one, and ranges shadowed entirely (no address left to them).
+    """
+    by_family = {4: [], 16: []}
+    for start, end, attrs in ranges:
+        by_family[len(start)].append((start, end, attrs))
+    stats = {"ranges": len(by_family[4]) + len(by_family[16]), "records": 0, "split": 0, "shadowed": 0}
+
+    labels = bytearray()
+    label_refs: Dict[str, Tuple[int, int]] = {}
+    sections = []
+    for width in (4, 16):
+        starts, ends, refs = [], [], array("I")
+        for start, end, attrs in _flatten(by_family[width], stats):
+            encoded = json.dumps(attrs, separators=(",", ":"), sort_keys=True)
+            ref = label_refs.get(encoded)
+            if ref is None:
+                data = encoded.encode()
+                ref = (len(labels), len(data))
+                label_refs[encoded] = ref
+                labels += data
+            starts.append(start)
+            ends.append(end)
+            refs.extend(ref)
+        if width == 4:
+            columns = [array("I", col) for col in (starts, ends)]
+        else:
+            columns = [array("B", b"".join(v.to_bytes(16, "big") for v in col)) for col in (starts, ends)]
+        columns.append(refs)
+        if sys.byteorder != "little":
+            for col in columns:
+                if col.typecode == "I":
+                    col.byteswap()
+        sections.append((len(starts), b"".join(col.tobytes() for col in columns)))
+        stats["records"] += len(starts)
+
+    (v4_count, v4), (v6_count, v6) = sections
+    v4_offset = HEADER.size
+    v6_offset = v4_offset + len(v4)
+    label_offset = v6_offset + len(v6)
+
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, v4_count, v6_count, v4_offset, v6_offset, label_offset))
+        f.write(v4)
+        f.write(v6)
+        f.write(labels)
+    os.replace(tmp_path, out_path)
+    if stats["split"] or stats["shadowed"]:
+        print(f"IP database {out_path}: {stats['split']} overlapping ranges split, "
+              f"{stats['shadowed']} shadowed by narrower ranges")
+    return stats
+
+
+class _Index:
+    """One open, immutable compiled index."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.v4_count, self.v6_count, v4_offset, v6_offset, self.label_offset = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compiled IP database")
+
+        n = self.v4_count
+        self._v4_starts = self._u32_column(v4_offset, n)
+        self._v4_ends = self._u32_column(v4_offset + 4 * n, n)
+        self._v4_refs = v4_offset + 8 * n
+
+        n = self.v6_count
+        self._v6_starts = v6_offset
+        self._v6_ends = v6_offset + 16 * n
+        self._v6_refs = v6_offset + 32 * n
+        self._label = lru_cache(maxsize=4096)(self._read_label)
+
+    def __len__(self):
+        return self.v4_count + self.v6_count
+
+    def _u32_column(self, offset: int, n: int):
+        view = memoryview(self._mm)[offset:offset + 4 * n]
+        if sys.byteorder == "little":
+            return view.cast("I")  # zero-copy, bisect reads straight from the page cache
+        column = array("I", view)
+        column.byteswap()
+        return column
+
+    def _read_label(self, offset: int, length: int) -> Dict:
+        start = self.label_offset + offset
+        return json.loads(self._mm[start:start + length])
+
+    def _ref(self, refs_base: int, i: int) -> Dict:
+        return self._label(*struct.unpack_from("<II", self._mm, refs_base + 8 * i))
+
+    def lookup(self, packed: bytes) -> Optional[Dict]:
+        if len(packed) == 4:
+            value = int.from_bytes(packed, "big")
+            i = bisect_right(self._v4_starts, value) - 1
+            if i < 0 or self._v4_ends[i] < value:
+                return None
+            return self._ref(self._v4_refs, i)
+
+        # rightmost record with start <= packed
+        mm, base = self._mm, self._v6_starts
+        lo, hi = 0, self.v6_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = base + 16 * mid
+            if mm[pos:pos + 16] <= packed:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        pos = self._v6_ends + 16 * (lo - 1)
+        if mm[pos:pos + 16] < packed:
+            return None
+        return self._ref(self._v6_refs, lo - 1)
+
+
+class IPDatabase:
+    """Hot-swappable range database backed by a CSV or compiled file.
+
+    A CSV source is compiled next to itself (``<name>.ipdb``) whenever it is
+    newer than the compiled copy. The source's mtime is checked at most every
+    RELOAD_CHECK_INTERVAL seconds. A changed file is compiled to a new file
+    and mapped on the side, then swapped in as a single reference; lookups
+    keep using the current index meanwhile and never wait on a reload,
+    which runs on a short-lived background thread.
+    """
+
+    def __init__(self, path: str, check_interval: float = RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._index: Optional[_Index] = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = Lock()
+        self.reloads = 0
+        self.reload()
+
+    def _compiled_path(self) -> str:
+        if self.path.endswith(".csv"):
+            return self.path[:-4] + ".ipdb"
+        return self.path
+
+    def reload(self, blocking: bool = True) -> bool:
+        """(Re)load the dataset if its file changed. Returns True on swap.
+
+        With ``blocking=False`` this returns False straight away if another
+        thread is already reloading.
+        """
+        if not self._lock.acquire(blocking):
+            return False
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                return False
+            if mtime == self._mtime:
+                return False
+            try:
+                compiled = self._compiled_path()
+                if compiled != self.path:
+                    if not os.path.exists(compiled) or os.stat(compiled).st_mtime < mtime:
+                        compile_ranges(read_csv(self.path), compiled)
+                index = _Index(compiled)
+            except (OSError, ValueError) as e:
+                print(f"IP database load error ({self.path}): {e}")
+                return False
+            self._index, self._mtime = index, mtime
+            self.reloads += 1
+            return True
+        finally:
+            self._lock.release()
+
+    def lookup(self, ip: str) -> Optional[Dict]:
+        if time.monotonic() >= self._next_check and not self._lock.locked():
+            # checked (and, if changed, recompiled) off the lookup path
+            self._next_check = time.monotonic() + self.check_interval
+            Thread(target=self.reload, kwargs={"blocking": False}, name="ipdb-reload", daemon=True).start()
+        index = self._index
+        packed = pack_ip(ip)
+        if index is None or packed is None:
+            return None
+        return index.lookup(packed)
+
+    def __len__(self):
+        return len(self._index) if self._index else 0
+
+
+def main(argv: List[str]):
+    if len(argv) == 3 and argv[0] == "build":
+        stats = compile_ranges(read_csv(argv[1]), argv[2])
+        print(f"Compiled {stats['ranges']} ranges into {stats['records']} records in {argv[2]}")
+    elif len(argv) >= 3 and argv[0] == "lookup":
+        db = IPDatabase(argv[1])
+        for ip in argv[2:]:
+            print(ip, db.lookup(ip))
+    else:
+        print("usage: python -m app.ipdb build <ranges.csv> <out.ipdb> | lookup <db> <ip>...")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,180 @@
+"""Compiled CIDR allow/deny/internal matcher, checked before enrichment.
+
+Prefixes are resolved longest-prefix-first (as a radix trie would) and then
+flattened into sorted, disjoint intervals, so a lookup is one C-level
+bisect per address family regardless of how many prefixes are loaded.
+
+The list file (IP_LISTS_PATH) is JSON; each key maps to a list of CIDRs or
+to the path of a text file with one CIDR per line:
+
+    {"internal": ["203.0.113.0/24"], "allow": ["8.8.8.8/32"], "deny": "/data/deny.txt"}
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+from bisect import bisect_right
+from threading import Lock
+import ipaddress
+import json
+import os
+import time
+
+from .ipdb import pack_ip
+
+INTERNAL = "internal"
+ALLOW = "allow"
+DENY = "deny"
+# When the same prefix appears in several lists the later one wins
+PRECEDENCE = {INTERNAL: 0, ALLOW: 1, DENY: 2}
+
+DEFAULT_INTERNAL = [
+    "0.0.0.0/8", "10.0.0.0/8", "100.64.0.0/10", "127.0.0.0/8", "169.254.0.0/16",
+    "172.16.0.0/12", "192.168.0.0/16", "224.0.0.0/4", "255.255.255.255/32",
+    "::/128", "::1/128", "fc00::/7", "fe80::/10", "ff00::/8",
+]
+
+IP_LISTS_PATH = os.getenv("IP_LISTS_PATH")
+# Our own address space, comma separated
+INTERNAL_NETWORKS = [n.strip() for n in os.getenv("INTERNAL_NETWORKS", "").split(",") if n.strip()]
+RELOAD_CHECK_INTERVAL = float(os.getenv("IP_LISTS_RELOAD_CHECK_INTERVAL", 5))
+
+Prefix = Tuple[int, int, str]
+
+
+def _flatten(prefixes: List[Prefix]) -> Tuple[List[int], List[int], List[str]]:
+    """Turn nested/disjoint prefixes into disjoint intervals, innermost label wins."""
+    # outer (larger) prefixes first, higher precedence last for identical ones
+    prefixes.sort(key=lambda p: (p[0], -p[1], PRECEDENCE[p[2]]))
+    starts, ends, labels = [], [], []
+
+    def emit(a, b, label):
+        if a > b:
+            return
+        if ends and ends[-1] == a - 1 and labels[-1] == label:
+            ends[-1] = b
+        else:
+            starts.append(a)
+            ends.append(b)
+            labels.append(label)
+
+    stack: List[Tuple[int, str]] = []
+    pos = 0
+    for start, end, label in prefixes:
+        while stack and stack[-1][0] < start:
+            top_end, top_label = stack.pop()
+            emit(pos, top_end, top_label)
+            pos = top_end + 1
+        if stack:
+            emit(pos, start - 1, stack[-1][1])
+        pos = start
+        stack.append((end, label))
+    while stack:
+        top_end, top_label = stack.pop()
+        emit(pos, top_end, top_label)
+        pos = top_end + 1
+    return starts, ends, labels
+
+
+class CIDRMatcher:
+    """Immutable compiled prefix set for IPv4 and IPv6."""
+
+    def __init__(self, lists: Dict[str, Iterable[str]]):
+        by_family = {4: [], 6: []}
+        self.counts = {}
+        for label, cidrs in lists.items():
+            if label not in PRECEDENCE:
+                continue
+            n = 0
+            for cidr in cidrs:
+                try:
+                    net = ipaddress.ip_network(cidr.strip(), strict=False)
+                except ValueError:
+                    continue
+                by_family[net.version].append(
+                    (int(net.network_address), int(net.broadcast_address), label)
+                )
+                n += 1
+            self.counts[label] = n
+        self._v4 = _flatten(by_family[4])
+        self._v6 = _flatten(by_family[6])
+
+    def classify_packed(self, packed: bytes) -> Optional[str]:
+        starts, ends, labels = self._v4 if len(packed) == 4 else self._v6
+        value = int.from_bytes(packed, "big")
+        i = bisect_right(starts, value) - 1
+        if i < 0 or ends[i] < value:
+            return None
+        return labels[i]
+
+    def classify(self, ip: str) -> Optional[str]:
+        packed = pack_ip(ip)
+        if packed is None:
+            return None
+        return self.classify_packed(packed)
+
+
+def _read_cidr_file(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        return [line.split("#", 1)[0].strip() for line in f if line.split("#", 1)[0].strip()]
+
+
+def load_lists(path: Optional[str]) -> Tuple[Dict[str, List[str]], List[str]]:
+    """Read the list config. Returns the lists and every file they came from."""
+    lists = {INTERNAL: DEFAULT_INTERNAL + INTERNAL_NETWORKS, ALLOW: [], DENY: []}
+    if not path:
+        return lists, []
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    files = [path]
+    base = os.path.dirname(os.path.abspath(path))
+    for label in PRECEDENCE:
+        value = config.get(label)
+        if isinstance(value, str):
+            list_path = os.path.join(base, value)
+            lists[label] += _read_cidr_file(list_path)
+            files.append(list_path)
+        elif value:
+            lists[label] += list(value)
+    return lists, files
+
+
+class IPLists:
+    """Hot-reloadable wrapper around CIDRMatcher for the configured list file."""
+
+    def __init__(self, path: Optional[str] = IP_LISTS_PATH, check_interval: float = RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._matcher = CIDRMatcher(load_lists(None)[0])
+        self._files = [path] if path else []
+        self._mtimes = None
+        self._next_check = 0.0
+        self._lock = Lock()
+        self.reload()
+
+    def reload(self) -> bool:
+        if not self.path:
+            return False
+        with self._lock:
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                mtimes = [os.stat(f).st_mtime for f in self._files]
+                if mtimes == self._mtimes:
+                    return False
+                lists, files = load_lists(self.path)
+                matcher = CIDRMatcher(lists)
+                mtimes = [os.stat(f).st_mtime for f in files]
+            except (OSError, ValueError) as e:
+                print(f"IP list load error ({self.path}): {e}")
+                return False
+            self._matcher, self._files, self._mtimes = matcher, files, mtimes
+            return True
+
+    def classify(self, ip: str) -> Optional[str]:
+        if self.path and time.monotonic() >= self._next_check:
+            self.reload()
+        return self._matcher.classify(ip)
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        return self._matcher.counts
+
+
+ip_lists = IPLists()
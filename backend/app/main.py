@@ -1,15 +1,38 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
+import os
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import traffic, alerts, users, replay
-from . import notifications
+from .routes import traffic, alerts, users, replay, flows, admin, ingest
+from . import flows as flow_stage, maintenance, metrics, notifications
+from .profiler import RequestTimingMiddleware
 from .database import init_db
 
-app = FastAPI(title="Cyber Analyzer", version="1.0.0")
+# Packet capture needs raw-socket privileges; API-only workers turn it off
+CAPTURE_ON_STARTUP = os.getenv("CAPTURE_ON_STARTUP", "true").lower() in ("1", "true", "yes")
+LIVE_ALERTS_ON_STARTUP = os.getenv("LIVE_ALERTS_ON_STARTUP", "false").lower() in ("1", "true", "yes")
 
-@app.on_event("startup")
-def startup_event():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     print("🚀 Starting Cyber Analyzer backend...")
     init_db()  # ensures DB is ready
+    notifications.bind_loop(asyncio.get_running_loop())
+    flow_stage.start_sweeper()
+    if CAPTURE_ON_STARTUP:
+        traffic.start_capture()
+    if LIVE_ALERTS_ON_STARTUP:
+        alerts.start_live_monitoring()
+    if maintenance.MAINTENANCE_ENABLED:
+        maintenance.start()
+    yield
+    alerts.stop_live_monitoring()
+    traffic.stop_capture()
+    maintenance.stop()
+    flow_stage.stop_sweeper()
+    notifications.bind_loop(None)
+
+app = FastAPI(title="Cyber Analyzer", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,12 +41,21 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestTimingMiddleware)
 
 app.include_router(traffic.router, prefix="/api/traffic", tags=["Traffic"])
 app.include_router(alerts.router, prefix="/api/alerts", tags=["Alerts"])
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
 app.include_router(replay.router, prefix="/api/replay", tags=["Replay"])
+app.include_router(flows.router, prefix="/api/flows", tags=["Flows"])
 app.include_router(notifications.router, prefix="/api/notify", tags=["Notifications"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
+app.include_router(ingest.router, prefix="/api/ingest", tags=["Ingest"])
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/")
 def root():
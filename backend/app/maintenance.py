@@ -0,0 +1,254 @@
+"""Alert retention, rollups and SQLite compaction.
+
+A background thread started from the app lifespan calls run_maintenance()
+every MAINTENANCE_INTERVAL seconds. Each run:
+
+1. Rolls up every completed hour since the last run into alert_rollups,
+   counting alerts by (type, severity, src_ip, country) at hour and day
+   resolution. The newest hourly bucket is the watermark, so an hour is
+   rolled exactly once, in one transaction with its day increments.
+2. Enforces retention: raw alerts older than ALERT_RETENTION_DAYS, and the
+   oldest past ALERT_MAX_ROWS, are deleted in batches. Only rows behind
+   the watermark go, so nothing is deleted before it has been counted.
+   Hourly rollups older than ROLLUP_HOURLY_DAYS are dropped too; the
+   daily rows are kept.
+3. On SQLite, returns free pages to the filesystem with PRAGMA
+   incremental_vacuum and truncates the WAL.
+
+GET /api/alerts/stats reads the rollups up to the watermark and only the
+raw alerts after it.
+"""
+from typing import Dict, Optional, Tuple
+from collections import defaultdict
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+import logging
+import os
+import time
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from . import metrics
+from .database import SessionLocal, engine, is_sqlite
+from .models import Alert, AlertRollup
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_ENABLED = os.getenv("MAINTENANCE_ENABLED", "true").lower() in ("1", "true", "yes")
+MAINTENANCE_INTERVAL = float(os.getenv("MAINTENANCE_INTERVAL", 900))
+MAINTENANCE_BATCH = int(os.getenv("MAINTENANCE_BATCH", 5000))
+ALERT_RETENTION_DAYS = float(os.getenv("ALERT_RETENTION_DAYS", 30))
+ALERT_MAX_ROWS = int(os.getenv("ALERT_MAX_ROWS", 500000))
+# never below the raw retention, or the watermark could vanish under unrolled alerts
+ROLLUP_HOURLY_DAYS = max(float(os.getenv("ROLLUP_HOURLY_DAYS", 90)), ALERT_RETENTION_DAYS)
+
+HOUR, DAY = "hour", "day"
+
+MAINTENANCE_SECONDS = metrics.Histogram("nta_maintenance_seconds", "Duration of alert maintenance runs")
+ALERTS_ROLLED = metrics.Counter("nta_alerts_rolled_up_total", "Alerts counted into hourly/daily rollups")
+ALERTS_PRUNED = metrics.Counter("nta_alerts_pruned_total", "Raw alerts deleted by retention")
+
+last_report: Dict = {}
+_run_lock = Lock()
+
+
+def floor_hour(dt: datetime) -> datetime:
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(dt: datetime) -> datetime:
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def rollup_key(alert_type: str, details: Optional[Dict]) -> Tuple[str, str, str, str]:
+    """(type, severity, src_ip, country) of an alert, "" for anything missing."""
+    details = details or {}
+    return (alert_type or "", str(details.get("severity") or ""),
+            str(details.get("src_ip") or ""), str(details.get("country") or ""))
+
+
+def rollup_watermark(db: Session) -> Optional[datetime]:
+    """End of the newest rolled-up hour; None before the first rollup."""
+    last = db.scalar(select(func.max(AlertRollup.bucket)).where(AlertRollup.resolution == HOUR))
+    return last + timedelta(hours=1) if last else None
+
+
+def _roll_hour(db: Session, hour: datetime) -> int:
+    rows = db.execute(
+        select(Alert.type, Alert.details, Alert.threat_score)
+        .where(Alert.created_at >= hour, Alert.created_at < hour + timedelta(hours=1))
+    ).all()
+    counts: Dict[tuple, list] = defaultdict(lambda: [0, None])
+    for alert_type, details, threat_score in rows:
+        entry = counts[rollup_key(alert_type, details)]
+        entry[0] += 1
+        if threat_score is not None and (entry[1] is None or threat_score > entry[1]):
+            entry[1] = threat_score
+
+    day = floor_day(hour)
+    existing = {
+        (r.type, r.severity, r.src_ip, r.country): r
+        for r in db.scalars(select(AlertRollup).where(AlertRollup.resolution == DAY, AlertRollup.bucket == day))
+    }
+    for key, (count, score) in counts.items():
+        alert_type, severity, src_ip, country = key
+        db.add(AlertRollup(resolution=HOUR, bucket=hour, type=alert_type, severity=severity,
+                           src_ip=src_ip, country=country, count=count, threat_score_max=score))
+        daily = existing.get(key)
+        if daily is None:
+            db.add(AlertRollup(resolution=DAY, bucket=day, type=alert_type, severity=severity,
+                               src_ip=src_ip, country=country, count=count, threat_score_max=score))
+        else:
+            daily.count += count
+            if score is not None and (daily.threat_score_max is None or score > daily.threat_score_max):
+                daily.threat_score_max = score
+    db.commit()
+    return len(rows)
+
+
+def roll_up(db: Session, now: datetime) -> Dict:
+    """Roll every completed hour after the watermark; empty hours are skipped."""
+    end = floor_hour(now)
+    start = rollup_watermark(db)
+    if start is None:
+        first = db.scalar(select(func.min(Alert.created_at)))
+        if first is None:
+            return {"hours": 0, "alerts": 0}
+        start = floor_hour(first)
+
+    hours = alerts = 0
+    while start < end:
+        nxt = db.scalar(select(func.min(Alert.created_at)).where(Alert.created_at >= start, Alert.created_at < end))
+        if nxt is None:
+            break
+        hour = floor_hour(nxt)
+        alerts += _roll_hour(db, hour)
+        hours += 1
+        start = hour + timedelta(hours=1)
+    ALERTS_ROLLED.inc(alerts)
+    return {"hours": hours, "alerts": alerts}
+
+
+def prune(db: Session, now: datetime) -> Dict:
+    """Apply the age and row-count limits behind the watermark, in batches."""
+    watermark = rollup_watermark(db)
+    if watermark is None:
+        return {"alerts": 0, "rollups": 0}
+
+    cutoff = now - timedelta(days=ALERT_RETENTION_DAYS)
+    total = db.scalar(select(func.count()).select_from(Alert))
+    if total > ALERT_MAX_ROWS:
+        newest_over = db.scalar(select(Alert.created_at).order_by(Alert.created_at)
+                                .offset(total - ALERT_MAX_ROWS - 1).limit(1))
+        if newest_over is not None:
+            cutoff = max(cutoff, newest_over + timedelta(microseconds=1))
+    cutoff = min(cutoff, watermark)
+
+    deleted = 0
+    while True:
+        ids = db.scalars(select(Alert.id).where(Alert.created_at < cutoff).limit(MAINTENANCE_BATCH)).all()
+        if not ids:
+            break
+        db.execute(delete(Alert).where(Alert.id.in_(ids)))
+        db.commit()
+        deleted += len(ids)
+    ALERTS_PRUNED.inc(deleted)
+
+    # keep the watermark's own row however old it is
+    hourly_cutoff = min(now - timedelta(days=ROLLUP_HOURLY_DAYS), watermark - timedelta(hours=1))
+    result = db.execute(delete(AlertRollup).where(AlertRollup.resolution == HOUR,
+                                                  AlertRollup.bucket < hourly_cutoff))
+    db.commit()
+    return {"alerts": deleted, "rollups": result.rowcount, "cutoff": cutoff.isoformat()}
+
+
+def compact() -> Dict:
+    """Incremental vacuum + WAL truncation; SQLite only."""
+    if not is_sqlite(str(engine.url)):
+        return {}
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        pragma = lambda sql: cursor.execute(sql).fetchall()  # noqa: E731
+        conn.commit()  # VACUUM can't run inside the driver's implicit transaction
+        if pragma("PRAGMA auto_vacuum")[0][0] != 2:
+            # databases created before auto_vacuum=INCREMENTAL need one full VACUUM to switch
+            logger.info("Converting database to incremental auto-vacuum (one-off full VACUUM)")
+            pragma("PRAGMA auto_vacuum=INCREMENTAL")
+            pragma("VACUUM")
+        page_size = pragma("PRAGMA page_size")[0][0]
+        free_before = pragma("PRAGMA freelist_count")[0][0]
+        # incremental_vacuum frees one page per step and execute() only steps
+        # once; executescript runs it to completion
+        cursor.executescript("PRAGMA incremental_vacuum;")
+        free_after = pragma("PRAGMA freelist_count")[0][0]
+        conn.commit()
+        pragma("PRAGMA wal_checkpoint(TRUNCATE)")
+        cursor.close()
+    finally:
+        conn.close()
+    return {"freed_bytes": (free_before - free_after) * page_size, "free_pages_left": free_after}
+
+
+def ensure_indexes():
+    """create_all only indexes new tables; add alert indexes to existing databases."""
+    for index in Alert.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+
+def run_maintenance(now: Optional[datetime] = None) -> Dict:
+    global last_report
+    now = now or datetime.utcnow()
+    with _run_lock:  # the scheduled run and an admin-triggered one must not roll the same hour
+        start = time.perf_counter()
+        with SessionLocal() as db:
+            rolled = roll_up(db, now)
+            pruned = prune(db, now)
+        vacuum = compact()
+        elapsed = time.perf_counter() - start
+    MAINTENANCE_SECONDS.observe(elapsed)
+
+    if pruned["alerts"]:
+        from .routes.alerts import alert_store_version
+        alert_store_version.bump()
+
+    last_report = {
+        "finished_at": datetime.utcnow().isoformat(),
+        "seconds": round(elapsed, 3),
+        "rolled_up": rolled,
+        "pruned": pruned,
+        "vacuum": vacuum,
+    }
+    logger.info(f"Alert maintenance: {last_report}")
+    return last_report
+
+
+_stop = Event()
+_thread: Optional[Thread] = None
+
+
+def _loop(interval: float):
+    ensure_indexes()
+    delay = min(interval, 60)  # first run shortly after startup, not during it
+    while not _stop.wait(delay):
+        try:
+            run_maintenance()
+        except Exception as e:
+            logger.exception(f"Alert maintenance failed: {e}")
+        delay = interval
+
+
+def start(interval: float = MAINTENANCE_INTERVAL):
+    global _thread
+    if _thread and _thread.is_alive():
+        return
+    _stop.clear()
+    _thread = Thread(target=_loop, args=(interval,), name="alert-maintenance", daemon=True)
+    _thread.start()
+
+
+def stop(timeout: float = 5.0):
+    _stop.set()
+    if _thread and _thread.is_alive():
+        _thread.join(timeout)
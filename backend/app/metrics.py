@@ -0,0 +1,188 @@
+"""Prometheus metrics for the capture pipeline, served at GET /metrics.
+
+A deliberately small implementation (no client library): counters, gauges
+and fixed-bucket histograms rendered in the text exposition format.
+Updates are plain attribute increments without locks - every per-packet
+metric has a single writer (the capture thread), and for the rest an
+occasional lost increment under contention is an acceptable trade for
+staying off a lock on the hot path.
+
+Per-packet stage latencies are sampled: PacketSampler lets one packet in
+METRICS_SAMPLE_EVERY take the timed path, so unsampled packets only pay a
+counter increment.
+"""
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from bisect import bisect_left
+from threading import Lock
+import math
+import os
+
+METRICS_SAMPLE_EVERY = max(1, int(os.getenv("METRICS_SAMPLE_EVERY", 128)))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 10us .. 10s, wide enough for packet decode up to remote API calls
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: List["Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (),
+                 fn: Optional[Callable[[], object]] = None):
+        """``fn`` makes the metric read-through: it returns a number, or for
+        labelled metrics a dict of label-value tuples to numbers."""
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        self._children: Dict[tuple, object] = {}
+        self._lock = Lock()
+        self._default = self.labels() if not self.labelnames and fn is None else None
+        _registry.append(self)
+
+    def _new_child(self):
+        return _Value()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def items(self):
+        """(label values, child) pairs recorded so far."""
+        return list(self._children.items())
+
+    def _samples(self):
+        if self.fn is not None:
+            value = self.fn()
+            if isinstance(value, dict):
+                for labels, v in value.items():
+                    yield "", labels, v
+            else:
+                yield "", (), value
+            return
+        for labels, child in list(self._children.items()):
+            yield "", labels, child.value
+
+    def render(self, out: List[str]):
+        out.append(f"# HELP {self.name} {self.doc}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        for suffix, labels, value in self._samples():
+            out.append(f"{self.name}{suffix}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1):
+        self._default.value += amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value):
+        self._default.value = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, doc, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def render(self, out: List[str]):
+        out.append(f"# HELP {self.name} {self.doc}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        bounds = self.buckets + (math.inf,)
+        for labels, child in list(self._children.items()):
+            cumulative = 0
+            for bound, n in zip(bounds, child.counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                out.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            out.append(f"{self.name}_sum{label_str} {child.sum!r}")
+            out.append(f"{self.name}_count{label_str} {child.count}")
+
+
+class PacketSampler:
+    """Counts packets and picks one in ``every`` for timed instrumentation."""
+
+    __slots__ = ("every", "count")
+
+    def __init__(self, every: int = METRICS_SAMPLE_EVERY):
+        self.every = every
+        self.count = 0
+
+    def tick(self) -> bool:
+        self.count += 1
+        return self.count % self.every == 0
+
+
+def render() -> str:
+    out: List[str] = []
+    for metric in _registry:
+        try:
+            metric.render(out)
+        except Exception as e:  # a broken read-through gauge shouldn't take down the scrape
+            out.append(f"# {metric.name} unavailable: {_escape(e)}")
+    return "\n".join(out) + "\n"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, JSON, UniqueConstraint
 from datetime import datetime
 from .database import Base
 
@@ -28,7 +28,7 @@ class Alert(Base):
     id = Column(Integer, primary_key=True, index=True)
     type = Column(String, nullable=False)
     details = Column(JSON, nullable=False, default={})
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     resolved = Column(Boolean, default=False)
     risk_score = Column(String, nullable=True)
     geo_info = Column(String, nullable=True)
@@ -37,3 +37,22 @@ class Alert(Base):
     threat_score = Column(Integer, nullable=True)
     entropy_score = Column(Integer, nullable=True)
     vt_report = Column(JSON, nullable=True)
+
+class AlertRollup(Base):
+    """Alert counts per hour or day; outlives the raw alerts (see maintenance.py).
+
+    Dimensions are stored as "" rather than NULL so the unique key matches.
+    """
+    __tablename__ = "alert_rollups"
+    __table_args__ = (
+        UniqueConstraint("resolution", "bucket", "type", "severity", "src_ip", "country", name="uq_alert_rollups"),
+    )
+    id = Column(Integer, primary_key=True)
+    resolution = Column(String, nullable=False)  # "hour" or "day"
+    bucket = Column(DateTime, nullable=False)
+    type = Column(String, nullable=False)
+    severity = Column(String, nullable=False, default="")
+    src_ip = Column(String, nullable=False, default="")
+    country = Column(String, nullable=False, default="")
+    count = Column(Integer, nullable=False, default=0)
+    threat_score_max = Column(Integer, nullable=True)
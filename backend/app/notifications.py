@@ -1,15 +1,43 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import List
+from concurrent.futures import Future
+from typing import List, Optional
+import asyncio
+import time
+
+from . import metrics
 
 router = APIRouter()
 active_connections: List[WebSocket] = []
 
+metrics.Gauge("nta_ws_clients", "Connected notification WebSocket clients", fn=lambda: len(active_connections))
+WS_SEND_SECONDS = metrics.Histogram("nta_ws_send_seconds", "Time to hand one notification to one WebSocket client")
+WS_SEND_ERRORS = metrics.Counter("nta_ws_send_errors_total", "Failed WebSocket notification sends")
+
 async def notify_all(message: str):
     for conn in active_connections:
+        start = time.perf_counter()
         try:
             await conn.send_text(message)
         except:
-            pass
+            WS_SEND_ERRORS.inc()
+        WS_SEND_SECONDS.observe(time.perf_counter() - start)
+
+# The server's event loop, which owns every connection (bound by main's lifespan)
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def bind_loop(loop: Optional[asyncio.AbstractEventLoop]):
+    global _loop
+    _loop = loop
+
+def notify_threadsafe(message: str) -> Optional[Future]:
+    """Schedule notify_all on the server loop from a worker thread.
+
+    Returns the future, or None when no loop is bound or nobody is connected.
+    """
+    loop = _loop
+    if loop is None or loop.is_closed() or not active_connections:
+        return None
+    return asyncio.run_coroutine_threadsafe(notify_all(message), loop)
 
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -0,0 +1,273 @@
+"""On-demand sampling profiler and slow-request capture.
+
+SamplingProfiler walks ``sys._current_frames()`` every few milliseconds from
+its own thread, so no tracing hooks are installed and the profiled threads
+(capture, sniff, event loop, worker pool) run unmodified. Output is
+collapsed stacks - ``thread;outer;...;inner count`` per line - which
+flamegraph.pl, inferno and speedscope read directly.
+
+RequestTimingMiddleware times every HTTP request per route template. While
+a request has been running longer than SLOW_REQUEST_MS, a watchdog thread
+samples the thread executing its endpoint; the request keeps those samples
+once it finishes. Each stack is credited to the one request it serves, so
+concurrent requests to the same route don't share samples. A request that
+is only awaiting I/O shows up as ``<awaiting>``.
+"""
+from typing import Dict, List, Optional, Tuple
+from collections import Counter, deque
+from contextvars import Context, ContextVar
+from threading import Lock, Thread
+import os
+import sys
+import threading
+import time
+
+from . import metrics
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 500))
+SLOW_REQUEST_SAMPLE_MS = float(os.getenv("SLOW_REQUEST_SAMPLE_MS", 20))
+SLOW_REQUEST_HISTORY = int(os.getenv("SLOW_REQUEST_HISTORY", 50))
+PROFILE_MAX_SECONDS = 300
+MAX_STACK_DEPTH = 128
+
+# Leaf frames of threads that are parked rather than working
+IDLE_LEAVES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("queue.py", "get"),
+    ("selectors.py", "select"), ("socket.py", "accept"), ("thread.py", "_worker"),
+    ("supervisor.py", "run"), ("server.py", "serve"),
+}
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame) -> str:
+    """One stack, outermost frame first, as a ';'-joined string."""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES
+
+
+def render_collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class SamplingProfiler:
+    """Statistical profiler over all threads; one run at a time."""
+
+    def __init__(self):
+        self._lock = Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def run(self, seconds: float, interval: float = 0.005, include_idle: bool = False) -> Tuple[Counter, Dict]:
+        """Sample for ``seconds``; returns collapsed stack counts and run info."""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            skip = {threading.get_ident(), getattr(_watchdog_thread, "ident", None)}
+            names: Dict[int, str] = {}
+            stacks: Counter = Counter()
+            samples = 0
+            started = time.monotonic()
+            deadline = started + seconds
+            while time.monotonic() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident in skip or (not include_idle and is_idle(frame)):
+                        continue
+                    if ident not in names:
+                        names.update((t.ident, t.name.replace(";", ":").replace(" ", "_"))
+                                     for t in threading.enumerate())
+                    stacks[f"{names.get(ident, ident)};{collapse(frame)}"] += 1
+                samples += 1
+                time.sleep(interval)
+            return stacks, {
+                "samples": samples,
+                "seconds": round(time.monotonic() - started, 3),
+                "interval": interval,
+                "threads": len(names),
+            }
+        finally:
+            self._lock.release()
+
+
+profiler = SamplingProfiler()
+
+
+# ------------------------------
+# Per-route timing and slow requests
+# ------------------------------
+HTTP_SECONDS = metrics.Histogram("nta_http_request_seconds", "HTTP request latency per route", ["method", "route"])
+slow_requests = deque(maxlen=SLOW_REQUEST_HISTORY)
+
+
+class _InFlight:
+    __slots__ = ("scope", "start", "status", "samples")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.start = time.perf_counter()
+        self.status = None
+        self.samples: Optional[Counter] = None
+
+
+_in_flight: Dict[int, _InFlight] = {}
+# Copied into the threadpool with the rest of the context, so a worker
+# running a sync endpoint can be traced back to its request
+_current_request: ContextVar[Optional[_InFlight]] = ContextVar("nta_current_request", default=None)
+
+
+def _route_template(scope) -> str:
+    # routes of an included router keep their relative path; FastAPI puts the
+    # prefixed one on the effective route context
+    fastapi_scope = scope.get("fastapi")
+    context = fastapi_scope.get("effective_route_context") if isinstance(fastapi_scope, dict) else None
+    route = context or scope.get("route")
+    return getattr(route, "path", None) or "<unmatched>"
+
+
+def _owner(frame) -> Optional[_InFlight]:
+    """The request a stack is serving.
+
+    On the event loop the middleware's own frame (holding ``req``) is up the
+    coroutine chain; a threadpool worker has the Context it runs the
+    endpoint in as a local.
+    """
+    while frame is not None:
+        for value in frame.f_locals.values():
+            if isinstance(value, _InFlight):
+                return value
+            if isinstance(value, Context):
+                req = value.get(_current_request)
+                if req is not None:
+                    return req
+        frame = frame.f_back
+    return None
+
+
+def _sample_slow(threshold: float):
+    """Grab one stack sample for every in-flight request over the threshold."""
+    now = time.perf_counter()
+    slow = [r for r in list(_in_flight.values()) if now - r.start >= threshold]
+    if not slow:
+        return
+    by_code: Dict[object, List[_InFlight]] = {}
+    for req in slow:
+        if req.samples is None:
+            req.samples = Counter()
+        code = getattr(req.scope.get("endpoint"), "__code__", None)
+        if code is not None:
+            by_code.setdefault(code, []).append(req)
+
+    hit = set()
+    for frame in sys._current_frames().values():
+        f = frame
+        while f is not None and f.f_code not in by_code:
+            f = f.f_back
+        if f is None:
+            continue
+        candidates = by_code[f.f_code]
+        req = _owner(f) or (candidates[0] if len(candidates) == 1 else None)
+        if req is None or req.samples is None:
+            continue  # a request that isn't slow (yet), or one we can't place
+        req.samples[collapse(frame)] += 1
+        hit.add(id(req))
+    for req in slow:
+        if id(req) not in hit:
+            req.samples["<awaiting>"] += 1
+
+
+def _watchdog(threshold: float, interval: float):
+    while True:
+        time.sleep(interval)
+        try:
+            _sample_slow(threshold)
+        except Exception as e:  # never let diagnostics kill the thread
+            print(f"Slow request sampler error: {e}")
+
+
+_watchdog_lock = Lock()
+_watchdog_thread: Optional[Thread] = None
+
+
+def _ensure_watchdog(threshold: float):
+    global _watchdog_thread
+    if _watchdog_thread is not None:
+        return
+    with _watchdog_lock:
+        if _watchdog_thread is None:
+            _watchdog_thread = Thread(target=_watchdog, args=(threshold, SLOW_REQUEST_SAMPLE_MS / 1000),
+                                      name="slow-request-sampler", daemon=True)
+            _watchdog_thread.start()
+
+
+class RequestTimingMiddleware:
+    """ASGI middleware: per-route latency histogram plus slow-request capture."""
+
+    def __init__(self, app, threshold_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.threshold = threshold_ms / 1000
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        _ensure_watchdog(self.threshold)
+        req = _InFlight(scope)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                req.status = message["status"]
+            await send(message)
+
+        _in_flight[id(req)] = req
+        token = _current_request.set(req)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_request.reset(token)
+            _in_flight.pop(id(req), None)
+            duration = time.perf_counter() - req.start
+            route = _route_template(scope)
+            HTTP_SECONDS.labels(scope["method"], route).observe(duration)
+            if duration >= self.threshold:
+                slow_requests.append({
+                    "method": scope["method"],
+                    "route": route,
+                    "path": scope["path"],
+                    "status": req.status,
+                    "duration_ms": round(duration * 1000, 1),
+                    "finished_at": time.time(),
+                    "stacks": [{"stack": s, "count": n} for s, n in (req.samples or Counter()).most_common(20)],
+                })
+
+
+def route_stats() -> List[Dict]:
+    """Request count and mean latency per route, busiest (count x mean) first."""
+    out = []
+    for (method, route), h in HTTP_SECONDS.items():
+        if not h.count:
+            continue
+        out.append({
+            "method": method,
+            "route": route,
+            "count": h.count,
+            "mean_ms": round(h.sum / h.count * 1000, 2),
+        })
+    out.sort(key=lambda r: r["mean_ms"] * r["count"], reverse=True)
+    return out
@@ -0,0 +1,102 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from typing import Any, Dict, List, Optional
+import json
+import os
+import shutil
+import tempfile
+
+from ..auth import require_admin
+from .. import maintenance
+from ..profiler import (PROFILE_MAX_SECONDS, ProfilerBusy, SLOW_REQUEST_MS, profiler,
+                        render_collapsed, route_stats, slow_requests)
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.post("/profile")
+async def run_profile(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    include_idle: bool = Query(False, description="keep threads parked in waits/selects"),
+    format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+):
+    """Sample every thread for `seconds`; collapsed stacks feed flamegraph.pl or speedscope."""
+    try:
+        stacks, info = await run_in_threadpool(profiler.run, seconds, interval_ms / 1000, include_idle)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    if format == "json":
+        return {**info, "stacks": [{"stack": s, "count": n} for s, n in stacks.most_common()]}
+    return PlainTextResponse(render_collapsed(stacks), headers={"X-Profile-Samples": str(info["samples"])})
+
+
+@router.get("/routes")
+def get_route_timings() -> List[Dict[str, Any]]:
+    """Request count and mean latency per route, busiest first."""
+    return route_stats()
+
+
+@router.get("/slow-requests")
+def get_slow_requests() -> Dict[str, Any]:
+    """Recent requests slower than SLOW_REQUEST_MS, with stack samples taken while they ran."""
+    return {"threshold_ms": SLOW_REQUEST_MS, "requests": list(reversed(slow_requests))}
+
+
+@router.post("/maintenance")
+async def run_alert_maintenance() -> Dict[str, Any]:
+    """Run alert rollup, retention and compaction now instead of waiting for the schedule."""
+    return await run_in_threadpool(maintenance.run_maintenance)
+
+
+@router.get("/maintenance")
+def get_alert_maintenance() -> Dict[str, Any]:
+    """Report of the last maintenance run."""
+    return maintenance.last_report
+
+
+def _backtest_upload(upload: UploadFile, speed: float, rules: Optional[Dict[str, Any]], intel: str,
+                     max_alerts: int) -> Dict[str, Any]:
+    from ..backtest import BACKTEST_MAX_SECONDS, run_backtest
+
+    fd, path = tempfile.mkstemp(suffix=".pcap", prefix="nta-backtest-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(upload.file, f)
+        return run_backtest(path, speed, rules, intel, max_alerts=max_alerts, max_seconds=BACKTEST_MAX_SECONDS)
+    finally:
+        os.unlink(path)
+
+
+@router.post("/backtest")
+async def run_pcap_backtest(
+    pcap: UploadFile,
+    rules: Optional[UploadFile] = None,
+    speed: float = Query(0, ge=0, le=1000, description="pacing multiplier, 0 = as fast as possible"),
+    intel: str = Query("stub", pattern="^(stub|cache|live)$"),
+    max_alerts: int = Query(1000, ge=0, le=100000),
+) -> Dict[str, Any]:
+    """Run a pcap through the live detectors (see app/backtest.py), optionally with a candidate rule set.
+
+    Runs are cut off after BACKTEST_MAX_SECONDS; slower than real time
+    pacing is refused, since it only holds the run (and the request) open.
+    """
+    from ..backtest import BacktestBusy
+    from ..rules import RuleEngine
+
+    if 0 < speed < 1:
+        raise HTTPException(status_code=400, detail="speed must be 0 (as fast as possible) or at least 1")
+
+    config = None
+    if rules is not None:
+        try:
+            config = json.loads(await rules.read())
+            RuleEngine(config)  # compile once here so a bad rule is a 400, not a failed run
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid rule set: {e!r}")
+    try:
+        return await run_in_threadpool(_backtest_upload, pcap, speed, config, intel, max_alerts)
+    except BacktestBusy:
+        raise HTTPException(status_code=409, detail="A backtest is already running")
@@ -1,37 +1,80 @@
-from fastapi import APIRouter, BackgroundTasks, HTTPException
-from typing import List, Dict, Any
-from datetime import datetime
-from collections import deque
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query, Request
+from typing import List, Dict, Any, Tuple
+from datetime import datetime, timedelta
+from collections import Counter, deque
 import threading
-import asyncio
 import logging
+import os
+import queue
+import time
 
+from pydantic import TypeAdapter
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..schemas import AlertOut
-from ..models import Alert
-from ..database import SessionLocal
-from ..notifications import notify_all
-from ..threat_intel import (
-    check_ip_virustotal,
-    check_ip_abuseipdb,
-    geolocate_ip,
-    lookup_isp,
-    compute_threat_score,
-)
+from ..models import Alert, AlertRollup
+from ..database import SessionLocal, get_async_db
+from ..notifications import notify_threadsafe
+from ..cache import VersionCounter, response_cache, make_etag, etag_matches, not_modified, cached_response
+from ..threat_intel import assess_ip
+from ..capture import packet_callback as decode_packet
+from ..rules import rule_engine, reload_rules
+from ..dns_analytics import dns_analytics
+from ..scans import scan_detector
+from ..analysis import burst_detector
+from ..sampling import live_sampler
+from ..timeseries import traffic_series
+from .. import flows
+from . import traffic
+from ..auth import require_admin
+from .. import metrics
+from ..maintenance import DAY, HOUR, floor_day, floor_hour, rollup_key
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Sniffed packets wait here for the detection worker; when it falls behind,
+# the queue filling up turns on adaptive sampling (see sampling.py)
+CAPTURE_QUEUE_SIZE = int(os.getenv("CAPTURE_QUEUE_SIZE", 10000))
+# Alerts raised off the detection worker (finished flows) wait here for the
+# alert writer, so enrichment and the DB commit never run on a capture thread
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", 1000))
+
 alerts_deque = deque(maxlen=200)
 capture_thread = None
 stop_flag = False
+capture_queue: "queue.Queue" = queue.Queue(maxsize=CAPTURE_QUEUE_SIZE)
+alert_queue: "queue.Queue" = queue.Queue(maxsize=ALERT_QUEUE_SIZE)
 deque_lock = threading.Lock()
+# Columns read for the alert list, in AlertOut field order
+ALERT_COLUMNS = [getattr(Alert, name) for name in AlertOut.model_fields]
+# Validates the cached alert list once per rebuild, in place of response_model
+ALERT_LIST = TypeAdapter(List[AlertOut])
+# Bumped on every stored alert; backs the ETag on GET /api/alerts/
+alert_store_version = VersionCounter()
+
+# Live pipeline instrumentation (see metrics.py); decode and detect are sampled
+packet_sampler = metrics.PacketSampler()
+metrics.Counter("nta_packets_total", "Packets through the live detection pipeline",
+                fn=lambda: packet_sampler.count)
+STAGE_SECONDS = metrics.Histogram("nta_stage_seconds", "Latency per live pipeline stage", ["stage"])
+STAGE_DECODE, STAGE_DETECT, STAGE_ENRICH, STAGE_DB, STAGE_NOTIFY = (
+    STAGE_SECONDS.labels(stage) for stage in ("decode", "detect", "enrich", "db_commit", "ws_fanout")
+)
+ALERTS_STORED = metrics.Counter("nta_alerts_total", "Alerts stored by the live pipeline", ["type"])
+PIPELINE_ERRORS = metrics.Counter("nta_pipeline_errors_total", "Packets that failed in the live pipeline")
+metrics.Gauge("nta_alert_buffer_size", "Alerts held in the in-memory alert deque", fn=lambda: len(alerts_deque))
+metrics.Gauge("nta_capture_queue_depth", "Packets waiting for the live detection worker",
+              fn=lambda: capture_queue.qsize())
+QUEUE_DROPPED = metrics.Counter("nta_capture_queue_dropped_total", "Packets dropped because the capture queue was full")
+ALERTS_DROPPED = metrics.Counter("nta_alert_queue_dropped_total", "Alerts dropped because the alert writer queue was full")
 
 
 def alert_model_to_dict(alert: Alert) -> Dict[str, Any]:
-    """Convert ORM Alert model into serializable dict for frontend."""
+    """Convert ORM Alert model (or an ALERT_COLUMNS row) into serializable dict for frontend."""
     return {
         "id": alert.id,
         "type": alert.type,
@@ -50,14 +93,14 @@ def alert_model_to_dict(alert: Alert) -> Dict[str, Any]:
     }
 
 
-def enrich_alert(src_ip: str, dst_ip: str, message: str, port: int | None = None) -> Dict[str, Any]:
+def enrich_alert(src_ip: str, dst_ip: str, message: str, port: int | None = None,
+                 alert_type: str | None = None) -> Dict[str, Any]:
     """Run full enrichment pipeline for a detected alert."""
     try:
-        vt_stats = check_ip_virustotal(src_ip)
-        abuse_score = check_ip_abuseipdb(src_ip)
-        geo_info = geolocate_ip(src_ip)
-        isp = lookup_isp(src_ip)
-        threat_score = compute_threat_score(vt_stats, abuse_score)
+        intel = assess_ip(src_ip)
+        geo_info = intel["geo"]
+        isp = intel["isp"]
+        threat_score = intel["threat_score"]
 
         severity = (
             "high" if threat_score >= 7
@@ -65,7 +108,7 @@ def enrich_alert(src_ip: str, dst_ip: str, message: str, port: int | None = None
             else "low"
         )
 
-        alert_type = "Unusual Port" if port else "Suspicious Activity"
+        alert_type = alert_type or ("Unusual Port" if port else "Suspicious Activity")
 
         geo_summary = (
             f"{geo_info.get('city', '-')}, "
@@ -89,6 +132,7 @@ def enrich_alert(src_ip: str, dst_ip: str, message: str, port: int | None = None
                 "timezone": geo_info.get("timezone"),
                 "latitude": geo_info.get("latitude"),
                 "longitude": geo_info.get("longitude"),
+                "ip_list": intel["ip_list"],
             },
             "resolved": False,
             "geo_info": geo_summary,
@@ -101,82 +145,235 @@ def enrich_alert(src_ip: str, dst_ip: str, message: str, port: int | None = None
         raise
 
 
-def process_packet(pkt, db: Session):
-    """Analyze packet and create alerts if suspicious activity is found."""
-    from scapy.all import IP, TCP, UDP
-
+def process_packet(pkt, db: Session, weight: int = 1):
+    """Analyze a captured scapy packet and create alerts if suspicious activity is found.
+
+    ``weight`` is how many packets it stands for under sampling. The flow
+    stage and traffic counters only take it from here while the packet
+    buffer sniffer is off; otherwise that one already counts the packet.
+    """
+    from scapy.all import IP
+
+    if IP not in pkt:
+        return
+    timed = packet_sampler.tick()
+    start = time.perf_counter() if timed else 0.0
+    record = decode_packet(pkt)
+    if timed:
+        STAGE_DECODE.observe(time.perf_counter() - start)
+    if record.get("src") and not traffic.capture_running():
+        flows.observe(record, weight)
+        traffic_series.observe_packet(record, weight)
+    process_record(record, db, timed=timed, weight=weight)
+
+
+def detect_record(record: Dict[str, Any], rules=rule_engine, dns=dns_analytics,
+                  scans=scan_detector, bursts=burst_detector,
+                  weight: int = 1) -> List[Tuple[str, str, Dict[str, Any] | None]]:
+    """(alert type, message, extra details) for every detector a packet trips.
+
+    Live capture uses the shared detectors; the backtest and pcap uploads
+    pass their own so recorded timestamps never land in the live windows.
+    ``weight`` is how many packets the record stands for under sampling.
+    """
+    detections = []
+    matched = rules.match(record)
+    if matched:
+        rule, message = matched
+        detections.append((rule.alert_type, message, None))
+
+    # DNS analytics only count queries, responses carry the same name
+    if record.get("dns") and record.get("dport") == 53:
+        for found in dns.observe(record["dns"], record["src"], record.get("ts")):
+            details = found["details"]
+            detections.append((found["type"], details["message"], details))
+
+    for found in scans.observe(record) + bursts.observe(record, weight):
+        details = found["details"]
+        detections.append((found["type"], details["message"], details))
+    return detections
+
+
+def process_record(record: Dict[str, Any], db: Session, timed: bool = False, weight: int = 1):
+    """Run every live detector over a decoded packet and store any alerts."""
     try:
-        if IP not in pkt:
+        if not record.get("src"):
             return
 
-        src_ip = pkt[IP].src
-        dst_ip = pkt[IP].dst
-        port = None
+        start = time.perf_counter() if timed else 0.0
+        detections = detect_record(record, weight=weight)
+        if timed:
+            STAGE_DETECT.observe(time.perf_counter() - start)
 
-        if TCP in pkt:
-            port = pkt[TCP].dport
-        elif UDP in pkt:
-            port = pkt[UDP].dport
+        for alert_type, message, extra in detections:
+            store_alert(record, alert_type, message, extra, db)
 
-        alert_type, message = None, None
-        if port and port not in [80, 443, 22, 53]:
-            alert_type, message = "Unusual Port", f"Connection to uncommon port {port}"
-        elif port and port > 49152:
-            alert_type, message = "Ephemeral Port Spike", f"Potential port scan on {port}"
+    except Exception as e:
+        PIPELINE_ERRORS.inc()
+        logger.exception(f"Error processing packet: {e}")
 
-        if not alert_type:
-            return
 
-        enriched = enrich_alert(src_ip, dst_ip, message, port)
+def build_alert(record: Dict[str, Any], alert_type: str, message: str,
+                extra: Dict[str, Any] | None) -> Dict[str, Any]:
+    """Enriched alert for one detection, before it is stored."""
+    enriched = enrich_alert(record["src"], record.get("dst"), message, record.get("dport"), alert_type)
+    if extra:
+        enriched["details"].update({k: v for k, v in extra.items() if k not in enriched["details"]})
+    if record.get("sensor"):
+        enriched["details"]["sensor"] = record["sensor"]
+    return enriched
+
+
+def alert_row(enriched: Dict[str, Any]) -> Alert:
+    """Unsaved Alert row for a build_alert result."""
+    return Alert(
+        type=enriched["type"],
+        details=enriched["details"],
+        created_at=datetime.utcnow(),
+        resolved=False,
+        threat_score=enriched["threat_score"],
+        geo_info=enriched["geo_info"],
+        isp=enriched["isp"],
+    )
+
+
+def store_alert(record: Dict[str, Any], alert_type: str, message: str,
+                extra: Dict[str, Any] | None, db: Session):
+    """Enrich, persist and broadcast one detection."""
+    src_ip = record["src"]
+    start = time.perf_counter()
+    enriched = build_alert(record, alert_type, message, extra)
+    STAGE_ENRICH.observe(time.perf_counter() - start)
+
+    db_alert = alert_row(enriched)
+    start = time.perf_counter()
+    db.add(db_alert)
+    db.commit()
+    db.refresh(db_alert)
+    STAGE_DB.observe(time.perf_counter() - start)
+
+    serialized = alert_model_to_dict(db_alert)
+    with deque_lock:
+        alerts_deque.append(serialized)
+    alert_store_version.bump()
+    ALERTS_STORED.labels(alert_type).inc()
+    traffic_series.observe_alert(record)
 
-        db_alert = Alert(
-            type=enriched["type"],
-            details=enriched["details"],
-            created_at=datetime.utcnow(),
-            resolved=False,
-            threat_score=enriched["threat_score"],
-            geo_info=enriched["geo_info"],
-            isp=enriched["isp"],
-        )
-        db.add(db_alert)
-        db.commit()
-        db.refresh(db_alert)
+    logger.info(f"Stored alert {db_alert.id} from {src_ip} ({message})")
 
-        serialized = alert_model_to_dict(db_alert)
-        with deque_lock:
-            alerts_deque.append(serialized)
+    notify_alert(f"🚨 {enriched['type']} from {src_ip} — {message}")
 
-        logger.info(f"Stored alert {db_alert.id} from {src_ip} ({message})")
 
-        try:
-            asyncio.run(notify_all(f"🚨 {enriched['type']} from {src_ip} — {message}"))
-        except Exception as e:
-            logger.warning(f"Notification send failed: {e}")
+def notify_alert(text: str):
+    """Hand a notification to the server loop without waiting for it.
 
-    except Exception as e:
-        logger.exception(f"Error processing packet: {e}")
+    ws_fanout covers hand-off plus sending to every client, timed when the
+    loop finishes the send.
+    """
+    start = time.perf_counter()
+    try:
+        future = notify_threadsafe(text)
+    except RuntimeError as e:  # loop closed during shutdown
+        logger.warning(f"Notification send failed: {e}")
+        return
+    if future is None:
+        return
+
+    def done(f):
+        STAGE_NOTIFY.observe(time.perf_counter() - start)
+        if not f.cancelled() and f.exception() is not None:
+            logger.warning(f"Notification send failed: {f.exception()}")
+
+    future.add_done_callback(done)
+
+
+def alert_writer():
+    """Enrich and store alerts handed over by submit_alert, one at a time."""
+    db = SessionLocal()
+    try:
+        while True:
+            record, alert_type, message, extra = alert_queue.get()
+            try:
+                store_alert(record, alert_type, message, extra, db)
+            except Exception as e:
+                PIPELINE_ERRORS.inc()
+                db.rollback()
+                logger.exception(f"Error storing {alert_type} alert: {e}")
+    finally:
+        db.close()
+
+
+_writer_lock = threading.Lock()
+_writer_thread = None
+
+
+def _ensure_alert_writer():
+    global _writer_thread
+    if _writer_thread is not None:
+        return
+    with _writer_lock:
+        if _writer_thread is None:
+            _writer_thread = threading.Thread(target=alert_writer, name="alert-writer", daemon=True)
+            _writer_thread.start()
+
+
+def submit_alert(record: Dict[str, Any], alert_type: str, message: str, extra: Dict[str, Any] | None = None):
+    """Queue a detection for store_alert on the alert writer thread; drops (and counts) when full."""
+    _ensure_alert_writer()
+    try:
+        alert_queue.put_nowait((record, alert_type, message, extra))
+    except queue.Full:
+        ALERTS_DROPPED.inc()
+
+
+def detection_worker():
+    """Drain the capture queue through the detectors until capture stops."""
+    db = SessionLocal()
+    try:
+        while not stop_flag:
+            try:
+                pkt, weight = capture_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            process_packet(pkt, db, weight)
+    finally:
+        db.close()
+
+
+def enqueue_packet(pkt):
+    """Live sniff callback: sample, then queue (packet, weight) for the detection worker."""
+    if stop_flag:
+        return
+    weight = live_sampler.weight(pkt, capture_queue.qsize() / CAPTURE_QUEUE_SIZE)
+    if not weight:
+        return
+    try:
+        capture_queue.put_nowait((pkt, weight))
+    except queue.Full:
+        QUEUE_DROPPED.inc()
 
 
 def live_capture_thread():
-    """Live sniffing thread — captures and processes packets continuously."""
+    """Live sniffing thread — hands packets to the detection worker.
+
+    The sniff callback only samples and enqueues, so a slow detector (or
+    an alert waiting on enrichment) can't stall the capture itself.
+    """
     from scapy.all import sniff
 
     global stop_flag
     stop_flag = False
-    db = SessionLocal()
+    worker = threading.Thread(target=detection_worker, name="detection-worker", daemon=True)
+    worker.start()
     logger.info("Live capture thread started")
 
-    def pkt_callback(pkt):
-        if stop_flag:
-            return False
-        process_packet(pkt, db)
-
     try:
-        sniff(filter="ip", prn=pkt_callback, store=False)
+        sniff(filter="ip", prn=enqueue_packet, store=False, stop_filter=lambda _: stop_flag)
     except Exception as e:
         logger.exception(f"Sniff error: {e}")
     finally:
-        db.close()
+        stop_flag = True
+        worker.join(2.0)
         logger.info("Live capture stopped")
 
 
@@ -187,7 +384,7 @@ def start_live_monitoring():
         return {"status": "already running"}
 
     stop_flag = False
-    capture_thread = threading.Thread(target=live_capture_thread, daemon=True)
+    capture_thread = threading.Thread(target=live_capture_thread, name="live-capture", daemon=True)
     capture_thread.start()
     logger.info("Started live monitoring")
     return {"status": "live monitoring started"}
@@ -201,10 +398,109 @@ def stop_live_monitoring():
     return {"status": "stopped"}
 
 
+@router.get("/rules")
+def get_rule_stats(admin=Depends(require_admin)) -> Dict[str, Any]:
+    """Active detection rules with hit counts and evaluation times."""
+    return {
+        "loaded_at": rule_engine.loaded_at,
+        "thresholds": rule_engine.thresholds,
+        "rules": rule_engine.stats(),
+    }
+
+
+@router.get("/dns")
+def get_dns_stats(limit: int = 20) -> Dict[str, Any]:
+    """Busiest registered domains in the current DNS analytics window."""
+    return {
+        "queries_seen": dns_analytics.queries_seen,
+        "tracked_domains": len(dns_analytics.domains),
+        "max_domains": dns_analytics.max_domains,
+        "window_seconds": dns_analytics.window,
+        "top_domains": dns_analytics.top_domains(limit),
+    }
+
+
+@router.get("/scans")
+def get_scan_stats() -> Dict[str, Any]:
+    """Keys tracked by the windowed scan detector and their sketch memory."""
+    return scan_detector.stats()
+
+
+# Rollup column and position in maintenance.rollup_key for each /stats grouping
+STATS_GROUPS = {
+    "type": (AlertRollup.type, 0),
+    "severity": (AlertRollup.severity, 1),
+    "src": (AlertRollup.src_ip, 2),
+    "country": (AlertRollup.country, 3),
+}
+STATS_HOURLY_MAX_HOURS = 72
+
+
+@router.get("/stats")
+async def get_alert_stats(
+    hours: int = Query(24, ge=1, le=24 * 3650),
+    group_by: str = Query("type", pattern="^(type|severity|src|country)$"),
+    limit: int = Query(20, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db),
+) -> Dict[str, Any]:
+    """Alert counts over the last `hours`, grouped and as a time series.
+
+    Completed hours come from the rollups (hourly up to 72h, daily beyond),
+    so long ranges never scan the raw table; only alerts newer than the
+    rollup watermark are read raw.
+    """
+    now = datetime.utcnow()
+    resolution = HOUR if hours <= STATS_HOURLY_MAX_HOURS else DAY
+    floor = floor_hour if resolution == HOUR else floor_day
+    start = floor(now - timedelta(hours=hours))
+    column, key_index = STATS_GROUPS[group_by]
+
+    last = await db.scalar(select(func.max(AlertRollup.bucket)).where(AlertRollup.resolution == HOUR))
+    watermark = last + timedelta(hours=1) if last else None
+
+    groups: Counter = Counter()
+    series: Counter = Counter()
+    if watermark is not None and watermark > start:
+        rows = await db.execute(
+            select(AlertRollup.bucket, column, func.sum(AlertRollup.count))
+            .where(AlertRollup.resolution == resolution, AlertRollup.bucket >= start,
+                   AlertRollup.bucket < watermark)
+            .group_by(AlertRollup.bucket, column)
+        )
+        for bucket, key, count in rows.all():
+            groups[key] += count
+            series[bucket] += count
+
+    raw_from = max(start, watermark) if watermark else start
+    rows = await db.execute(select(Alert.created_at, Alert.type, Alert.details).where(Alert.created_at >= raw_from))
+    for created_at, alert_type, details in rows.all():
+        groups[rollup_key(alert_type, details)[key_index]] += 1
+        series[floor(created_at)] += 1
+
+    return {
+        "from": start.isoformat(),
+        "to": now.isoformat(),
+        "resolution": resolution,
+        "group_by": group_by,
+        "rolled_up_until": watermark.isoformat() if watermark else None,
+        "total": sum(series.values()),
+        "groups": [[key or "unknown", count] for key, count in groups.most_common(limit)],
+        "series": [[bucket.isoformat(), series[bucket]] for bucket in sorted(series)],
+    }
+
+
+@router.post("/rules/reload")
+def reload_rule_set(admin=Depends(require_admin)):
+    try:
+        reload_rules()
+    except (OSError, ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"Failed to load rules: {e}")
+    return {"status": "reloaded", "rules": len(rule_engine.rules)}
+
+
 @router.post("/test", summary="Insert a test alert (dev only)")
-def insert_test_alert():
+async def insert_test_alert(db: AsyncSession = Depends(get_async_db)):
     """Manually insert a synthetic test alert for frontend dev."""
-    db = SessionLocal()
     try:
         created_at = datetime.utcnow()
         details = {
@@ -227,12 +523,13 @@ def insert_test_alert():
             isp=details["isp"],
         )
         db.add(db_alert)
-        db.commit()
-        db.refresh(db_alert)
+        await db.commit()
+        await db.refresh(db_alert)
 
         serialized = alert_model_to_dict(db_alert)
         with deque_lock:
             alerts_deque.appendleft(serialized)
+        alert_store_version.bump()
 
         logger.info(f"Inserted synthetic test alert id={db_alert.id}")
         return {"ok": True, "alert": serialized}
@@ -240,21 +537,16 @@ def insert_test_alert():
     except Exception as e:
         logger.exception("Failed to insert test alert")
         raise HTTPException(status_code=500, detail="Failed to insert test alert")
-    finally:
-        db.close()
 
 
-@router.get("/", response_model=List[AlertOut])
-def get_alerts():
-    db = SessionLocal()
+async def load_alerts(db: AsyncSession) -> List[Dict[str, Any]]:
+    """Merged alert list as plain dicts in AlertOut shape, ready for encode_json."""
     try:
-        persisted = db.query(Alert).order_by(Alert.created_at.desc()).limit(200).all()
-        persisted_serialized = [alert_model_to_dict(a) for a in persisted]
+        rows = await db.execute(select(*ALERT_COLUMNS).order_by(Alert.created_at.desc()).limit(200))
+        persisted_serialized = [alert_model_to_dict(a) for a in rows.all()]
     except Exception as e:
         logger.exception("DB read failed")
         persisted_serialized = []
-    finally:
-        db.close()
 
     with deque_lock:
         combined = persisted_serialized + list(alerts_deque)
@@ -269,4 +561,15 @@ def get_alerts():
         result.append(a)
 
     result.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-    return [AlertOut(**r) for r in result]
+    return result
+
+
+@router.get("/", response_model=List[AlertOut])
+async def get_alerts(request: Request, db: AsyncSession = Depends(get_async_db)):
+    version = alert_store_version.value
+    etag = make_etag("alerts", version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    entry = await response_cache.get_async("alerts", version, lambda: load_alerts(db), ALERT_LIST)
+    return cached_response(request, entry)
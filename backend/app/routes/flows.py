@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Query
+from typing import List, Dict, Any
+
+from ..flows import flow_table, completed_flows, flow_alerts
+
+router = APIRouter()
+
+SORT_KEYS = {"bytes", "packets", "duration", "last_seen"}
+
+
+@router.get("/")
+def get_top_flows(
+    limit: int = Query(20, ge=1, le=500),
+    sort: str = Query("bytes"),
+) -> Dict[str, Any]:
+    """Top active flows, largest first."""
+    if sort not in SORT_KEYS:
+        sort = "bytes"
+    return {
+        "active": len(flow_table),
+        "evicted": flow_table.evicted,
+        "flows": flow_table.top(limit, by=sort),
+    }
+
+
+@router.get("/completed")
+def get_completed_flows(limit: int = Query(50, ge=1, le=500)) -> List[Dict[str, Any]]:
+    return list(completed_flows)[-limit:][::-1]
+
+
+@router.get("/alerts")
+def get_flow_alerts() -> List[Dict[str, Any]]:
+    return list(flow_alerts)[::-1]
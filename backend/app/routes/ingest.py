@@ -0,0 +1,190 @@
+"""Central side of distributed capture: sensors (app.sensor) POST decoded
+packet batches here (format in wire.py) and this instance runs detection,
+enrichment and storage on them.
+
+Batches are queued for a single worker thread, so the request returns as
+soon as the batch is decoded and its sequence number checked; a full queue
+answers 503 + Retry-After and the sensor resends. Repeated sequence numbers
+(a resend whose first attempt did arrive) are acknowledged and dropped.
+"""
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+from threading import Lock, Thread
+import hmac
+import logging
+import os
+import queue
+import time
+
+from ..auth import require_admin
+from ..database import SessionLocal
+from ..wire import BatchError, decode_batch
+from .. import flows, metrics
+from ..timeseries import traffic_series
+from .alerts import process_record
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Shared secret for sensors; ingest is disabled while unset
+INGEST_TOKEN = os.getenv("INGEST_TOKEN")
+INGEST_MAX_BATCH_BYTES = int(os.getenv("INGEST_MAX_BATCH_BYTES", 8 * 1024 * 1024))  # compressed
+INGEST_MAX_INFLATED_BYTES = int(os.getenv("INGEST_MAX_INFLATED_BYTES", 64 * 1024 * 1024))
+INGEST_MAX_RECORDS = int(os.getenv("INGEST_MAX_RECORDS", 20000))
+INGEST_QUEUE_BATCHES = int(os.getenv("INGEST_QUEUE_BATCHES", 64))
+
+
+class SensorState:
+    """Sequence bookkeeping for one sensor; a new ``boot`` id means it restarted."""
+
+    __slots__ = ("boot", "next_seq", "batches", "records", "lost", "duplicates", "restarts", "last_seen")
+
+    def __init__(self, boot: str):
+        self.boot = boot
+        self.next_seq = None
+        self.batches = 0
+        self.records = 0
+        self.lost = 0
+        self.duplicates = 0
+        self.restarts = 0
+        self.last_seen = 0.0
+
+    def check(self, boot: str, seq: int) -> bool:
+        """False for a batch already received; gaps only count within one boot."""
+        if boot != self.boot:
+            self.boot = boot
+            self.next_seq = None
+            self.restarts += 1
+        if self.next_seq is not None and seq < self.next_seq:
+            self.duplicates += 1
+            return False
+        return True
+
+    def accept(self, seq: int, count: int):
+        if self.next_seq is not None:
+            self.lost += seq - self.next_seq
+        self.next_seq = seq + 1
+        self.batches += 1
+        self.records += count
+        self.last_seen = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        expected = self.batches + self.lost
+        return {
+            "boot": self.boot,
+            "last_seq": self.next_seq - 1 if self.next_seq is not None else None,
+            "batches": self.batches,
+            "records": self.records,
+            "lost_batches": self.lost,
+            "loss_ratio": round(self.lost / expected, 4) if expected else 0.0,
+            "duplicates": self.duplicates,
+            "restarts": self.restarts,
+            "last_seen": datetime.utcfromtimestamp(self.last_seen).isoformat() if self.last_seen else None,
+        }
+
+
+sensors: Dict[str, SensorState] = {}
+sensors_lock = Lock()
+ingest_queue: "queue.Queue" = queue.Queue(maxsize=INGEST_QUEUE_BATCHES)
+
+metrics.Counter("nta_ingest_batches_total", "Batches accepted from sensors", ["sensor"],
+                fn=lambda: {(name, ): s.batches for name, s in list(sensors.items())})
+metrics.Counter("nta_ingest_records_total", "Packet records accepted from sensors", ["sensor"],
+                fn=lambda: {(name, ): s.records for name, s in list(sensors.items())})
+metrics.Counter("nta_ingest_lost_batches_total", "Batches missing from sensor sequence numbers", ["sensor"],
+                fn=lambda: {(name, ): s.lost for name, s in list(sensors.items())})
+metrics.Gauge("nta_ingest_queue_depth", "Sensor batches waiting for the ingest worker", fn=lambda: ingest_queue.qsize())
+INGEST_PROCESSED = metrics.Counter("nta_ingest_processed_total", "Sensor records run through detection")
+INGEST_RECORD_ERRORS = metrics.Counter("nta_ingest_record_errors_total",
+                                       "Sensor records dropped because they failed in the ingest worker")
+INGEST_REJECTED = metrics.Counter("nta_ingest_rejected_total", "Batches refused (malformed, or queue full)", ["reason"])
+
+
+def process_batch(sensor: str, records: List[Dict[str, Any]], db):
+    """Run one sensor batch through the flow stage and detection; a bad record is counted and skipped."""
+    for record in records:
+        try:
+            ts = record.get("ts") or time.time()
+            record["timestamp"] = datetime.utcfromtimestamp(ts)
+            record["sensor"] = sensor
+            flows.observe(record)
+            traffic_series.observe_packet(record)
+            process_record(record, db)
+        except Exception as e:
+            INGEST_RECORD_ERRORS.inc()
+            logger.warning(f"Dropped a record from {sensor}: {e!r}")
+    INGEST_PROCESSED.inc(len(records))
+
+
+def ingest_worker():
+    """Run detection over queued sensor batches, one batch at a time."""
+    db = SessionLocal()
+    try:
+        while True:
+            sensor, records = ingest_queue.get()
+            process_batch(sensor, records, db)
+    finally:
+        db.close()
+
+
+_worker_lock = Lock()
+_worker_thread: Optional[Thread] = None
+
+
+def _ensure_worker():
+    global _worker_thread
+    if _worker_thread is not None:
+        return
+    with _worker_lock:
+        if _worker_thread is None:
+            _worker_thread = Thread(target=ingest_worker, name="ingest-worker", daemon=True)
+            _worker_thread.start()
+
+
+def require_ingest_token(authorization: Optional[str] = Header(None)):
+    if not INGEST_TOKEN:
+        raise HTTPException(status_code=503, detail="Ingest is disabled (INGEST_TOKEN not set)")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), INGEST_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid ingest token")
+
+
+@router.post("", status_code=202, dependencies=[Depends(require_ingest_token)])
+async def ingest_batch(request: Request) -> Dict[str, Any]:
+    """Accept one compressed batch of decoded packets from a sensor."""
+    body = await request.body()
+    if len(body) > INGEST_MAX_BATCH_BYTES:
+        INGEST_REJECTED.labels("too_large").inc()
+        raise HTTPException(status_code=413, detail=f"Batch over {INGEST_MAX_BATCH_BYTES} bytes")
+    try:
+        header, records = decode_batch(body, INGEST_MAX_INFLATED_BYTES, INGEST_MAX_RECORDS)
+    except BatchError as e:
+        INGEST_REJECTED.labels("malformed").inc()
+        raise HTTPException(status_code=400, detail=str(e))
+
+    sensor, boot, seq = header["sensor"], header["boot"], header["seq"]
+    _ensure_worker()
+    with sensors_lock:
+        state = sensors.get(sensor)
+        if state is None:
+            state = sensors[sensor] = SensorState(boot)
+        if not state.check(boot, seq):
+            return {"sensor": sensor, "seq": seq, "status": "duplicate", "lost_batches": state.lost}
+        try:
+            ingest_queue.put_nowait((sensor, records))
+        except queue.Full:
+            INGEST_REJECTED.labels("busy").inc()
+            raise HTTPException(status_code=503, detail="Ingest queue full, retry shortly",
+                                headers={"Retry-After": "1"})
+        state.accept(seq, len(records))
+        lost = state.lost
+
+    return {"sensor": sensor, "seq": seq, "status": "queued", "accepted": len(records), "lost_batches": lost}
+
+
+@router.get("/sensors", dependencies=[Depends(require_admin)])
+def get_sensors() -> List[Dict[str, Any]]:
+    """Per-sensor batch, record and loss counts."""
+    with sensors_lock:
+        return [{"sensor": name, **state.to_dict()} for name, state in sorted(sensors.items())]
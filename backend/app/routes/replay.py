@@ -1,22 +1,20 @@
 from fastapi import APIRouter, UploadFile, HTTPException, Query, Depends
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import os
-import pyshark
-from scapy.all import sniff, IP, TCP, UDP
 from collections import Counter
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..schemas import PacketOut, AlertOut
-from ..database import get_db
+from ..database import get_async_db
 from ..models import Alert
-from ..threat_intel import (
-    check_ip_virustotal,
-    check_ip_abuseipdb,
-    geolocate_ip,
-    lookup_isp,
-    compute_threat_score,
-)
+from .alerts import alert_row, alert_store_version, build_alert, detect_record
+from ..rules import RuleEngine, load_rule_config
+from ..dns_analytics import DNSAnalytics
+from ..scans import ScanDetector
+from ..analysis import BurstDetector
 
 router = APIRouter()
 UPLOAD_DIR = "uploads"
@@ -64,24 +62,52 @@ def pyshark_pkt_to_model(pkt) -> PacketOut:
     )
 
 
-@router.post("/upload", response_model=List[PacketOut])
-async def upload_pcap(
-    file: UploadFile,
-    db: Session = Depends(get_db),
-    src_filter: Optional[str] = Query(None),
-    dst_filter: Optional[str] = Query(None),
-    proto_filter: Optional[str] = Query(None),
-    start_time: Optional[datetime] = Query(None),
-    end_time: Optional[datetime] = Query(None)
-):
+def pyshark_tcp_flags(pkt) -> Optional[int]:
+    """TCP flags as an int, as capture.packet_callback records them (tshark gives "0x0012")."""
+    if not hasattr(pkt, "tcp"):
+        return None
     try:
-        file_location = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_location, "wb") as f:
-            f.write(await file.read())
+        return int(str(pkt.tcp.flags), 16)
+    except (AttributeError, ValueError):
+        return None
+
+
+def pyshark_record(pkt, pkt_model: PacketOut) -> Dict[str, Any]:
+    """The decoded-packet dict the detectors take, as capture.packet_callback builds it."""
+    record = pkt_model.model_dump()
+    record["ts"] = pkt_model.timestamp.timestamp()
+    # without flags every TCP packet would count as a connection attempt
+    record["flags"] = pyshark_tcp_flags(pkt)
+    return record
+
+
+def _save_upload(file_location: str, content: bytes):
+    with open(file_location, "wb") as f:
+        f.write(content)
 
-        cap = pyshark.FileCapture(file_location, keep_packets=False)
-        packets: List[PacketOut] = []
 
+def _analyze_pcap(
+    file_location: str,
+    src_filter: Optional[str],
+    dst_filter: Optional[str],
+    proto_filter: Optional[str],
+    start_time: Optional[datetime],
+    end_time: Optional[datetime],
+):
+    """Parse and enrich a pcap. Blocking (tshark + HTTP), run it off the event loop."""
+    import pyshark
+
+    cap = pyshark.FileCapture(file_location, keep_packets=False)
+    packets: List[PacketOut] = []
+    alerts: List[Alert] = []
+    # fresh detectors per capture, so replayed packets neither land in the
+    # live windows nor count towards live rule hits
+    rules = RuleEngine(load_rule_config())
+    dns = DNSAnalytics(rules=rules)
+    scans = ScanDetector(rules=rules)
+    bursts = BurstDetector(rules=rules)
+
+    try:
         for i, pkt in enumerate(cap):
             pkt_model = pyshark_pkt_to_model(pkt)
 
@@ -98,49 +124,43 @@ async def upload_pcap(
 
             packets.append(pkt_model)
 
-            # Alerts (optional)
-            alert_type = None
-            message = None
-            port = pkt_model.dport
-            if port and port not in [80, 443, 22, 53]:
-                alert_type = "Unusual Port"
-                message = f"Connection to uncommon port {port}"
-
-            if pkt_model.dns and (len(pkt_model.dns) > 40 or any(c.isdigit() for c in pkt_model.dns[:10])):
-                alert_type = "Suspicious DNS Query"
-                message = f"Suspicious domain query: {pkt_model.dns}"
-
-            if alert_type and pkt_model.src:
-                vt_stats = check_ip_virustotal(pkt_model.src)
-                abuse_score = check_ip_abuseipdb(pkt_model.src)
-                geo_info = geolocate_ip(pkt_model.src)
-                isp = lookup_isp(pkt_model.src)
-                threat_score = compute_threat_score(vt_stats, abuse_score)
-
-                db_alert = Alert(
-                    type=alert_type,
-                    details={
-                        "src_ip": pkt_model.src,
-                        "dst_ip": pkt_model.dst,
-                        "message": message,
-                        "severity": "high" if threat_score >= 7 else "medium" if threat_score >= 4 else "low",
-                        "threat_score": threat_score,
-                        "geo": geo_info,
-                        "isp": isp
-                    },
-                    created_at=datetime.utcnow(),
-                    resolved=False,
-                    threat_score=threat_score,
-                    geo_info=str(geo_info),
-                    isp=isp
-                )
-                db.add(db_alert)
+            # Alerts (optional) - same detectors and enrichment as live capture
+            if pkt_model.src:
+                record = pyshark_record(pkt, pkt_model)
+                detections = detect_record(record, rules=rules, dns=dns, scans=scans, bursts=bursts)
+                for alert_type, message, extra in detections:
+                    alerts.append(alert_row(build_alert(record, alert_type, message, extra)))
 
             if i >= 200:
                 break
-
-        db.commit()
+    finally:
         cap.close()
+
+    return packets, alerts
+
+
+@router.post("/upload", response_model=List[PacketOut])
+async def upload_pcap(
+    file: UploadFile,
+    db: AsyncSession = Depends(get_async_db),
+    src_filter: Optional[str] = Query(None),
+    dst_filter: Optional[str] = Query(None),
+    proto_filter: Optional[str] = Query(None),
+    start_time: Optional[datetime] = Query(None),
+    end_time: Optional[datetime] = Query(None)
+):
+    try:
+        file_location = os.path.join(UPLOAD_DIR, file.filename)
+        await run_in_threadpool(_save_upload, file_location, await file.read())
+
+        packets, alerts = await run_in_threadpool(
+            _analyze_pcap, file_location, src_filter, dst_filter, proto_filter, start_time, end_time
+        )
+
+        db.add_all(alerts)
+        await db.commit()
+        if alerts:
+            alert_store_version.bump()
         return packets
 
     except Exception as e:
@@ -148,11 +168,13 @@ async def upload_pcap(
 
 
 @router.get("/alerts", response_model=List[AlertOut])
-async def get_alerts_from_db(db: Session = Depends(get_db)):
+async def get_alerts_from_db(db: AsyncSession = Depends(get_async_db)):
     try:
-        persisted = db.query(Alert).order_by(Alert.created_at.desc()).limit(50).all()
+        rows = await db.execute(select(Alert).order_by(Alert.created_at.desc()).limit(50))
+        persisted = rows.scalars().all()
         return [
             AlertOut(
+                id=a.id,
                 created_at=a.created_at,
                 type=a.type,
                 details=a.details,
@@ -165,6 +187,8 @@ async def get_alerts_from_db(db: Session = Depends(get_db)):
 
 @router.get("/summary")
 def get_replay_summary() -> Dict[str, Any]:
+    from scapy.all import sniff, IP, TCP, UDP
+
     try:
         packets = sniff(count=100, filter="ip", timeout=5)
         talker_counts = Counter()
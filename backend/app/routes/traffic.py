@@ -1,23 +1,47 @@
-from fastapi import APIRouter
-from scapy.all import sniff, IP, TCP, UDP
+from fastapi import APIRouter, HTTPException, Query, Request
 from datetime import datetime
-from typing import List
-import pyshark
+from typing import List, Optional
+import logging
 import os
+import time
 from collections import deque, Counter
-from threading import Thread, Lock
+from threading import Event, Thread, Lock
+from pydantic import TypeAdapter
 from ..schemas import PacketOut
+from ..capture import packet_callback as decode_packet
+from .. import flows, metrics
+from ..sampling import buffer_sampler
+from ..timeseries import traffic_series
+from ..cache import VersionCounter, response_cache, make_etag, etag_matches, not_modified, cached_response
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Validates the cached packet list once per rebuild, in place of response_model
+PACKET_LIST = TypeAdapter(List[PacketOut])
+
+# Interface for the live packet buffer sniffer; scapy's default route iface when unset
+CAPTURE_IFACE = os.getenv("CAPTURE_IFACE") or None
 
 # ------------------------------
 # Rolling buffer for live packets
 # ------------------------------
 BUFFER_SIZE = 500
 packet_buffer = deque(maxlen=BUFFER_SIZE)
+# Sampling weight of each buffered packet, kept in step with packet_buffer
+packet_weights = deque(maxlen=BUFFER_SIZE)
 buffer_lock = Lock()
+# Buffered packets are plain dicts with exactly these keys (PacketOut shape)
+PACKET_FIELDS = tuple(PacketOut.model_fields)
+# Bumped on every buffered packet; backs the ETags on /live and /summary
+buffer_version = VersionCounter()
+
+metrics.Gauge("nta_packet_buffer_size", "Packets held in the live packet buffer", fn=lambda: len(packet_buffer))
+metrics.Gauge("nta_packet_buffer_capacity", "Capacity of the live packet buffer", fn=lambda: BUFFER_SIZE)
 
 def packet_to_model(pkt) -> PacketOut:
+    from scapy.all import IP, TCP, UDP
+
     proto = None
     if IP in pkt:
         proto_num = pkt[IP].proto
@@ -98,39 +122,77 @@ def pyshark_pkt_to_model(pkt) -> PacketOut:
 # ------------------------------
 # Background sniff thread
 # ------------------------------
+def packet_row(record: dict) -> dict:
+    """Project a decoded packet onto the PacketOut fields without building a model."""
+    row = {k: record.get(k) for k in PACKET_FIELDS}
+    row["id"] = 0
+    return row
+
 def packet_callback(pkt):
-    model = packet_to_model(pkt)
+    weight = buffer_sampler.weight(pkt)
+    if not weight:
+        return
+    record = decode_packet(pkt)
+    flows.observe(record, weight)
+    traffic_series.observe_packet(record, weight)
+    row = packet_row(record)
     with buffer_lock:
-        packet_buffer.append(model)
+        packet_buffer.append(row)
+        packet_weights.append(weight)
+    buffer_version.bump()
 
-def start_sniff():
-    sniff(prn=packet_callback, filter="ip", store=False)
+sniff_thread: Optional[Thread] = None
+sniff_stop = Event()
 
-sniff_thread = Thread(target=start_sniff, daemon=True)
-sniff_thread.start()
+def start_sniff():
+    from scapy.all import sniff
+
+    try:
+        sniff(prn=packet_callback, filter="ip", store=False, iface=CAPTURE_IFACE,
+              stop_filter=lambda _: sniff_stop.is_set())
+    except Exception as e:
+        logger.error(f"Packet buffer sniff failed: {e}")
+
+def start_capture():
+    """Start the packet buffer sniffer (from the app lifespan); no-op if running."""
+    global sniff_thread
+    if sniff_thread and sniff_thread.is_alive():
+        return
+    sniff_stop.clear()
+    sniff_thread = Thread(target=start_sniff, name="traffic-sniff", daemon=True)
+    sniff_thread.start()
+
+def capture_running() -> bool:
+    return bool(sniff_thread and sniff_thread.is_alive())
+
+def stop_capture(timeout: float = 2.0):
+    """Ask the sniffer to stop; it exits on the next packet (daemon, so never blocks shutdown)."""
+    sniff_stop.set()
+    if sniff_thread and sniff_thread.is_alive():
+        sniff_thread.join(timeout)
 
 # ------------------------------
 # Routes
 # ------------------------------
-@router.get("/live", response_model=List[PacketOut])
-def get_live_packets() -> List[PacketOut]:
+def live_packets() -> List[dict]:
     with buffer_lock:
         # Return the latest 20 packets from buffer
         return list(packet_buffer)[-20:]
 
-@router.get("/summary")
-def get_summary():
+def summarize_buffer():
     with buffer_lock:
-        packets = list(packet_buffer)
+        packets = list(zip(packet_buffer, packet_weights))
 
+    # Counts are estimates of the traffic the buffer stands for: a packet
+    # kept while sampling 1 in N counts N times
     talker_counts = Counter()
     proto_counts = Counter()
 
-    for pkt in packets:
-        if pkt.src:
-            talker_counts[pkt.src] += 1
-        if pkt.proto:
-            proto_counts[pkt.proto] += 1
+    for pkt, weight in packets:
+        if pkt["src"]:
+            talker_counts[pkt["src"]] += weight
+        if pkt["proto"]:
+            proto_counts[pkt["proto"]] += weight
 
     top_talkers = talker_counts.most_common(10)
     top_protocols = proto_counts.most_common(10)
@@ -138,4 +200,38 @@ def get_summary():
     return {
         "top_talkers": [[ip, count] for ip, count in top_talkers],
         "top_protocols": [[proto, count] for proto, count in top_protocols],
+        "sampling": buffer_sampler.status(),
     }
+
+def buffered_response(request: Request, key: str, build, adapter: Optional[TypeAdapter] = None):
+    version = buffer_version.value
+    etag = make_etag(key, version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return cached_response(request, response_cache.get(key, version, build, adapter))
+
+@router.get("/live", response_model=List[PacketOut])
+def get_live_packets(request: Request):
+    return buffered_response(request, "traffic-live", live_packets, PACKET_LIST)
+
+@router.get("/summary")
+def get_summary(request: Request):
+    return buffered_response(request, "traffic-summary", summarize_buffer)
+
+@router.get("/timeseries")
+def get_timeseries(
+    seconds: int = Query(600, ge=1, le=30 * 86400, description="range ending now, when start/end aren't given"),
+    start: Optional[float] = Query(None, description="epoch seconds"),
+    end: Optional[float] = Query(None, description="epoch seconds, default now"),
+    resolution: str = Query("auto", pattern="^(auto|second|minute|hour)$"),
+):
+    """Packets, bytes and alerts per bucket (and per protocol) from the pre-bucketed rings.
+
+    `auto` picks the finest resolution still holding the range: per second
+    for the last 10 minutes, per minute for 24 hours, per hour for 30 days.
+    """
+    end = end or time.time()
+    start = start if start is not None else end - seconds
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return traffic_series.query(start, end, resolution)
@@ -1,39 +1,62 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from .. import models, schemas, utils
-from ..auth import get_db, get_current_user
+from ..auth import get_current_user, invalidate_principal
+from ..database import get_async_db
 from ..utils import create_access_token
 
 router = APIRouter()
 
+def password_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many login attempts in progress, retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+async def get_user_by_username(db: AsyncSession, username: str):
+    rows = await db.execute(select(models.User).where(models.User.username == username))
+    return rows.scalars().first()
+
 @router.post("/register", response_model=schemas.UserOut)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await get_user_by_username(db, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username taken")
 
     # enforce role
     role = user.role if user.role in ["admin", "viewer"] else "viewer"
 
+    try:
+        password_hash = await utils.hash_password_async(user.password)
+    except utils.PasswordHasherBusy:
+        raise password_busy()
+
     new_user = models.User(
         username=user.username,
-        password_hash=utils.hash_password(user.password),
+        password_hash=password_hash,
         role=role
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    invalidate_principal(new_user.id)  # ids can be reused after deletes
     return new_user
 
 @router.post("/login", response_model=schemas.Token)
-def login(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
-    if not db_user or not utils.verify_password(user.password, db_user.password_hash):
+async def login(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await get_user_by_username(db, user.username)
+    try:
+        valid = db_user is not None and await utils.verify_password_async(user.password, db_user.password_hash)
+    except utils.PasswordHasherBusy:
+        raise password_busy()
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
     token = create_access_token({"sub": str(db_user.id), "role": db_user.role})
     return {"access_token": token, "token_type": "bearer"}
 
 @router.get("/me", response_model=schemas.UserOut)
-def read_users_me(current_user: models.User = Depends(get_current_user)):
+async def read_users_me(current_user: schemas.UserOut = Depends(get_current_user)):
     return current_user
@@ -0,0 +1,168 @@
+"""Declarative detection rules shared by live capture and pcap replay.
+
+A rule set is a dict (or a JSON file at RULES_PATH) with ordered per-packet
+``rules`` and the ``thresholds`` used by the windowed detectors in
+analysis.py. Rules are compiled once into plain predicates: port sets become
+65536-entry bitmaps, DNS patterns one pre-compiled alternation. The first
+matching rule wins.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import defaultdict
+from threading import Lock
+import copy
+import json
+import os
+import re
+import time
+
+RULES_PATH = os.getenv("RULES_PATH")
+
+DEFAULT_RULES: Dict[str, Any] = {
+    "rules": [
+        {
+            "name": "suspicious_dns",
+            "type": "dns_pattern",
+            # long names, or a digit within the first 10 characters
+            "patterns": [r"^.{41,}", r"^.{0,9}\d"],
+            "alert": "Suspicious DNS Query",
+            "message": "Suspicious domain query: {dns}",
+        },
+        {
+            "name": "unusual_port",
+            "type": "port_not_in",
+            "ports": [80, 443, 22, 53],
+            "alert": "Unusual Port",
+            "message": "Connection to uncommon port {dport}",
+        },
+    ],
+    "thresholds": {
+        "port_scan_ports": 50,
+        "host_scan_hosts": 50,
+        "distributed_scan_ports": 100,
+        "burst_packets": 100,
+        "burst_window": 10,
+        "payload_entropy": 7.5,
+        "flow_bytes": 10 * 1024 * 1024,
+        "flow_pps": 1000,
+        "flow_entropy": 7.5,
+        "flow_entropy_min_bytes": 48,
+        "dns_tunnel_queries": 20,
+        "dns_tunnel_subdomains": 50,
+        "dns_tunnel_entropy": 3.5,
+        "dga_min_length": 8,
+        "dga_ngram_score": 0.75,
+        "dga_entropy": 3.0,
+    },
+}
+
+
+def _port_bitmap(ports) -> bytearray:
+    bitmap = bytearray(65536)
+    for p in ports:
+        if isinstance(p, str) and "-" in p:
+            lo, hi = (int(x) for x in p.split("-", 1))
+            bitmap[lo:hi + 1] = b"\x01" * (hi - lo + 1)
+        else:
+            bitmap[int(p)] = 1
+    return bitmap
+
+
+def _compile_predicate(rule: Dict[str, Any]) -> Callable[[Dict], bool]:
+    kind = rule["type"]
+    field = rule.get("field", "dport")
+
+    if kind == "port_in":
+        bitmap = _port_bitmap(rule["ports"])
+        return lambda pkt: bool(pkt.get(field)) and bitmap[pkt[field]] == 1
+
+    if kind == "port_not_in":
+        bitmap = _port_bitmap(rule["ports"])
+        return lambda pkt: bool(pkt.get(field)) and bitmap[pkt[field]] == 0
+
+    if kind == "port_range":
+        lo, hi = int(rule.get("min", 0)), int(rule.get("max", 65535))
+        return lambda pkt: bool(pkt.get(field)) and lo <= pkt[field] <= hi
+
+    if kind == "dns_pattern":
+        regex = re.compile("|".join(f"(?:{p})" for p in rule["patterns"]), re.IGNORECASE)
+        search = regex.search
+        return lambda pkt: bool(pkt.get("dns")) and search(pkt["dns"]) is not None
+
+    if kind == "entropy_above":
+        from .analysis import shannon_entropy
+        threshold = float(rule["threshold"])
+        return lambda pkt: bool(pkt.get("payload_sample")) and shannon_entropy(pkt["payload_sample"]) > threshold
+
+    if kind == "length_above":
+        threshold = int(rule["threshold"])
+        return lambda pkt: (pkt.get("length") or 0) > threshold
+
+    raise ValueError(f"Unknown rule type: {kind}")
+
+
+class CompiledRule:
+    __slots__ = ("name", "alert_type", "message", "predicate", "hits", "evaluations", "eval_ns")
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.name = spec["name"]
+        self.alert_type = spec["alert"]
+        self.message = spec.get("message", spec["alert"])
+        self.predicate = _compile_predicate(spec)
+        self.hits = 0
+        self.evaluations = 0
+        self.eval_ns = 0
+
+    def format_message(self, pkt: Dict) -> str:
+        return self.message.format_map(defaultdict(lambda: "-", pkt))
+
+
+class RuleEngine:
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.load(config or DEFAULT_RULES)
+
+    def load(self, config: Dict[str, Any]):
+        rules = [CompiledRule(spec) for spec in config.get("rules", []) if spec.get("enabled", True)]
+        thresholds = dict(DEFAULT_RULES["thresholds"])
+        thresholds.update(config.get("thresholds", {}))
+        # swap both at once so concurrent evaluations see one consistent set
+        self.rules, self.thresholds = rules, thresholds
+        self.loaded_at = time.time()
+
+    def match(self, pkt: Dict) -> Optional[Tuple[CompiledRule, str]]:
+        """Return the first matching rule and its rendered message."""
+        for rule in self.rules:
+            start = time.perf_counter_ns()
+            hit = rule.predicate(pkt)
+            rule.eval_ns += time.perf_counter_ns() - start
+            rule.evaluations += 1
+            if hit:
+                rule.hits += 1
+                return rule, rule.format_message(pkt)
+        return None
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [{
+            "name": r.name,
+            "alert": r.alert_type,
+            "hits": r.hits,
+            "evaluations": r.evaluations,
+            "avg_eval_ns": round(r.eval_ns / r.evaluations, 1) if r.evaluations else None,
+        } for r in self.rules]
+
+
+def load_rule_config(path: Optional[str] = RULES_PATH) -> Dict[str, Any]:
+    if not path:
+        return copy.deepcopy(DEFAULT_RULES)
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+_reload_lock = Lock()
+
+
+def reload_rules(path: Optional[str] = RULES_PATH):
+    with _reload_lock:
+        rule_engine.load(load_rule_config(path))
+
+
+rule_engine = RuleEngine(load_rule_config())
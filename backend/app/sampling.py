@@ -0,0 +1,147 @@
+"""Adaptive packet sampling (load shedding) for the capture paths.
+
+Each sniff callback asks its AdaptiveSampler for a packet's weight before
+decoding it: 0 means shed it, otherwise the number of packets it stands
+for. Sampling is off (weight 1) until the measured packet rate passes
+SAMPLING_RATE_PPS or the capture queue fills past SAMPLING_QUEUE_HIGH; from
+there the sampler keeps 1 in N packets, doubling N every SAMPLING_INTERVAL
+while overloaded (up to SAMPLING_MAX_N) and halving it again once the load
+drops below half the thresholds.
+
+* ``count`` keeps every Nth packet.
+* ``flow`` (default) keeps the flows whose direction-independent 5-tuple
+  hashes to 0 mod N, so kept flows stay complete and, N being a power of
+  two, a flow kept at 1/2N was also kept at 1/N. The hash is keyed on the
+  tuple's bytes rather than Python's per-process salted hash(), so every
+  process (and every sensor) keeps the same flows.
+
+TCP SYNs (without ACK) and DNS are never shed - the scan and DNS
+detectors count them and would be blinded by sampling.
+
+A sampler has a single caller (its sniff thread), so it takes no locks.
+"""
+from typing import Dict
+import os
+import time
+
+from . import capture, metrics
+from .sketches import hash64
+
+SAMPLING_MODE = os.getenv("SAMPLING_MODE", "adaptive").lower()  # adaptive | off
+SAMPLING_METHOD = os.getenv("SAMPLING_METHOD", "flow").lower()  # flow | count
+SAMPLING_RATE_PPS = float(os.getenv("SAMPLING_RATE_PPS", 5000))
+SAMPLING_QUEUE_HIGH = float(os.getenv("SAMPLING_QUEUE_HIGH", 0.5))  # fraction of the queue
+SAMPLING_MAX_N = int(os.getenv("SAMPLING_MAX_N", 64))
+SAMPLING_INTERVAL = float(os.getenv("SAMPLING_INTERVAL", 1.0))
+
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+DNS_PORT = 53
+
+
+def classify(pkt):
+    """(critical, flow hash) for a scapy packet, read off its layers without a full decode."""
+    if capture.IP is None:
+        capture.load_scapy()
+    ip = pkt.getlayer(capture.IP)
+    if ip is None:
+        return True, 0  # not ours to shed; the pipeline ignores non-IP anyway
+    sport = dport = 0
+    tcp = pkt.getlayer(capture.TCP)
+    if tcp is not None:
+        if int(tcp.flags) & (TCP_SYN | TCP_ACK) == TCP_SYN:
+            return True, 0
+        sport, dport = tcp.sport, tcp.dport
+    else:
+        udp = pkt.getlayer(capture.UDP)
+        if udp is not None:
+            sport, dport = udp.sport, udp.dport
+            if sport == DNS_PORT or dport == DNS_PORT:
+                return True, 0
+    a, b = (ip.src, sport), (ip.dst, dport)
+    if b < a:
+        a, b = b, a
+    return False, hash64(f"{ip.proto}|{a[0]}|{a[1]}|{b[0]}|{b[1]}")
+
+
+class AdaptiveSampler:
+    def __init__(self, name: str, mode: str = SAMPLING_MODE, method: str = SAMPLING_METHOD,
+                 rate_limit: float = SAMPLING_RATE_PPS, queue_high: float = SAMPLING_QUEUE_HIGH,
+                 max_n: int = SAMPLING_MAX_N, interval: float = SAMPLING_INTERVAL):
+        self.name = name
+        self.enabled = mode != "off"
+        self.method = method
+        self.rate_limit = rate_limit
+        self.queue_high = queue_high
+        self.max_n = max(1, max_n)
+        self.interval = interval
+        self.n = 1
+        self.rate = 0.0
+        self.offered = 0
+        self.shed = 0
+        self.critical = 0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._nth = 0
+
+    @property
+    def ratio(self) -> float:
+        return 1.0 / self.n
+
+    def _adjust(self, now: float, queue_fill: float):
+        self.rate = self._window_count / (now - self._window_start)
+        self._window_start = now
+        self._window_count = 0
+        if self.rate > self.rate_limit or queue_fill > self.queue_high:
+            self.n = min(self.max_n, self.n * 2)
+        elif self.rate < self.rate_limit / 2 and queue_fill < self.queue_high / 2:
+            self.n = max(1, self.n // 2)
+
+    def weight(self, pkt, queue_fill: float = 0.0) -> int:
+        """0 to shed ``pkt``, else how many packets it represents."""
+        self.offered += 1
+        if not self.enabled:
+            return 1
+        self._window_count += 1
+        now = time.monotonic()
+        if now - self._window_start >= self.interval:
+            self._adjust(now, queue_fill)
+        n = self.n
+        if n == 1:
+            return 1
+
+        critical, flow_hash = classify(pkt)
+        if critical:
+            self.critical += 1
+            return 1
+        if self.method == "count":
+            self._nth += 1
+            keep = self._nth % n == 0
+        else:
+            keep = flow_hash % n == 0
+        if keep:
+            return n
+        self.shed += 1
+        return 0
+
+    def status(self) -> Dict:
+        return {
+            "mode": "adaptive" if self.enabled else "off",
+            "method": self.method,
+            "active": self.n > 1,
+            "ratio": self.ratio,
+            "one_in": self.n,
+            "rate_pps": round(self.rate, 1),
+            "shed": self.shed,
+        }
+
+
+# One per capture path: the packet buffer sniffer and live alert capture
+buffer_sampler = AdaptiveSampler("traffic")
+live_sampler = AdaptiveSampler("alerts")
+_samplers = (buffer_sampler, live_sampler)
+
+metrics.Gauge("nta_sampling_ratio", "Fraction of non-critical packets kept, per capture path", ["path"],
+              fn=lambda: {(s.name,): s.ratio for s in _samplers})
+metrics.Counter("nta_sampling_shed_total", "Packets shed by adaptive sampling, per capture path", ["path"],
+                fn=lambda: {(s.name,): s.shed for s in _samplers})
@@ -0,0 +1,147 @@
+"""Windowed port-scan detection with fixed-size cardinality sketches.
+
+Three views of "distinct things touched in the last SCAN_WINDOW_SECONDS":
+
+* vertical   - distinct destination ports per source
+* horizontal - distinct destination hosts per source
+* distributed - distinct destination ports per destination, which catches
+  a scan spread over many sources that each stay under the per-source limit
+
+Each key holds WindowedHyperLogLog sketches (SCAN_WINDOW_SLICES slices of
+2^p one-byte registers, p chosen from SCAN_SKETCH_ERROR), so memory per key
+is fixed no matter how many ports or hosts it touches. Keys are kept in an
+LRU capped at SCAN_MAX_KEYS.
+"""
+from typing import Dict, List, Optional
+from collections import OrderedDict
+from threading import Lock
+import os
+import time
+
+from . import metrics
+from .rules import RuleEngine, rule_engine
+from .sketches import WindowedHyperLogLog, precision_for_error
+
+SCAN_WINDOW_SECONDS = float(os.getenv("SCAN_WINDOW_SECONDS", 60))
+SCAN_WINDOW_SLICES = int(os.getenv("SCAN_WINDOW_SLICES", 4))
+SCAN_SKETCH_ERROR = float(os.getenv("SCAN_SKETCH_ERROR", 0.13))
+SCAN_MAX_KEYS = int(os.getenv("SCAN_MAX_KEYS", 50000))
+
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+
+
+class _SourceState:
+    __slots__ = ("ports", "hosts", "port_alert", "host_alert")
+
+    def __init__(self, p: int, window: float, slices: int):
+        self.ports = WindowedHyperLogLog(p, window, slices)
+        self.hosts = WindowedHyperLogLog(p, window, slices)
+        self.port_alert = float("-inf")
+        self.host_alert = float("-inf")
+
+
+class _DestState:
+    __slots__ = ("ports", "port_alert")
+
+    def __init__(self, p: int, window: float, slices: int):
+        self.ports = WindowedHyperLogLog(p, window, slices)
+        self.port_alert = float("-inf")
+
+
+class ScanDetector:
+    def __init__(self, window: float = SCAN_WINDOW_SECONDS, slices: int = SCAN_WINDOW_SLICES,
+                 sketch_error: float = SCAN_SKETCH_ERROR, max_keys: int = SCAN_MAX_KEYS,
+                 rules: Optional[RuleEngine] = None):
+        self.rules = rules or rule_engine  # thresholds come from here
+        self.window = window
+        self.slices = slices
+        self.precision = precision_for_error(sketch_error)
+        self.max_keys = max_keys
+        self.sources: "OrderedDict[str, _SourceState]" = OrderedDict()
+        self.destinations: "OrderedDict[str, _DestState]" = OrderedDict()
+        self.lock = Lock()
+
+    def _state(self, table: OrderedDict, key: str, factory):
+        state = table.get(key)
+        if state is None:
+            state = factory(self.precision, self.window, self.slices)
+            table[key] = state
+            if len(table) > self.max_keys:
+                table.popitem(last=False)
+        else:
+            table.move_to_end(key)
+        return state
+
+    def _alert(self, kind: str, details: Dict) -> Dict:
+        return {"type": kind, "details": details, "anomaly_flag": True}
+
+    def observe(self, pkt: Dict, ts: Optional[float] = None) -> List[Dict]:
+        """Account one decoded packet; returns any scan alerts it triggers.
+
+        TCP packets only count when they open a connection (SYN without ACK),
+        so replies from a busy server aren't mistaken for a scan of its clients.
+        """
+        src, dst, dport = pkt.get("src"), pkt.get("dst"), pkt.get("dport")
+        if not (src and dst and dport):
+            return []
+        flags = pkt.get("flags")
+        if pkt.get("proto") == "TCP" and flags is not None and (flags & (TCP_SYN | TCP_ACK)) != TCP_SYN:
+            return []
+
+        ts = ts or pkt.get("ts") or time.time()
+        limits = self.rules.thresholds
+        port = str(dport)
+        alerts = []
+
+        with self.lock:
+            source = self._state(self.sources, src, _SourceState)
+            if source.ports.add(port, ts) and ts - source.port_alert >= self.window:
+                distinct = source.ports.count()
+                if distinct > limits["port_scan_ports"]:
+                    source.port_alert = ts
+                    alerts.append(self._alert("Port Scan Detected", {
+                        "src": src, "scan": "vertical", "distinct_ports": distinct,
+                        "window_seconds": self.window,
+                        "message": f"{src} touched ~{distinct} ports in {self.window:g}s",
+                    }))
+            if source.hosts.add(dst, ts) and ts - source.host_alert >= self.window:
+                distinct = source.hosts.count()
+                if distinct > limits["host_scan_hosts"]:
+                    source.host_alert = ts
+                    alerts.append(self._alert("Host Sweep Detected", {
+                        "src": src, "scan": "horizontal", "distinct_hosts": distinct,
+                        "window_seconds": self.window,
+                        "message": f"{src} touched ~{distinct} hosts in {self.window:g}s",
+                    }))
+
+            dest = self._state(self.destinations, dst, _DestState)
+            if dest.ports.add(port, ts) and ts - dest.port_alert >= self.window:
+                distinct = dest.ports.count()
+                if distinct > limits["distributed_scan_ports"]:
+                    dest.port_alert = ts
+                    alerts.append(self._alert("Distributed Port Scan", {
+                        "dst": dst, "scan": "distributed", "distinct_ports": distinct,
+                        "window_seconds": self.window,
+                        "message": f"~{distinct} ports of {dst} probed in {self.window:g}s",
+                    }))
+
+        return alerts
+
+    def stats(self) -> Dict:
+        per_key = self.slices * (1 << self.precision)
+        return {
+            "window_seconds": self.window,
+            "precision": self.precision,
+            "sources": len(self.sources),
+            "destinations": len(self.destinations),
+            "register_bytes": (2 * len(self.sources) + len(self.destinations)) * per_key,
+        }
+
+
+# Shared instance for the live capture path
+scan_detector = ScanDetector()
+
+metrics.Gauge("nta_scan_tracked_keys", "Sources and destinations tracked by the scan detector", ["table"],
+              fn=lambda: {("sources",): len(scan_detector.sources),
+                          ("destinations",): len(scan_detector.destinations)})
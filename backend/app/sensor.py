@@ -0,0 +1,181 @@
+"""Capture sensor: sniff (or replay a pcap), decode, and ship batches to a
+central instance's POST /api/ingest, which runs detection and storage.
+
+    python -m app.sensor --central http://central:8000 --sensor-id dmz-1 --iface eth0
+    python -m app.sensor --central http://127.0.0.1:8000 --sensor-id lab-1 --pcap capture.pcap --speed 10
+
+The token comes from --token or INGEST_TOKEN. Decoding happens on the
+capture thread; a sender thread encodes and POSTs sealed batches, retrying
+503s and connection errors. Batches that can't be delivered, or that
+overflow the pending queue, are dropped - their sequence numbers never
+arrive, which is how central counts loss.
+
+Only the lightweight pieces of the app are imported here (no FastAPI, DB
+or detectors), so a sensor starts quickly and needs no database.
+"""
+from typing import Dict, List, Optional
+from threading import Event, Lock, Thread
+import argparse
+import logging
+import os
+import queue
+import sys
+import time
+import uuid
+
+import requests
+
+from .capture import packet_callback as decode_packet, read_pcap
+from .wire import CONTENT_TYPE, VERSION, encode_batch
+
+logger = logging.getLogger("app.sensor")
+
+SENSOR_BATCH_SIZE = int(os.getenv("SENSOR_BATCH_SIZE", 500))
+SENSOR_FLUSH_SECONDS = float(os.getenv("SENSOR_FLUSH_SECONDS", 1.0))
+SENSOR_MAX_PENDING = int(os.getenv("SENSOR_MAX_PENDING", 100))  # sealed batches awaiting send
+SENSOR_RETRIES = int(os.getenv("SENSOR_RETRIES", 5))
+SENSOR_TIMEOUT = float(os.getenv("SENSOR_TIMEOUT", 10))
+
+
+class Sensor:
+    def __init__(self, central: str, sensor_id: str, token: str,
+                 batch_size: int = SENSOR_BATCH_SIZE, flush_seconds: float = SENSOR_FLUSH_SECONDS,
+                 max_pending: int = SENSOR_MAX_PENDING, retries: int = SENSOR_RETRIES):
+        self.url = central.rstrip("/") + "/api/ingest"
+        self.sensor_id = sensor_id
+        self.boot = uuid.uuid4().hex[:12]
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.retries = retries
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {token}", "Content-Type": CONTENT_TYPE})
+
+        self.seq = 0
+        self.records: List[Dict] = []
+        self.first_at = 0.0
+        self.lock = Lock()
+        self.pending: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self.stopping = Event()
+        self.stats = {"packets": 0, "batches_sent": 0, "batches_dropped": 0, "bytes_sent": 0, "retries": 0}
+        self.sender = Thread(target=self._send_loop, name="sensor-sender", daemon=True)
+
+    # -- capture side --
+    def add(self, pkt):
+        record = decode_packet(pkt)
+        if not record.get("src"):
+            return
+        del record["timestamp"]  # central rebuilds it from ts
+        self.stats["packets"] += 1
+        with self.lock:
+            if not self.records:
+                self.first_at = time.monotonic()
+            self.records.append(record)
+            if len(self.records) >= self.batch_size:
+                self._seal()
+
+    def _seal(self):
+        """Give the buffered records a sequence number and queue them; caller holds the lock."""
+        header = {"v": VERSION, "sensor": self.sensor_id, "boot": self.boot, "seq": self.seq,
+                  "sent_at": time.time(), "count": len(self.records)}
+        self.seq += 1
+        records, self.records = self.records, []
+        try:
+            self.pending.put_nowait((header, records))
+        except queue.Full:
+            self.stats["batches_dropped"] += 1
+            logger.warning(f"Send queue full, dropped batch {header['seq']}")
+
+    def flush(self):
+        with self.lock:
+            if self.records:
+                self._seal()
+
+    # -- sender side --
+    def _post(self, header: Dict, records: List[Dict]) -> bool:
+        data = encode_batch(header, records)
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+                time.sleep(min(2 ** (attempt - 1), 30))
+            try:
+                resp = self.session.post(self.url, data=data, timeout=SENSOR_TIMEOUT)
+            except requests.RequestException as e:
+                logger.warning(f"Batch {header['seq']} send failed: {e}")
+                continue
+            if resp.status_code in (200, 202):
+                self.stats["batches_sent"] += 1
+                self.stats["bytes_sent"] += len(data)
+                return True
+            if resp.status_code != 503:
+                logger.error(f"Batch {header['seq']} rejected: {resp.status_code} {resp.text[:200]}")
+                return False
+        return False
+
+    def _send_loop(self):
+        while True:
+            try:
+                header, records = self.pending.get(timeout=self.flush_seconds / 2)
+            except queue.Empty:
+                if self.stopping.is_set():
+                    return
+                with self.lock:
+                    stale = self.records and time.monotonic() - self.first_at >= self.flush_seconds
+                if stale:
+                    self.flush()
+                continue
+            if not self._post(header, records):
+                self.stats["batches_dropped"] += 1
+
+    def start(self):
+        self.sender.start()
+
+    def close(self, timeout: Optional[float] = None):
+        """Flush and wait for every pending batch to be sent (or given up on)."""
+        self.flush()
+        self.stopping.set()
+        self.sender.join(timeout)
+
+
+def replay(sensor: Sensor, path: str, speed: float = 0.0, loops: int = 1):
+    """Feed a pcap through the sensor; ``speed`` > 0 keeps the capture's pacing (x speed)."""
+    for pkt in read_pcap(path, speed, loops):
+        sensor.add(pkt)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--central", required=True, help="base URL of the central instance")
+    parser.add_argument("--sensor-id", default=os.getenv("SENSOR_ID") or os.uname().nodename)
+    parser.add_argument("--token", default=os.getenv("INGEST_TOKEN"))
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--iface", default=os.getenv("CAPTURE_IFACE") or None, help="interface to sniff")
+    source.add_argument("--pcap", help="replay this capture instead of sniffing")
+    parser.add_argument("--speed", type=float, default=0.0, help="pcap pacing multiplier (0 = as fast as possible)")
+    parser.add_argument("--loops", type=int, default=1, help="times to replay the pcap")
+    parser.add_argument("--batch-size", type=int, default=SENSOR_BATCH_SIZE)
+    parser.add_argument("--flush-seconds", type=float, default=SENSOR_FLUSH_SECONDS)
+    args = parser.parse_args(argv)
+    if not args.token:
+        parser.error("an ingest token is required (--token or INGEST_TOKEN)")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    sensor = Sensor(args.central, args.sensor_id, args.token, batch_size=args.batch_size,
+                    flush_seconds=args.flush_seconds)
+    sensor.start()
+    logger.info(f"Sensor {args.sensor_id} (boot {sensor.boot}) shipping to {sensor.url}")
+    try:
+        if args.pcap:
+            replay(sensor, args.pcap, args.speed, args.loops)
+        else:
+            from scapy.all import sniff
+            sniff(filter="ip", prn=sensor.add, store=False, iface=args.iface)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sensor.close()
+        logger.info(f"Sensor {args.sensor_id} done: {sensor.stats}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""Fixed-size probabilistic sketches for streaming cardinality estimates."""
+from typing import Optional, Tuple, Union
+from hashlib import blake2b
+import math
+
+# 2^-r for every possible register value, so updates never call pow()
+_INV_POW2 = [2.0 ** -r for r in range(65)]
+
+
+def hash64(item: Union[str, bytes]) -> int:
+    if isinstance(item, str):
+        item = item.encode()
+    return int.from_bytes(blake2b(item, digest_size=8).digest(), "big")
+
+
+def _estimate(m: int, harmonic_sum: float, zeros: int) -> int:
+    alpha = 0.7213 / (1 + 1.079 / m) if m >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[m]
+    estimate = alpha * m * m / harmonic_sum
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros)
+    return int(round(estimate))
+
+
+def _rank(h: int, p: int) -> Tuple[int, int]:
+    """Register index and rank (leading zeros + 1) for a 64-bit hash."""
+    rest = h & ((1 << (64 - p)) - 1)
+    return h >> (64 - p), (64 - p) - rest.bit_length() + 1
+
+
+def precision_for_error(error: float) -> int:
+    """Smallest precision whose standard error (1.04 / sqrt(2^p)) is <= error."""
+    p = math.ceil(math.log2((1.04 / error) ** 2))
+    return max(4, min(16, p))
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter in 2^p one-byte registers.
+
+    The harmonic sum and zero-register count are maintained incrementally,
+    so both add() and count() are O(1).
+    """
+
+    __slots__ = ("p", "m", "registers", "_sum", "_zeros")
+
+    def __init__(self, p: int = 8):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+        self._sum = float(self.m)
+        self._zeros = self.m
+
+    def add(self, item: Union[str, bytes]) -> bool:
+        """Add an item; returns True if the sketch changed."""
+        idx, rank = _rank(hash64(item), self.p)
+        old = self.registers[idx]
+        if rank <= old:
+            return False
+        self.registers[idx] = rank
+        self._sum += _INV_POW2[rank] - _INV_POW2[old]
+        if old == 0:
+            self._zeros -= 1
+        return True
+
+    def count(self) -> int:
+        return _estimate(self.m, self._sum, self._zeros)
+
+    def merge(self, other: "HyperLogLog"):
+        if other.p != self.p:
+            raise ValueError("Cannot merge sketches of different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        self._recount()
+
+    def clear(self):
+        self.registers = bytearray(self.m)
+        self._sum = float(self.m)
+        self._zeros = self.m
+
+    def _recount(self):
+        self._sum = sum(_INV_POW2[r] for r in self.registers)
+        self._zeros = self.registers.count(0)
+
+    def __len__(self):
+        return self.count()
+
+
+class WindowedHyperLogLog:
+    """Distinct count over a sliding time window.
+
+    The window is split into ``slices`` tumbling sub-sketches kept in one
+    bytearray; a slice is cleared when time moves past it, so the count
+    covers between (slices - 1) / slices and all of the last ``window``
+    seconds. The merged estimate is only recomputed after a register
+    actually changes or a slice expires.
+    """
+
+    __slots__ = ("p", "m", "slices", "slice_len", "registers", "_epoch", "_count")
+
+    def __init__(self, p: int = 6, window: float = 60.0, slices: int = 4):
+        self.p = p
+        self.m = 1 << p
+        self.slices = slices
+        self.slice_len = window / slices
+        self.registers = bytearray(self.m * slices)
+        self._epoch: Optional[int] = None
+        self._count = 0
+
+    def _advance(self, ts: float) -> int:
+        epoch = int(ts // self.slice_len)
+        if self._epoch is None:
+            self._epoch = epoch
+        elif epoch > self._epoch:
+            m = self.m
+            for e in range(max(self._epoch + 1, epoch - self.slices + 1), epoch + 1):
+                start = (e % self.slices) * m
+                self.registers[start:start + m] = bytes(m)
+            self._epoch = epoch
+            self._count = None
+        return self._epoch
+
+    def add(self, item: Union[str, bytes], ts: float) -> bool:
+        """Add an item seen at ``ts``; returns True if the estimate may have changed."""
+        epoch = self._advance(ts)
+        idx, rank = _rank(hash64(item), self.p)
+        pos = (epoch % self.slices) * self.m + idx
+        if rank <= self.registers[pos]:
+            return self._count is None
+        self.registers[pos] = rank
+        self._count = None
+        return True
+
+    def count(self, ts: Optional[float] = None) -> int:
+        if ts is not None:
+            self._advance(ts)
+        if self._count is None:
+            m, regs = self.m, self.registers
+            merged = list(map(max, *(regs[i * m:(i + 1) * m] for i in range(self.slices)))) \
+                if self.slices > 1 else list(regs)
+            self._count = _estimate(m, sum(_INV_POW2[r] for r in merged), merged.count(0))
+        return self._count
@@ -1,7 +1,14 @@
+from contextlib import contextmanager
 import os
+import threading
+import time
 import requests
 from dotenv import load_dotenv
 
+from . import metrics
+from .ipdb import IPDatabase
+from .ipfilter import ip_lists, INTERNAL, ALLOW, DENY
+
 # Load environment variables from .env
 load_dotenv()
 
@@ -9,9 +16,70 @@ load_dotenv()
 VIRUSTOTAL_API_KEY = os.getenv("VIRUSTOTAL_API_KEY")
 ABUSEIPDB_API_KEY = os.getenv("ABUSEIPDB_API_KEY")
 
+# Offline range datasets (CSV or compiled .ipdb); remote APIs become a fallback
+IP_GEO_DB = os.getenv("IP_GEO_DB")
+IP_ASN_DB = os.getenv("IP_ASN_DB")
+IP_INTEL_REMOTE_FALLBACK = os.getenv("IP_INTEL_REMOTE_FALLBACK", "true").lower() in ("1", "true", "yes")
+
+# "live": offline data, then the remote APIs; "cache": offline data and cached
+# answers only, never the network; "stub": no lookups at all (the CIDR lists
+# still apply). Backtests switch it per thread, see using_intel_mode().
+LIVE, CACHE, STUB = "live", "cache", "stub"
+IP_INTEL_MODE = os.getenv("IP_INTEL_MODE", LIVE).lower()
+if IP_INTEL_MODE not in (LIVE, CACHE, STUB):
+    raise ValueError(f"IP_INTEL_MODE must be one of live, cache, stub (got {IP_INTEL_MODE!r})")
+
+geo_db = IPDatabase(IP_GEO_DB) if IP_GEO_DB else None
+asn_db = IPDatabase(IP_ASN_DB) if IP_ASN_DB else None
+
+UNKNOWN_GEO = {"city": "unknown", "region": "unknown", "country": "unknown"}
+
 # Cache for geolocation lookups to avoid hitting the API too often
 _geo_cache = {}
 
+INTEL_REQUEST_SECONDS = metrics.Histogram("nta_intel_request_seconds", "Remote threat-intel request latency",
+                                          ["provider"])
+INTEL_ERRORS = metrics.Counter("nta_intel_errors_total", "Failed remote threat-intel requests", ["provider"])
+INTEL_LOOKUPS = metrics.Counter("nta_intel_lookups_total",
+                                "Enrichment lookups by how they were answered (list, offline, cache, remote)",
+                                ["kind", "source"])
+
+
+_mode_override = threading.local()
+
+
+def intel_mode() -> str:
+    return getattr(_mode_override, "mode", None) or IP_INTEL_MODE
+
+
+@contextmanager
+def using_intel_mode(mode: str):
+    """Enrich in ``mode`` on this thread only, so a backtest can't slow or skew live alerts."""
+    if mode not in (LIVE, CACHE, STUB):
+        raise ValueError(f"Unknown enrichment mode: {mode}")
+    previous = getattr(_mode_override, "mode", None)
+    _mode_override.mode = mode
+    try:
+        yield
+    finally:
+        _mode_override.mode = previous
+
+
+def _remote_get(provider: str, url: str, **kwargs) -> dict | None:
+    """GET a provider's JSON API with latency/error accounting; None on any failure."""
+    start = time.perf_counter()
+    try:
+        resp = requests.get(url, **kwargs)
+        if resp.status_code == 200:
+            return resp.json()
+        print(f"{provider} error: {resp.status_code} {resp.text[:100]}")
+    except Exception as e:
+        print(f"{provider} error: {e}")
+    finally:
+        INTEL_REQUEST_SECONDS.labels(provider).observe(time.perf_counter() - start)
+    INTEL_ERRORS.labels(provider).inc()
+    return None
+
 # VirusTotal IP reputation lookup
 
 def check_ip_virustotal(ip: str) -> dict:
@@ -21,17 +89,10 @@ def check_ip_virustotal(ip: str) -> dict:
         return {}
     url = f"https://www.virustotal.com/api/v3/ip_addresses/{ip}"
     headers = {"x-apikey": VIRUSTOTAL_API_KEY}
-    try:
-        resp = requests.get(url, headers=headers, timeout=5)
-        if resp.status_code == 200:
-            data = resp.json()
-            stats = data.get("data", {}).get("attributes", {}).get("last_analysis_stats", {})
-            return stats
-        else:
-            print(f"VirusTotal error: {resp.status_code} {resp.text[:100]}")
-    except Exception as e:
-        print(f"VT error: {e}")
-    return {}
+    data = _remote_get("virustotal", url, headers=headers, timeout=5)
+    if not data:
+        return {}
+    return data.get("data", {}).get("attributes", {}).get("last_analysis_stats", {})
 # AbuseIPDB IP reputation lookup
 
 def check_ip_abuseipdb(ip: str) -> int:
@@ -42,56 +103,78 @@ def check_ip_abuseipdb(ip: str) -> int:
     url = "https://api.abuseipdb.com/api/v2/check"
     headers = {"Accept": "application/json", "Key": ABUSEIPDB_API_KEY}
     params = {"ipAddress": ip, "maxAgeInDays": 90}
-    try:
-        resp = requests.get(url, headers=headers, params=params, timeout=5)
-        if resp.status_code == 200:
-            data = resp.json()
-            return data.get("data", {}).get("abuseConfidenceScore", 0)
-        else:
-            print(f"AbuseIPDB error: {resp.status_code} {resp.text[:100]}")
-    except Exception as e:
-        print(f"AbuseIPDB error: {e}")
-    return 0
+    data = _remote_get("abuseipdb", url, headers=headers, params=params, timeout=5)
+    if not data:
+        return 0
+    return data.get("data", {}).get("abuseConfidenceScore", 0)
 
 # Geolocation lookup
 
+def _offline_geo(ip: str) -> dict | None:
+    record = geo_db.lookup(ip) if geo_db else None
+    if not record:
+        return None
+    return {
+        "city": record.get("city", "unknown"),
+        "region": record.get("region", "unknown"),
+        "country": record.get("country") or record.get("country_name", "unknown"),
+        "latitude": record.get("latitude"),
+        "longitude": record.get("longitude"),
+        "timezone": record.get("timezone", "unknown"),
+        "org": record.get("org", "unknown"),
+    }
+
+def _offline_isp(ip: str) -> str | None:
+    record = asn_db.lookup(ip) if asn_db else None
+    if not record and geo_db:
+        record = geo_db.lookup(ip)
+    if not record or not (record.get("org") or record.get("asn")):
+        return None
+    asn = record.get("asn")
+    if asn and not str(asn).upper().startswith("AS"):
+        asn = f"AS{asn}"
+    return " ".join(p for p in (asn, record.get("org")) if p)
+
 def geolocate_ip(ip: str) -> dict:
-    """Get IP geolocation info using ipapi.co."""
+    """Get IP geolocation info from the offline dataset, falling back to ipapi.co."""
+    offline = _offline_geo(ip)
+    if offline:
+        INTEL_LOOKUPS.labels("geo", "offline").inc()
+        return offline
     if ip in _geo_cache:
+        INTEL_LOOKUPS.labels("geo", "cache").inc()
         return _geo_cache[ip]
-    try:
-        resp = requests.get(f"https://ipapi.co/{ip}/json/", timeout=4)
-        if resp.status_code == 200:
-            data = resp.json()
-            result = {
-                "city": data.get("city", "unknown"),
-                "region": data.get("region", "unknown"),
-                "country": data.get("country_name", "unknown"),
-                "latitude": data.get("latitude"),
-                "longitude": data.get("longitude"),
-                "timezone": data.get("timezone", "unknown"),
-                "org": data.get("org", "unknown"),
-            }
-            _geo_cache[ip] = result
-            return result
-        else:
-            print(f"Geo API error: {resp.status_code}")
-    except Exception as e:
-        print(f"Geo error: {e}")
-    return {"city": "unknown", "region": "unknown", "country": "unknown"}
+    if not IP_INTEL_REMOTE_FALLBACK or intel_mode() != LIVE:
+        INTEL_LOOKUPS.labels("geo", "unknown").inc()
+        return dict(UNKNOWN_GEO)
+    INTEL_LOOKUPS.labels("geo", "remote").inc()
+    data = _remote_get("ipapi", f"https://ipapi.co/{ip}/json/", timeout=4)
+    if not data:
+        return dict(UNKNOWN_GEO)
+    result = {
+        "city": data.get("city", "unknown"),
+        "region": data.get("region", "unknown"),
+        "country": data.get("country_name", "unknown"),
+        "latitude": data.get("latitude"),
+        "longitude": data.get("longitude"),
+        "timezone": data.get("timezone", "unknown"),
+        "org": data.get("org", "unknown"),
+    }
+    _geo_cache[ip] = result
+    return result
 
 def lookup_isp(ip: str) -> str:
-    """Get ISP name using ipinfo.io."""
-    try:
-        resp = requests.get(f"https://ipinfo.io/{ip}/json", timeout=3)
-        if resp.status_code == 200:
-            data = resp.json()
-            return data.get("org", "unknown")
-        else:
-            print(f"ISP API error: {resp.status_code}")
-    except Exception as e:
-        print(f"ISP error: {e}")
-    return "unknown"
+    """Get ISP name from the offline dataset, falling back to ipinfo.io."""
+    offline = _offline_isp(ip)
+    if offline:
+        INTEL_LOOKUPS.labels("isp", "offline").inc()
+        return offline
+    if not IP_INTEL_REMOTE_FALLBACK or intel_mode() != LIVE:
+        INTEL_LOOKUPS.labels("isp", "unknown").inc()
+        return "unknown"
+    INTEL_LOOKUPS.labels("isp", "remote").inc()
+    data = _remote_get("ipinfo", f"https://ipinfo.io/{ip}/json", timeout=3)
+    return data.get("org", "unknown") if data else "unknown"
 
 # Threat scoring logic
 
@@ -100,3 +183,57 @@ def compute_threat_score(vt_stats: dict, abuse_score: int) -> int:
     vt_mal = vt_stats.get("malicious", 0) + vt_stats.get("suspicious", 0) if vt_stats else 0
     score = min(100, vt_mal * 10 + abuse_score)
     return int(score)
+
+# Combined lookup used by the alert pipelines
+
+def assess_ip(ip: str) -> dict:
+    """Reputation, geo and ISP for a source, short-circuited by the CIDR lists.
+
+    Internal and allowlisted sources skip enrichment entirely; denylisted
+    sources get the maximum score without any reputation lookups.
+    Everything else depends on intel_mode().
+    """
+    mode = intel_mode()
+    listed = ip_lists.classify(ip)
+    INTEL_LOOKUPS.labels("assess", listed or ("stub" if mode == STUB else "lookup")).inc()
+    if listed in (INTERNAL, ALLOW):
+        label = "internal" if listed == INTERNAL else "allowlisted"
+        return {
+            "vt_stats": {},
+            "abuse_score": 0,
+            "geo": {"city": label, "region": label, "country": label},
+            "isp": label,
+            "threat_score": 0,
+            "ip_list": listed,
+        }
+    if listed == DENY:
+        return {
+            "vt_stats": {},
+            "abuse_score": 0,
+            "geo": _offline_geo(ip) or dict(UNKNOWN_GEO),
+            "isp": _offline_isp(ip) or "unknown",
+            "threat_score": 100,
+            "ip_list": listed,
+        }
+
+    if mode == STUB:
+        return {
+            "vt_stats": {},
+            "abuse_score": 0,
+            "geo": dict(UNKNOWN_GEO),
+            "isp": "unknown",
+            "threat_score": 0,
+            "ip_list": None,
+        }
+
+    # reputation answers aren't cached, so cache mode scores from the lists only
+    vt_stats = check_ip_virustotal(ip) if mode == LIVE else {}
+    abuse_score = check_ip_abuseipdb(ip) if mode == LIVE else 0
+    return {
+        "vt_stats": vt_stats,
+        "abuse_score": abuse_score,
+        "geo": geolocate_ip(ip),
+        "isp": lookup_isp(ip),
+        "threat_score": compute_threat_score(vt_stats, abuse_score),
+        "ip_list": None,
+    }
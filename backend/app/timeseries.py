@@ -0,0 +1,134 @@
+"""Pre-bucketed traffic counters for throughput charts.
+
+Three fixed-size rings - per second for 10 minutes, per minute for 24
+hours, per hour for 30 days - each slot holding packets, bytes and alerts
+per protocol. A slot remembers which bucket it holds, so a slot left over
+from a previous lap of the ring reads as empty and is reset on the next
+write; nothing ever has to sweep old data. Updates touch one slot per ring
+and a query walks only the buckets it returns, never packets.
+
+Fed by the capture paths (traffic.packet_callback, the ingest worker) and
+alerts.store_alert. In-memory only: the rings start empty on restart.
+"""
+from typing import Dict, List, Optional
+from threading import Lock
+import time
+
+PACKETS, BYTES, ALERTS = 0, 1, 2
+FIELDS = ("packets", "bytes", "alerts")
+PROTO_NAMES = {"1": "ICMP", "58": "ICMPv6"}
+MAX_POINTS = 1440
+# Records from a clock running ahead are counted as "now": a far-future bucket
+# would claim ring slots still holding recent data, and they'd read as empty
+FUTURE_SKEW = 2.0
+
+
+class Ring:
+    __slots__ = ("name", "step", "size", "ids", "slots")
+
+    def __init__(self, name: str, step: int, size: int):
+        self.name = name
+        self.step = step
+        self.size = size
+        self.ids = [-1] * size
+        self.slots: List[Optional[Dict[str, list]]] = [None] * size
+
+    @property
+    def span(self) -> int:
+        return self.step * self.size
+
+    def add(self, ts: float, proto: str, field: int, amount: int):
+        bucket = int(ts // self.step)
+        i = bucket % self.size
+        if self.ids[i] != bucket:
+            if bucket < self.ids[i]:
+                return  # older than what this slot now holds
+            self.ids[i] = bucket
+            self.slots[i] = {}
+        counts = self.slots[i].get(proto)
+        if counts is None:
+            counts = self.slots[i][proto] = [0, 0, 0]
+        counts[field] += amount
+
+    def get(self, bucket: int) -> Optional[Dict[str, list]]:
+        i = bucket % self.size
+        return self.slots[i] if self.ids[i] == bucket else None
+
+
+class TrafficSeries:
+    def __init__(self):
+        self.rings = [
+            Ring("second", 1, 600),
+            Ring("minute", 60, 1440),
+            Ring("hour", 3600, 720),
+        ]
+        self.by_name = {r.name: r for r in self.rings}
+        self.lock = Lock()
+
+    def _add(self, record: Dict, counts: Dict[int, int]):
+        now = time.time()
+        ts = min(record.get("ts") or now, now + FUTURE_SKEW)
+        proto = record.get("proto")
+        proto = PROTO_NAMES.get(proto, proto) if proto else "other"
+        with self.lock:
+            for ring in self.rings:
+                for field, amount in counts.items():
+                    ring.add(ts, proto, field, amount)
+
+    def observe_packet(self, record: Dict, weight: int = 1):
+        """Count one decoded packet; ``weight`` > 1 for a packet kept by sampling."""
+        self._add(record, {PACKETS: weight, BYTES: (record.get("length") or 0) * weight})
+
+    def observe_alert(self, record: Dict):
+        """Count one stored alert against the packet that raised it."""
+        self._add(record, {ALERTS: 1})
+
+    def pick_ring(self, start: float, end: float) -> Ring:
+        """Finest ring that still covers ``start`` within MAX_POINTS buckets."""
+        now = time.time()
+        for ring in self.rings:
+            if now - start <= ring.span and (end - start) / ring.step <= MAX_POINTS:
+                return ring
+        return self.rings[-1]
+
+    def query(self, start: float, end: float, resolution: str = "auto") -> Dict:
+        ring = self.pick_ring(start, end) if resolution == "auto" else self.by_name[resolution]
+        first = int(start // ring.step)
+        last = int(end // ring.step)
+        oldest = int(time.time() // ring.step) - ring.size + 1
+        first = max(first, oldest, last - MAX_POINTS + 1)
+
+        timestamps = []
+        totals = {f: [] for f in FIELDS}
+        by_proto: Dict[str, Dict[str, list]] = {}
+        with self.lock:
+            for n, bucket in enumerate(range(first, last + 1)):
+                timestamps.append(bucket * ring.step)
+                slot = ring.get(bucket) or {}
+                sums = [0, 0, 0]
+                for proto, counts in slot.items():
+                    series = by_proto.get(proto)
+                    if series is None:
+                        series = by_proto[proto] = {f: [0] * n for f in FIELDS}
+                    for k, f in enumerate(FIELDS):
+                        series[f].append(counts[k])
+                        sums[k] += counts[k]
+                for proto, series in by_proto.items():
+                    if proto not in slot:
+                        for f in FIELDS:
+                            series[f].append(0)
+                for k, f in enumerate(FIELDS):
+                    totals[f].append(sums[k])
+
+        return {
+            "resolution": ring.name,
+            "step": ring.step,
+            "start": first * ring.step,
+            "end": (last + 1) * ring.step,
+            "timestamps": timestamps,
+            **totals,
+            "by_protocol": by_proto,
+        }
+
+
+traffic_series = TrafficSeries()
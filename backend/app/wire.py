@@ -0,0 +1,85 @@
+"""Batch format shipped from sensors (app.sensor) to POST /api/ingest.
+
+A batch is a zlib-compressed run of frames, each a 4-byte big-endian
+length followed by one msgpack map. The first frame is the header,
+every other frame one decoded packet record (capture.packet_callback
+output without its datetime, which central rebuilds from ``ts``):
+
+    header = {"v": 1, "sensor": "dmz-1", "boot": "<per-process id>",
+              "seq": 41, "sent_at": 1700000000.0, "count": 500}
+
+``seq`` counts batches from 0 per sensor process (``boot``), so central
+can tell lost batches (gaps), retried ones (repeats) and restarts.
+"""
+from typing import Dict, Iterable, List, Tuple
+import struct
+import zlib
+
+import msgpack
+
+VERSION = 1
+CONTENT_TYPE = "application/x-nta-batch"
+_LENGTH = struct.Struct(">I")
+
+
+class BatchError(ValueError):
+    pass
+
+
+def encode_batch(header: Dict, records: Iterable[Dict], level: int = 6) -> bytes:
+    packer = msgpack.Packer()
+    parts = []
+    for item in (header, *records):
+        body = packer.pack(item)
+        parts.append(_LENGTH.pack(len(body)))
+        parts.append(body)
+    return zlib.compress(b"".join(parts), level)
+
+
+def decode_batch(data: bytes, max_bytes: int, max_records: int) -> Tuple[Dict, List[Dict]]:
+    """Inverse of encode_batch; refuses batches inflating past ``max_bytes``.
+
+    Raises BatchError for anything malformed, header fields included, so
+    callers can use ``sensor``, ``boot`` and ``seq`` as they are.
+    """
+    inflater = zlib.decompressobj()
+    try:
+        raw = inflater.decompress(data, max_bytes)
+    except zlib.error as e:
+        raise BatchError(f"bad compression: {e}")
+    if inflater.unconsumed_tail:
+        raise BatchError(f"batch inflates past {max_bytes} bytes")
+    if not inflater.eof:
+        raise BatchError("truncated batch")
+
+    frames = []
+    offset = 0
+    while offset < len(raw):
+        if offset + _LENGTH.size > len(raw):
+            raise BatchError("truncated frame header")
+        (length,) = _LENGTH.unpack_from(raw, offset)
+        offset += _LENGTH.size
+        if offset + length > len(raw):
+            raise BatchError("truncated frame")
+        try:
+            frames.append(msgpack.unpackb(raw[offset:offset + length]))
+        except Exception as e:
+            raise BatchError(f"bad frame: {e}")
+        offset += length
+        if len(frames) > max_records + 1:
+            raise BatchError(f"more than {max_records} records")
+
+    if not frames or not isinstance(frames[0], dict):
+        raise BatchError("missing header")
+    header, records = frames[0], frames[1:]
+    if header.get("v") != VERSION:
+        raise BatchError(f"unsupported batch version {header.get('v')!r}")
+    for key in ("sensor", "boot"):
+        if not isinstance(header.get(key), str) or not header[key]:
+            raise BatchError(f"header {key!r} must be a non-empty string")
+    seq = header.get("seq")
+    if not isinstance(seq, int) or isinstance(seq, bool) or seq < 0:
+        raise BatchError("header 'seq' must be a non-negative integer")
+    if not all(isinstance(r, dict) for r in records):
+        raise BatchError("records must be maps")
+    return header, records
@@ -0,0 +1,117 @@
+"""Concurrency benchmark: latency percentiles with N simultaneous clients.
+
+Usage (against a running backend):
+
+    python bench/concurrency.py --url http://localhost:8000/api/alerts/ --clients 200 --requests 20
+
+Each client holds one keep-alive connection and issues its requests back
+to back; the report covers every request from every client. The client is a
+bare asyncio HTTP/1.1 loop so the load generator itself stays out of the
+measurement.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def build_request(url, headers):
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    lines = [f"GET {path} HTTP/1.1", f"Host: {parts.netloc}", "Connection: keep-alive"]
+    lines += [f"{k}: {v}" for k, v in headers.items()]
+    return parts.hostname, parts.port or 80, ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    status = int(status_line.split()[1])
+    headers = {}
+    for line in header_lines:
+        if ":" in line:
+            k, v = line.split(":", 1)
+            headers[k.strip().lower()] = v.strip()
+    if "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status
+
+
+async def client(host, port, request, n, latencies, errors):
+    reader = writer = None
+    for _ in range(n):
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            status = await read_response(reader)
+            if status >= 400:
+                errors.append(status)
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+        latencies.append((time.perf_counter() - start) * 1000)
+    if writer is not None:
+        writer.close()
+
+
+async def run(url, clients, requests_per_client, token=None):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    host, port, request = build_request(url, headers)
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(host, port, request, requests_per_client, latencies, errors)
+        for _ in range(clients)
+    ))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "url": url,
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2) if latencies else 0.0,
+        "mean_ms": round(statistics.mean(latencies), 2) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000/api/alerts/")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--token", default=None, help="bearer token for protected routes")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args.url, args.clients, args.requests, args.token)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Synthetic pcap generator for the pipeline benchmarks.
+
+Writes a reproducible capture (fixed --seed) from a weighted mix of traffic
+profiles:
+
+    normal   - web/ssh/dns-port TCP and UDP between a pool of clients and servers
+    scan     - SYNs from one scanner to sequential ports on one host
+    burst    - back-to-back packets from a few noisy sources
+    dns      - queries for normal names, long random (tunnel-like) subdomains
+               and generated-looking domains
+    entropy  - UDP datagrams carrying random (high-entropy) payloads
+    sources  - one-off packets from a very large pool of distinct sources
+
+    python bench/gen_pcap.py bench/data/mixed.pcap --packets 20000 \\
+        --mix normal=0.4,scan=0.15,burst=0.15,dns=0.15,entropy=0.1,sources=0.05
+"""
+import argparse
+import os
+import random
+import string
+import sys
+from typing import Dict
+
+from scapy.all import DNS, DNSQR, IP, TCP, UDP, Ether, Raw, wrpcap
+
+DEFAULT_MIX = "normal=0.4,scan=0.15,burst=0.15,dns=0.15,entropy=0.1,sources=0.05"
+SERVER_PORTS = [80, 443, 22, 53]
+WORDS = ["mail", "api", "cdn", "static", "login", "news", "shop", "video", "docs", "app"]
+DOMAINS = ["example.com", "wikipedia.org", "github.com", "python.org", "bbc.co.uk"]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(PROFILES)
+    if unknown:
+        raise ValueError(f"Unknown traffic profile(s): {', '.join(sorted(unknown))}")
+    return mix
+
+
+class Generator:
+    def __init__(self, rng: random.Random, sources: int, start: float):
+        self.rng = rng
+        self.clients = [f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+                        for _ in range(max(1, sources // 10))]
+        self.servers = [f"192.0.2.{i}" for i in range(1, 21)]
+        self.scanner = "198.51.100.66"
+        self.scan_target = self.servers[0]
+        self.scan_port = 1
+        self.noisy = [f"203.0.113.{i}" for i in range(1, 4)]
+        self.now = start
+
+    def _frame(self, layer):
+        # fixed MACs, otherwise scapy ARPs for every destination
+        pkt = Ether(src="02:00:00:00:00:01", dst="02:00:00:00:00:02") / layer
+        pkt.time = self.now
+        return pkt
+
+    def normal(self):
+        r = self.rng
+        src, dst = r.choice(self.clients), r.choice(self.servers)
+        dport = r.choice(SERVER_PORTS)
+        payload = Raw(b"GET / HTTP/1.1\r\nHost: example.com\r\n\r\n"[: r.randrange(0, 40)])
+        if r.random() < 0.8:
+            layer = IP(src=src, dst=dst) / TCP(sport=r.randrange(1024, 65535), dport=dport, flags="PA") / payload
+        else:
+            layer = IP(src=src, dst=dst) / UDP(sport=r.randrange(1024, 65535), dport=dport) / payload
+        return self._frame(layer)
+
+    def scan(self):
+        self.scan_port = self.scan_port % 65535 + 1
+        return self._frame(IP(src=self.scanner, dst=self.scan_target) /
+                           TCP(sport=40000, dport=self.scan_port, flags="S"))
+
+    def burst(self):
+        r = self.rng
+        return self._frame(IP(src=r.choice(self.noisy), dst=r.choice(self.servers)) /
+                           TCP(sport=r.randrange(1024, 65535), dport=443, flags="PA") / Raw(b"x" * 64))
+
+    def dns(self):
+        r = self.rng
+        kind = r.random()
+        if kind < 0.5:
+            name = f"{r.choice(WORDS)}.{r.choice(DOMAINS)}"
+        elif kind < 0.8:
+            label = "".join(r.choices(string.ascii_lowercase + string.digits, k=r.randrange(20, 50)))
+            name = f"{label}.tunnel-example.net"
+        else:
+            name = "".join(r.choices("bcdfghjklmnpqrstvwxz", k=r.randrange(10, 16))) + ".com"
+        return self._frame(IP(src=r.choice(self.clients), dst="192.0.2.53") /
+                           UDP(sport=r.randrange(1024, 65535), dport=53) /
+                           DNS(rd=1, qd=DNSQR(qname=name)))
+
+    def entropy(self):
+        r = self.rng
+        payload = r.randbytes(r.randrange(64, 512))
+        return self._frame(IP(src=r.choice(self.clients), dst=r.choice(self.servers)) /
+                           UDP(sport=r.randrange(1024, 65535), dport=r.randrange(1024, 65535)) / Raw(payload))
+
+    def sources_(self):
+        r = self.rng
+        src = f"100.{r.randrange(64, 128)}.{r.randrange(256)}.{r.randrange(1, 255)}"
+        return self._frame(IP(src=src, dst=r.choice(self.servers)) /
+                           TCP(sport=r.randrange(1024, 65535), dport=443, flags="S"))
+
+
+PROFILES = {
+    "normal": Generator.normal,
+    "scan": Generator.scan,
+    "burst": Generator.burst,
+    "dns": Generator.dns,
+    "entropy": Generator.entropy,
+    "sources": Generator.sources_,
+}
+
+
+def generate(path: str, packets: int = 10000, mix: str = DEFAULT_MIX, sources: int = 1000,
+             pps: float = 5000.0, seed: int = 1, start: float = 1_700_000_000.0) -> int:
+    """Write ``packets`` synthetic packets to ``path``; returns the count written."""
+    rng = random.Random(seed)
+    weights = parse_mix(mix)
+    names = list(weights)
+    gen = Generator(rng, sources, start)
+    out = []
+    for _ in range(packets):
+        gen.now += rng.expovariate(pps)
+        out.append(PROFILES[rng.choices(names, weights=[weights[n] for n in names])[0]](gen))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    wrpcap(path, out)
+    return len(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out", help="pcap path to write")
+    parser.add_argument("--packets", type=int, default=10000)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="comma separated profile=weight")
+    parser.add_argument("--sources", type=int, default=1000, help="size of the client/source pool")
+    parser.add_argument("--pps", type=float, default=5000.0, help="mean packet rate for timestamps")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    n = generate(args.out, args.packets, args.mix, args.sources, args.pps, args.seed)
+    print(f"Wrote {n} packets to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
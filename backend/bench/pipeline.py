@@ -0,0 +1,317 @@
+"""Pipeline benchmark suite with a JSON baseline and regression check.
+
+Runs each hot path over a synthetic capture (see gen_pcap.py) in its own
+spawned process, so peak RSS is per case:
+
+    packet_callback    capture.packet_callback, per packet
+    packet_to_model    traffic.packet_to_model, per packet
+    detect_record      alerts.detect_record with fresh detectors, per decoded packet
+    shannon_entropy    analysis.shannon_entropy, per payload sample
+    upload_pcap        POST /api/replay/upload with the whole capture (needs tshark)
+    backtest           app.backtest over the whole capture (live detectors, stub enrichment)
+    get_alerts         GET /api/alerts/ with a warm response cache
+    get_alerts_cold    GET /api/alerts/ with the cache invalidated before every request
+
+    python bench/pipeline.py                                  # run, write bench/results.json
+    python bench/pipeline.py --save-baseline                  # ... and store it as the baseline
+    python bench/pipeline.py --baseline bench/baseline.json   # fail on regressions
+
+A case regresses when its throughput drops, or its p99 latency grows, by
+more than --threshold (default 25%) relative to the baseline, or when
+packet_callback decodes fewer DNS query names than the baseline did.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+from gen_pcap import generate  # noqa: E402
+
+DEFAULT_PCAP = os.path.join(BENCH_DIR, "data", "mixed.pcap")
+DEFAULT_OUT = os.path.join(BENCH_DIR, "results.json")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+CASES = ["packet_callback", "packet_to_model", "detect_record", "shannon_entropy",
+         "upload_pcap", "backtest", "get_alerts", "get_alerts_cold"]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def summarize(latencies_ns, items, elapsed):
+    us = [n / 1000 for n in latencies_ns]
+    return {
+        "ops": len(us),
+        "items": items,
+        "throughput": round(items / elapsed, 1) if elapsed else 0.0,
+        "p50_us": round(percentile(us, 50), 2),
+        "p95_us": round(percentile(us, 95), 2),
+        "p99_us": round(percentile(us, 99), 2),
+        "max_us": round(max(us), 2) if us else 0.0,
+        "mean_us": round(statistics.mean(us), 2) if us else 0.0,
+    }
+
+
+def timed(fn, inputs, repeat=1):
+    """Call fn on every input, ``repeat`` times; returns per-call ns and wall time."""
+    latencies = []
+    clock = time.perf_counter_ns
+    start = clock()
+    for _ in range(repeat):
+        for item in inputs:
+            t = clock()
+            fn(item)
+            latencies.append(clock() - t)
+    return latencies, (clock() - start) / 1e9
+
+
+# ------------------------------
+# Cases (each runs in a fresh process)
+# ------------------------------
+def _load_packets(pcap):
+    from scapy.all import rdpcap, IP
+    return [p for p in rdpcap(pcap) if IP in p]
+
+
+def case_packet_callback(pcap, args):
+    from app.capture import packet_callback
+    packets = _load_packets(pcap)
+    lat, elapsed = timed(packet_callback, packets, args["repeat"])
+    result = summarize(lat, len(lat), elapsed)
+    # a decode regression (e.g. scapy's DNS question layout) shows up here, not as a speed-up
+    result["dns_names"] = sum(1 for p in packets if packet_callback(p).get("dns"))
+    return result
+
+
+def case_packet_to_model(pcap, args):
+    from app.routes.traffic import packet_to_model
+    packets = _load_packets(pcap)
+    lat, elapsed = timed(packet_to_model, packets, args["repeat"])
+    return summarize(lat, len(lat), elapsed)
+
+
+def case_detect_record(pcap, args):
+    from app.analysis import BurstDetector
+    from app.capture import packet_callback
+    from app.dns_analytics import DNSAnalytics
+    from app.routes.alerts import detect_record
+    from app.rules import RuleEngine, load_rule_config
+    from app.scans import ScanDetector
+    records = [r for r in map(packet_callback, _load_packets(pcap)) if r.get("src")]
+    engine = RuleEngine(load_rule_config())
+    dns, scans, bursts = DNSAnalytics(rules=engine), ScanDetector(rules=engine), BurstDetector(rules=engine)
+    lat, elapsed = timed(lambda r: detect_record(r, engine, dns, scans, bursts), records, args["repeat"])
+    return summarize(lat, len(lat), elapsed)
+
+
+def case_shannon_entropy(pcap, args):
+    from app.capture import packet_callback
+    from app.analysis import shannon_entropy
+    samples = [r["payload_sample"] for r in map(packet_callback, _load_packets(pcap)) if r.get("payload_sample")]
+    lat, elapsed = timed(shannon_entropy, samples, args["repeat"])
+    return summarize(lat, len(lat), elapsed)
+
+
+def _client():
+    from fastapi.testclient import TestClient
+    from app.database import init_db
+    from app.main import app
+    init_db()
+    return TestClient(app)
+
+
+def case_upload_pcap(pcap, args):
+    if not shutil.which("tshark"):
+        return {"skipped": "tshark not installed (pyshark needs it)"}
+    client = _client()
+    with open(pcap, "rb") as f:
+        content = f.read()
+    lat = []
+    start = time.perf_counter_ns()
+    packets = 0
+    for _ in range(args["requests"] // 10 or 1):
+        t = time.perf_counter_ns()
+        resp = client.post("/api/replay/upload", files={"file": ("bench.pcap", content)})
+        lat.append(time.perf_counter_ns() - t)
+        resp.raise_for_status()
+        packets += len(resp.json())
+    return summarize(lat, packets, (time.perf_counter_ns() - start) / 1e9)
+
+
+def case_backtest(pcap, args):
+    from app.backtest import run_backtest
+    lat = []
+    start = time.perf_counter_ns()
+    packets = 0
+    for _ in range(args["repeat"]):
+        t = time.perf_counter_ns()
+        packets += run_backtest(pcap, max_alerts=0)["packets"]
+        lat.append(time.perf_counter_ns() - t)
+    return summarize(lat, packets, (time.perf_counter_ns() - start) / 1e9)
+
+
+def _seed_alerts(n):
+    from app.database import SessionLocal
+    from app.models import Alert
+    db = SessionLocal()
+    try:
+        db.add_all([Alert(
+            type="Unusual Port",
+            details={"src_ip": f"10.0.{i // 256 % 256}.{i % 256}", "dst_ip": "192.0.2.1",
+                     "message": f"Connection to uncommon port {1024 + i}", "severity": "low"},
+            created_at=datetime.utcnow(),
+            resolved=False,
+            threat_score=i % 10,
+            geo_info="Toronto, Ontario, Canada",
+            isp="Example ISP",
+        ) for i in range(n)])
+        db.commit()
+    finally:
+        db.close()
+
+
+def _get_alerts(args, cold):
+    from app.routes.alerts import alert_store_version
+    client = _client()
+    _seed_alerts(args["alerts"])
+
+    def get(_):
+        if cold:
+            alert_store_version.bump()
+        client.get("/api/alerts/").raise_for_status()
+
+    get(None)
+    lat, elapsed = timed(get, range(args["requests"]))
+    return summarize(lat, len(lat), elapsed)
+
+
+def case_get_alerts(pcap, args):
+    return _get_alerts(args, cold=False)
+
+
+def case_get_alerts_cold(pcap, args):
+    return _get_alerts(args, cold=True)
+
+
+def run_case(name, pcap, args):
+    """Entry point in the child process."""
+    workdir = tempfile.mkdtemp(prefix="nta-bench-")
+    os.chdir(workdir)  # uploads/ and the sqlite file land here
+    result = globals()["case_" + name](pcap, args)
+    result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+# ------------------------------
+# Baseline comparison
+# ------------------------------
+def compare(results, baseline, threshold):
+    """Return a list of human readable regressions."""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base or "skipped" in base or "skipped" in current or "error" in current:
+            continue
+        if base["throughput"] and current["throughput"] < base["throughput"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {current['throughput']} < baseline {base['throughput']}")
+        if base["p99_us"] and current["p99_us"] > base["p99_us"] * (1 + threshold):
+            regressions.append(f"{name}: p99 {current['p99_us']}us > baseline {base['p99_us']}us")
+        if current.get("dns_names", 0) < base.get("dns_names", 0):
+            regressions.append(f"{name}: decoded {current['dns_names']} DNS names < baseline {base['dns_names']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pcap", default=DEFAULT_PCAP, help="capture to use (generated if missing)")
+    parser.add_argument("--packets", type=int, default=20000, help="packets to generate")
+    parser.add_argument("--cases", default=",".join(CASES))
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the capture for per-packet cases")
+    parser.add_argument("--requests", type=int, default=200, help="HTTP requests per endpoint case")
+    parser.add_argument("--alerts", type=int, default=200, help="alerts seeded for the alert list cases")
+    parser.add_argument("--out", default=DEFAULT_OUT)
+    parser.add_argument("--baseline", help="compare against this baseline and exit 1 on regression")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also write results to {DEFAULT_BASELINE}")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(sorted(unknown))}")
+
+    pcap = os.path.abspath(args.pcap)
+    if not os.path.exists(pcap):
+        print(f"Generating {args.packets} packets into {pcap}")
+        generate(pcap, args.packets)
+
+    # children inherit this environment: throwaway DB, no remote enrichment
+    os.environ.setdefault("SECRET_KEY", "bench")
+    os.environ["DATABASE_URL"] = "sqlite:///./bench.db"
+    os.environ["IP_INTEL_REMOTE_FALLBACK"] = "false"
+    os.environ.pop("VIRUSTOTAL_API_KEY", None)
+    os.environ.pop("ABUSEIPDB_API_KEY", None)
+
+    params = {"repeat": args.repeat, "requests": args.requests, "alerts": args.alerts}
+    results = {}
+    for name in cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            try:
+                results[name] = pool.submit(run_case, name, pcap, params).result()
+            except Exception as e:
+                results[name] = {"error": f"{type(e).__name__}: {e}"}
+        print(name, json.dumps(results[name]))
+
+    report = {
+        "meta": {
+            "created": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "pcap": os.path.basename(pcap),
+            "params": params,
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(DEFAULT_BASELINE, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
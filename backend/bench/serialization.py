@@ -0,0 +1,121 @@
+"""Serialization benchmark for the alert and packet list responses.
+
+Compares the previous path (dict -> pydantic model -> response_model
+validation -> jsonable_encoder -> json.dumps) with the cached path (row
+dicts -> one TypeAdapter validation -> orjson bytes) for 200- and
+10k-item responses.
+
+    python bench/serialization.py [--repeat 20]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from app.cache import encode_json  # noqa: E402
+from app.schemas import AlertOut, PacketOut  # noqa: E402
+
+
+def make_alerts(n):
+    now = datetime.utcnow()
+    return [{
+        "id": i,
+        "type": "Unusual Port",
+        "details": {
+            "src_ip": f"10.0.{i // 256 % 256}.{i % 256}",
+            "dst_ip": "192.168.1.10",
+            "message": f"Connection to uncommon port {1024 + i % 5000}",
+            "severity": "medium",
+            "threat_score": i % 10,
+            "geo": "Toronto, Ontario, Canada",
+            "isp": "Example ISP",
+        },
+        "created_at": (now - timedelta(seconds=i)).isoformat(),
+        "resolved": False,
+        "risk_score": None,
+        "geo_info": "Toronto, Ontario, Canada",
+        "isp": "Example ISP",
+        "dns_queries": None,
+        "threat_score": i % 10,
+        "entropy_score": None,
+        "vt_report": None,
+    } for i in range(n)]
+
+
+def make_packets(n):
+    now = datetime.utcnow()
+    return [{
+        "id": 0,
+        "timestamp": now - timedelta(milliseconds=i),
+        "src": f"10.0.{i // 256 % 256}.{i % 256}",
+        "dst": "192.168.1.10",
+        "proto": "TCP",
+        "sport": 40000 + i % 20000,
+        "dport": 443,
+        "length": 60 + i % 1400,
+        "dns": None,
+        "payload_sample": "16030100a5010000a10303" if i % 3 == 0 else None,
+    } for i in range(n)]
+
+
+def legacy_alerts(rows):
+    models = [AlertOut(**r) for r in rows]
+    validated = TypeAdapter(List[AlertOut]).validate_python(models)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def legacy_packets(rows):
+    models = [PacketOut(**r) for r in rows]
+    validated = TypeAdapter(List[PacketOut]).validate_python(models)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def timeit(fn, data, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(data)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": round(statistics.median(samples), 3), "min_ms": round(min(samples), 3)}
+
+
+def run(repeat):
+    results = {}
+    cases = (("alerts", make_alerts, legacy_alerts, TypeAdapter(List[AlertOut])),
+             ("packets", make_packets, legacy_packets, TypeAdapter(List[PacketOut])))
+    for name, make, legacy, adapter in cases:
+        def cached(rows):
+            return encode_json(rows, adapter)
+
+        for n in (200, 10_000):
+            rows = make(n)
+            # both paths must produce the same document
+            assert json.loads(legacy(rows)) == json.loads(cached(rows))
+            old = timeit(legacy, rows, repeat)
+            new = timeit(cached, rows, repeat)
+            results[f"{name}_{n}"] = {
+                "legacy": old,
+                "orjson": new,
+                "speedup": round(old["median_ms"] / new["median_ms"], 1) if new["median_ms"] else None,
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
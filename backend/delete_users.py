@@ -9,7 +9,8 @@ from sqlalchemy.orm import sessionmaker
 Session = sessionmaker(bind=engine)
 session = Session()
 
-# Delete all users
+# Delete all users. A running server keeps cached principals for up to
+# PRINCIPAL_CACHE_TTL seconds (see app/auth.py), then refuses their tokens.
 session.query(User).delete()
 session.commit()
 print("All users deleted!")
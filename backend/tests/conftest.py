@@ -0,0 +1,29 @@
+"""Test environment: a throwaway SQLite database, no capture, no network.
+
+Set before any app module is imported, since they read their config at
+import time.
+"""
+import os
+import sys
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="nta-tests-")
+
+os.environ["SECRET_KEY"] = "test-secret-key-" + "x" * 40
+os.environ["DATABASE_URL"] = f"sqlite:///{_workdir}/test.db"
+os.environ["IP_INTEL_REMOTE_FALLBACK"] = "false"
+os.environ["IP_INTEL_MODE"] = "stub"
+os.environ["CAPTURE_ON_STARTUP"] = "false"
+os.environ["LIVE_ALERTS_ON_STARTUP"] = "false"
+os.environ["MAINTENANCE_ENABLED"] = "false"
+os.environ.pop("VIRUSTOTAL_API_KEY", None)
+os.environ.pop("ABUSEIPDB_API_KEY", None)
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
@@ -0,0 +1,52 @@
+import copy
+
+from app.analysis import BurstDetector
+from app.rules import DEFAULT_RULES, RuleEngine
+
+TS = 1700000000.0
+
+
+def detector(**thresholds):
+    config = copy.deepcopy(DEFAULT_RULES)
+    config["thresholds"].update({"burst_packets": 100, "burst_window": 10, **thresholds})
+    return BurstDetector(rules=RuleEngine(config))
+
+
+def send(bursts, n, start, step, src="10.0.0.66", weight=1):
+    found = []
+    for i in range(n):
+        found += bursts.observe({"src": src, "ts": start + i * step}, weight)
+    return found
+
+
+def test_steady_traffic_under_the_rate_does_not_alert():
+    bursts = detector()
+    assert send(bursts, 1000, TS, 0.2) == []  # 50 per 10s, for 200s
+
+
+def test_burst_alerts_once_per_window():
+    bursts = detector()
+    found = send(bursts, 300, TS, 0.01)
+    assert [a["type"] for a in found] == ["Traffic Burst"]
+    assert found[0]["details"]["packets"] == 101
+    # still bursting a window later: one more
+    assert len(send(bursts, 300, TS + 11, 0.01)) == 1
+
+
+def test_sliding_estimate_spans_window_edges():
+    bursts = detector()
+    assert send(bursts, 1, TS, 0) == []  # the source's windows start at TS
+    # 60 packets at the end of one window and 60 at the start of the next
+    assert send(bursts, 60, TS + 9, 0.01) == []
+    assert [a["type"] for a in send(bursts, 60, TS + 10, 0.01)] == ["Traffic Burst"]
+
+
+def test_sampled_packets_count_their_weight():
+    assert len(send(detector(), 30, TS, 0.01, weight=4)) == 1
+
+
+def test_sources_are_counted_apart_and_bounded():
+    bursts = BurstDetector(max_sources=10, rules=detector().rules)
+    for i in range(200):
+        assert bursts.observe({"src": f"10.0.{i % 50}.1", "ts": TS + i * 0.01}) == []
+    assert len(bursts.sources) == 10
@@ -0,0 +1,72 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from app import auth, models, utils
+from app.database import AsyncSessionLocal, SessionLocal, async_engine, init_db
+
+
+def make_user(username):
+    init_db()
+    with SessionLocal() as db:
+        user = models.User(username=username, password_hash="x", role="admin")
+        db.add(user)
+        db.commit()
+        return user.id
+
+
+def delete_user(user_id):
+    # as delete_users.py does: straight to the table, no invalidate_principal
+    with SessionLocal() as db:
+        db.query(models.User).filter(models.User.id == user_id).delete()
+        db.commit()
+
+
+async def resolve(user_id):
+    token = utils.create_access_token({"sub": str(user_id), "role": "admin"})
+    async with AsyncSessionLocal() as db:
+        return await auth.get_current_user(token, db)
+
+
+@pytest.fixture
+def queries():
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+
+@pytest.mark.anyio
+async def test_cache_hit_makes_no_query(queries):
+    user_id = make_user("cached-principal")
+    first = await resolve(user_id)
+    assert len(queries) == 1  # the miss loads the row
+
+    queries.clear()
+    assert await resolve(user_id) is first
+    assert queries == []
+
+
+@pytest.mark.anyio
+async def test_out_of_process_delete_is_seen_after_the_ttl():
+    user_id = make_user("deleted-principal")
+    await resolve(user_id)
+    delete_user(user_id)
+    assert (await resolve(user_id)).id == user_id  # still cached
+
+    auth.principal_cache._data[user_id] = (auth.principal_cache._data[user_id][0], 0)  # expired
+    with pytest.raises(HTTPException) as exc:
+        await resolve(user_id)
+    assert exc.value.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_invalidate_principal_drops_the_entry():
+    user_id = make_user("invalidated-principal")
+    await resolve(user_id)
+    auth.invalidate_principal(user_id)
+    assert auth.principal_cache.get(user_id) is None
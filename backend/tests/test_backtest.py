@@ -0,0 +1,94 @@
+import copy
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from scapy.all import DNS, DNSQR, IP, TCP, UDP, Ether, wrpcap
+
+from app import backtest
+from app.auth import require_admin
+from app.backtest import BacktestBusy, run_backtest
+from app.routes import admin
+from app.rules import DEFAULT_RULES
+
+START = 1700000000.0
+# the sweep below is clearly over port_scan_ports, but close enough to
+# distributed_scan_ports that a sketch estimate could go either way
+RULES = copy.deepcopy(DEFAULT_RULES)
+RULES["thresholds"]["distributed_scan_ports"] = 1000
+
+
+@pytest.fixture(scope="module")
+def pcap(tmp_path_factory):
+    """126 IP packets over 3s: a 120-port SYN sweep (also a burst), 5 HTTPS packets, one DNS query."""
+    packets = []
+    for i in range(120):
+        p = Ether() / IP(src="10.0.0.66", dst="10.0.0.1") / TCP(sport=40000 + i, dport=2000 + i, flags="S")
+        p.time = START + i * 0.01
+        packets.append(p)
+    for i in range(5):
+        p = Ether() / IP(src="10.0.0.7", dst="10.0.0.1") / TCP(sport=50000, dport=443, flags="A")
+        p.time = START + 2 + i * 0.25
+        packets.append(p)
+    p = Ether() / IP(src="10.0.0.7", dst="10.0.0.53") / UDP(sport=5353, dport=53) / \
+        DNS(qd=DNSQR(qname="x1y2.example.com"))
+    p.time = START + 3
+    packets.append(p)
+    path = tmp_path_factory.mktemp("backtest") / "known.pcap"
+    wrpcap(str(path), packets)
+    return str(path)
+
+
+def test_known_capture_gives_known_alerts(pcap):
+    result = run_backtest(pcap, rules=RULES)
+    assert (result["packets"], result["skipped"], result["errors"]) == (126, 0, 0)
+    assert result["capture_seconds"] == 3.0
+    assert result["alerts_by_type"] == {"Unusual Port": 120, "Port Scan Detected": 1, "Traffic Burst": 1,
+                                        "Suspicious DNS Query": 1}
+    assert result["alerts_total"] == len(result["alerts"]) == 123
+    assert {r["name"]: r["hits"] for r in result["rule_hits"]} == {"suspicious_dns": 1, "unusual_port": 120}
+    assert not result["time_limited"]
+    scan = next(a for a in result["alerts"] if a["type"] == "Port Scan Detected")
+    assert scan["source"] == "packet" and scan["details"]["src_ip"] == "10.0.0.66"
+    # 120 packets in 1.2s from one source is over burst_packets (100 per 10s)
+    burst = next(a for a in result["alerts"] if a["type"] == "Traffic Burst")
+    assert burst["details"]["src_ip"] == "10.0.0.66" and burst["details"]["packets"] == 101
+    assert burst["created_at"] == backtest._iso(START + 100 * 0.01)
+
+
+def test_candidate_rules_and_caps(pcap):
+    rules = copy.deepcopy(RULES)
+    rules["rules"] = []
+    result = run_backtest(pcap, rules=rules, limit=60, max_alerts=0)
+    assert result["packets"] == 60
+    assert result["alerts_by_type"] == {"Port Scan Detected": 1}
+    assert result["alerts"] == []  # listed alerts are capped, counts are not
+
+
+def test_paced_run_stops_at_max_seconds(pcap):
+    result = run_backtest(pcap, speed=1, rules=RULES, max_seconds=0.5)
+    assert result["time_limited"]
+    assert result["elapsed_seconds"] < 1.5
+    assert 0 < result["packets"] < 126
+
+
+def test_one_run_at_a_time(pcap):
+    with backtest._running:
+        with pytest.raises(BacktestBusy):
+            run_backtest(pcap)
+
+
+def test_endpoint_refuses_slow_pacing(pcap):
+    app = FastAPI()
+    app.include_router(admin.router, prefix="/api/admin")
+    app.dependency_overrides[require_admin] = lambda: None
+    client = TestClient(app)
+    with open(pcap, "rb") as f:
+        data = f.read()
+
+    response = client.post("/api/admin/backtest", params={"speed": 0.5}, files={"pcap": ("t.pcap", data)})
+    assert response.status_code == 400
+
+    response = client.post("/api/admin/backtest", files={"pcap": ("t.pcap", data)})
+    assert response.status_code == 200
+    assert response.json()["packets"] == 126
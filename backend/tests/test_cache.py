@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime
+from typing import List
+
+import orjson
+import pytest
+from pydantic import TypeAdapter, ValidationError
+
+from app.cache import ResponseCache, encode_json
+from app.schemas import AlertOut, PacketOut
+
+ALERTS = TypeAdapter(List[AlertOut])
+
+
+def alert(**overrides):
+    row = {"id": 1, "type": "Unusual Port", "details": {"src_ip": "10.0.0.1"},
+           "created_at": "2026-10-19T08:00:00.250000", "threat_score": 3}
+    row.update(overrides)
+    return row
+
+
+def test_encode_json_validates_against_the_response_model():
+    body = orjson.loads(encode_json([alert(internal="not in AlertOut")], ALERTS))
+    assert body == [{
+        "id": 1, "type": "Unusual Port", "details": {"src_ip": "10.0.0.1"},
+        "created_at": "2026-10-19T08:00:00.250000", "resolved": False, "risk_score": None,
+        "geo_info": None, "isp": None, "dns_queries": None, "threat_score": 3,
+        "entropy_score": None, "vt_report": None,
+    }]
+
+
+def test_encode_json_rejects_rows_that_do_not_fit():
+    with pytest.raises(ValidationError):
+        encode_json([alert(created_at="yesterday")], ALERTS)
+    with pytest.raises(ValidationError):
+        encode_json([{"src": "10.0.0.1"}], TypeAdapter(List[PacketOut]))
+
+
+def test_encode_json_without_adapter_passes_data_through():
+    when = datetime(2026, 10, 19, 8, 0, 0)
+    assert orjson.loads(encode_json({"at": when, 1: "x"})) == {"at": "2026-10-19T08:00:00", "1": "x"}
+
+
+def test_response_cache_validates_once_per_version():
+    cache = ResponseCache(ttl=0)
+    builds = []
+
+    def build():
+        builds.append(1)
+        return [alert()]
+
+    first = cache.get("alerts", 1, build, ALERTS)
+    assert cache.get("alerts", 1, build, ALERTS) is first
+    assert len(builds) == 1
+    assert orjson.loads(first.body)[0]["resolved"] is False
+
+    with pytest.raises(ValidationError):
+        cache.get("alerts", 2, lambda: [alert(type=None)], ALERTS)
+
+
+@pytest.mark.anyio
+async def test_concurrent_async_misses_share_one_build():
+    cache = ResponseCache(ttl=0)
+    builds = []
+
+    async def build():
+        builds.append(1)
+        await asyncio.sleep(0.01)
+        return [alert()]
+
+    entries = await asyncio.gather(*(cache.get_async("alerts", 1, build, ALERTS) for _ in range(5)))
+    assert len(builds) == 1
+    assert all(e is entries[0] for e in entries)
+    assert cache._pending == {}  # nothing left behind per key or per loop
+
+
+@pytest.mark.anyio
+async def test_failed_async_build_reaches_every_waiter():
+    cache = ResponseCache(ttl=0)
+
+    async def build():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("db down")
+
+    results = await asyncio.gather(*(cache.get_async("alerts", 1, build) for _ in range(3)),
+                                   return_exceptions=True)
+    assert [type(r) for r in results] == [RuntimeError] * 3
+    assert cache._pending == {}
@@ -0,0 +1,24 @@
+from scapy.all import DNS, DNSQR, IP, TCP, UDP, Ether, Raw
+
+from app.capture import packet_callback
+
+
+def test_dns_query_name_is_decoded():
+    # scapy >= 2.6 holds the question section as a list
+    pkt = Ether() / IP(src="10.0.0.5", dst="10.0.0.53") / UDP(sport=5353, dport=53) / \
+        DNS(rd=1, qd=DNSQR(qname="example.com"))
+    record = packet_callback(Ether(bytes(pkt)))
+    assert record["dns"] == "example.com"
+    assert (record["proto"], record["dport"]) == ("UDP", 53)
+
+
+def test_non_dns_payload_on_port_53_is_not_a_query():
+    pkt = Ether() / IP(src="10.0.0.5", dst="10.0.0.53") / UDP(sport=40000, dport=53) / Raw(b"\x00" * 3)
+    record = packet_callback(Ether(bytes(pkt)))
+    assert "dns" not in record
+    assert record["src"] == "10.0.0.5"
+
+
+def test_tcp_flags_are_kept():
+    pkt = Ether() / IP(src="10.0.0.5", dst="10.0.0.6") / TCP(sport=40000, dport=22, flags="S")
+    assert packet_callback(Ether(bytes(pkt)))["flags"] == 0x02
@@ -0,0 +1,70 @@
+import random
+import string
+
+from app.dns_analytics import DNSAnalytics, ngram_score, split_domain
+
+TS = 1700000000.0
+
+
+def tunnel_names(n, domain="t.example.net", length=40, seed=3):
+    rng = random.Random(seed)
+    alphabet = string.ascii_lowercase + string.digits
+    return ["".join(rng.choice(alphabet) for _ in range(length)) + "." + domain for _ in range(n)]
+
+
+def alert_types(dns, names, src="10.0.0.7", step=0.1):
+    found = []
+    for i, name in enumerate(names):
+        found += dns.observe(name, src, TS + i * step)
+    return [a["type"] for a in found]
+
+
+def test_split_domain():
+    assert split_domain("a.b.example.com.") == ("example.com", "a.b")
+    assert split_domain("www.bbc.co.uk") == ("bbc.co.uk", "www")
+    assert split_domain("example.com") == ("example.com", "")
+
+
+def test_long_random_subdomains_alert_once_per_window():
+    dns = DNSAnalytics()
+    assert alert_types(dns, tunnel_names(200)) == ["DNS Tunneling Suspected"]
+    # more of the same within the window doesn't repeat it
+    assert dns.observe(tunnel_names(1, seed=4)[0], "10.0.0.7", TS + 30) == []
+
+    # the next window starts over, and can alert again
+    later = []
+    for name in tunnel_names(200, seed=5):
+        later += dns.observe(name, "10.0.0.7", TS + dns.window + 1)
+    assert [a["type"] for a in later] == ["DNS Tunneling Suspected"]
+    assert later[0]["details"]["domain"] == "example.net"
+
+
+def test_busy_normal_names_do_not_alert():
+    dns = DNSAnalytics()
+    hosts = ["www", "mail", "api", "static", "images", "login", "cdn", "docs", "shop", "news"]
+    names = [f"{host}.example.com" for host in hosts] * 30
+    names += ["google.com", "wikipedia.org", "github.com", "stackoverflow.com"] * 50
+    assert alert_types(dns, names) == []
+
+
+def test_many_distinct_low_entropy_subdomains_do_not_alert():
+    # e.g. numbered hosts: lots of distinct names, nothing random about them
+    dns = DNSAnalytics()
+    assert alert_types(dns, [f"host{i}.cluster.example.com" for i in range(500)]) == []
+
+
+def test_generated_domain_alerts_and_natural_one_does_not():
+    dns = DNSAnalytics()
+    assert alert_types(dns, ["xkqzvbtwpjhmf.com", "xkqzvbtwpjhmf.com"]) == ["DGA Domain Suspected"]
+    assert alert_types(dns, ["internationalization.org", "stackoverflow.com"]) == []
+    assert ngram_score("theinterest") < 0.5 < ngram_score("xkqzvbtwpj")
+
+
+def test_tracked_domains_stay_bounded():
+    dns = DNSAnalytics(max_domains=50)
+    for i in range(1000):
+        dns.observe(f"www.site{i}.com", "10.0.0.7", TS + i)
+    assert len(dns.domains) == 50
+    # least recently queried go first
+    assert "site999.com" in dns.domains and "site0.com" not in dns.domains
+    assert dns.queries_seen == 1000
@@ -0,0 +1,125 @@
+import struct
+import zlib
+
+import msgpack
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.database import SessionLocal, init_db
+from app.routes import ingest
+from app.routes.ingest import INGEST_PROCESSED, INGEST_RECORD_ERRORS, SensorState, process_batch
+from app.wire import VERSION, BatchError, decode_batch, encode_batch
+
+TOKEN = "test-ingest-token"
+
+
+def header(seq=0, sensor="dmz-1", boot="b1", **overrides):
+    h = {"v": VERSION, "sensor": sensor, "boot": boot, "seq": seq, "sent_at": 1700000000.0, "count": 2}
+    h.update(overrides)
+    return h
+
+
+def packet(i=0):
+    return {"src": "10.0.0.7", "dst": "10.0.0.1", "proto": "TCP", "sport": 40000 + i, "dport": 443,
+            "length": 60, "flags": 0x10, "ts": 1700000000.0 + i, "dns": None, "payload_sample": None}
+
+
+def frames(*items):
+    return b"".join(struct.pack(">I", len(b)) + b for b in map(msgpack.packb, items))
+
+
+def test_round_trip():
+    records = [packet(i) for i in range(3)]
+    assert decode_batch(encode_batch(header(), records), 1 << 20, 100) == (header(), records)
+    assert decode_batch(encode_batch(header(), []), 1 << 20, 100) == (header(), [])
+
+
+@pytest.mark.parametrize("data, error", [
+    (b"not zlib at all", "bad compression"),
+    (encode_batch(header(), [packet()])[:-4], "truncated batch"),
+    (zlib.compress(frames(header())[:-3]), "truncated frame"),
+    (zlib.compress(frames(header()) + b"\x00\x00"), "truncated frame header"),
+    (zlib.compress(struct.pack(">I", 1) + b"\xc1"), "bad frame"),
+    (zlib.compress(b""), "missing header"),
+    (zlib.compress(frames(header(), "not a map")), "records must be maps"),
+    (encode_batch(header(v=2), []), "unsupported batch version"),
+])
+def test_corrupt_batches_are_refused(data, error):
+    with pytest.raises(BatchError, match=error):
+        decode_batch(data, 1 << 20, 100)
+
+
+@pytest.mark.parametrize("bad", [
+    {"seq": "7"}, {"seq": -1}, {"seq": True}, {"seq": None},
+    {"sensor": 5}, {"sensor": ""}, {"boot": None},
+])
+def test_bad_header_fields_are_refused(bad):
+    with pytest.raises(BatchError, match="header"):
+        decode_batch(encode_batch(header(**bad), []), 1 << 20, 100)
+
+
+def test_oversized_batches_are_refused():
+    # a small payload that inflates well past the limit
+    bomb = encode_batch(header(), [{"pad": "x" * 100000}])
+    assert len(bomb) < 1000
+    with pytest.raises(BatchError, match="inflates past"):
+        decode_batch(bomb, 10000, 100)
+    with pytest.raises(BatchError, match="more than 5 records"):
+        decode_batch(encode_batch(header(), [packet(i) for i in range(6)]), 1 << 20, 5)
+
+
+def test_sequence_gaps_repeats_and_restarts():
+    state = SensorState("b1")
+    for seq in (0, 1, 4, 5):  # 2 and 3 never arrive
+        assert state.check("b1", seq)
+        state.accept(seq, 10)
+    assert not state.check("b1", 4)  # a resend of one already received
+    assert (state.lost, state.duplicates, state.batches, state.records) == (2, 1, 4, 40)
+
+    # a restart starts counting again from its own first batch
+    assert state.check("b2", 0)
+    state.accept(0, 10)
+    assert state.check("b2", 1)
+    state.accept(1, 10)
+    assert (state.restarts, state.lost) == (1, 2)
+    assert state.to_dict()["loss_ratio"] == round(2 / 8, 4)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    init_db()
+    monkeypatch.setattr(ingest, "INGEST_TOKEN", TOKEN)
+    monkeypatch.setattr(ingest, "sensors", {})
+    monkeypatch.setattr(ingest, "ingest_queue", ingest.queue.Queue())
+    monkeypatch.setattr(ingest, "_ensure_worker", lambda: None)
+    app = FastAPI()
+    app.include_router(ingest.router, prefix="/api/ingest")
+    return TestClient(app, headers={"Authorization": f"Bearer {TOKEN}"})
+
+
+def test_endpoint_counts_loss_and_answers_malformed_with_400(client):
+    def post(data):
+        return client.post("/api/ingest", content=data)
+
+    assert post(encode_batch(header(0), [packet()])).json()["status"] == "queued"
+    assert post(encode_batch(header(3), [packet()])).json()["lost_batches"] == 2
+    assert post(encode_batch(header(3), [packet()])).json()["status"] == "duplicate"
+    assert post(encode_batch(header(0, boot="b2"), [packet()])).json()["lost_batches"] == 2
+    assert ingest.sensors["dmz-1"].restarts == 1
+    assert ingest.ingest_queue.qsize() == 3
+
+    for data in (encode_batch(header(seq="x"), []), encode_batch({"v": VERSION}, []), b"junk"):
+        assert post(data).status_code == 400
+    assert ingest.ingest_queue.qsize() == 3
+
+
+def test_a_bad_record_does_not_drop_the_rest_of_its_batch():
+    init_db()
+    records = [packet(0), {"src": "10.0.0.7", "ts": "not a time"}, packet(2)]
+    errors, processed = INGEST_RECORD_ERRORS.labels().value, INGEST_PROCESSED.labels().value
+    with SessionLocal() as db:
+        process_batch("dmz-1", records, db)
+    assert INGEST_RECORD_ERRORS.labels().value == errors + 1
+    assert INGEST_PROCESSED.labels().value == processed + 3
+    assert records[2]["sensor"] == "dmz-1" and "timestamp" in records[2]
@@ -0,0 +1,70 @@
+import os
+import time
+
+from app.ipdb import IPDatabase, compile_ranges, read_csv
+
+
+def write_csv(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("network,country\n")
+        for network, country in rows:
+            f.write(f"{network},{country}\n")
+
+
+def build(tmp_path, rows):
+    src = tmp_path / "ranges.csv"
+    write_csv(src, rows)
+    out = str(tmp_path / "ranges.ipdb")
+    stats = compile_ranges(read_csv(str(src)), out)
+    return IPDatabase(out, check_interval=3600), stats
+
+
+def country(db, ip):
+    found = db.lookup(ip)
+    return found and found["country"]
+
+
+def test_nested_range_is_split_around_the_narrower_one(tmp_path):
+    db, stats = build(tmp_path, [("10.0.0.0/16", "CA"), ("10.0.5.0/24", "US")])
+    assert country(db, "10.0.4.255") == "CA"
+    assert country(db, "10.0.5.0") == "US"
+    assert country(db, "10.0.5.255") == "US"
+    assert country(db, "10.0.6.0") == "CA"
+    assert country(db, "10.1.0.0") is None
+    assert stats == {"ranges": 2, "records": 3, "split": 1, "shadowed": 0}
+
+
+def test_partial_and_duplicate_overlaps(tmp_path):
+    db, stats = build(tmp_path, [
+        ("192.0.2.0/25", "A"),
+        ("192.0.2.0/25", "B"),  # exact duplicate: the first listed wins
+        ("192.0.2.0/24", "C"),
+        ("2001:db8::/32", "D"),
+        ("2001:db8:1::/48", "E"),
+    ])
+    assert country(db, "192.0.2.1") == "A"
+    assert country(db, "192.0.2.200") == "C"
+    assert country(db, "2001:db8::1") == "D"
+    assert country(db, "2001:db8:1::1") == "E"
+    assert country(db, "2001:db8:2::1") == "D"
+    assert stats["shadowed"] == 1
+    assert stats["split"] == 1
+
+
+def test_lookups_do_not_wait_for_a_reload(tmp_path):
+    src = tmp_path / "ranges.csv"
+    write_csv(src, [("10.0.0.0/8", "CA")])
+    db = IPDatabase(str(src), check_interval=3600)
+    assert country(db, "10.1.2.3") == "CA"
+
+    write_csv(src, [("10.0.0.0/8", "US")])
+    os.utime(src, (time.time() + 5, time.time() + 5))
+    db._next_check = 0
+    with db._lock:  # a reload in progress elsewhere
+        assert country(db, "10.1.2.3") == "CA"
+
+    deadline = time.monotonic() + 5
+    while country(db, "10.1.2.3") != "US" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert country(db, "10.1.2.3") == "US"
+    assert db.reloads == 2
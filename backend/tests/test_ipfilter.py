@@ -0,0 +1,126 @@
+import ipaddress
+import json
+import random
+
+import pytest
+
+from app import threat_intel
+from app.ipfilter import ALLOW, DENY, INTERNAL, PRECEDENCE, CIDRMatcher, IPLists
+
+
+def oracle(lists, ip):
+    """Longest matching prefix; on a tie the later list (by PRECEDENCE) wins."""
+    addr = ipaddress.ip_address(ip)
+    best = None
+    for label, cidrs in lists.items():
+        for cidr in cidrs:
+            net = ipaddress.ip_network(cidr, strict=False)
+            if net.version == addr.version and addr in net:
+                key = (net.prefixlen, PRECEDENCE[label])
+                if best is None or key > best[0]:
+                    best = (key, label)
+    return best and best[1]
+
+
+def test_same_prefix_in_several_lists_deny_beats_allow_beats_internal():
+    m = CIDRMatcher({INTERNAL: ["10.0.0.0/8"], ALLOW: ["10.0.0.0/8", "2001:db8::/32"],
+                     DENY: ["10.0.0.0/8"]})
+    assert m.classify("10.1.2.3") == DENY
+    assert m.classify("2001:db8::1") == ALLOW
+    assert CIDRMatcher({INTERNAL: ["192.0.2.0/24"], ALLOW: ["192.0.2.0/24"]}).classify("192.0.2.9") == ALLOW
+
+
+def test_narrower_prefix_wins_over_precedence():
+    m = CIDRMatcher({
+        INTERNAL: ["10.0.0.0/8"],
+        DENY: ["10.1.0.0/16", "2001:db8::/32"],
+        ALLOW: ["10.1.2.0/24", "10.1.2.3/32", "2001:db8:1::/48"],
+    })
+    assert m.classify("10.0.0.1") == INTERNAL
+    assert m.classify("10.1.0.1") == DENY
+    assert m.classify("10.1.2.4") == ALLOW
+    assert m.classify("10.1.3.0") == DENY
+    assert m.classify("10.2.0.0") == INTERNAL
+    assert m.classify("11.0.0.0") is None
+    assert m.classify("2001:db8::1") == DENY
+    assert m.classify("2001:db8:1::1") == ALLOW
+    assert m.classify("2001:db9::") is None
+
+
+def test_families_do_not_leak_into_each_other():
+    m = CIDRMatcher({DENY: ["::/0"], ALLOW: ["0.0.0.0/1"]})
+    assert m.classify("1.2.3.4") == ALLOW
+    assert m.classify("200.1.1.1") is None
+    assert m.classify("2001:db8::1") == DENY
+    assert m.classify("::ffff:200.1.1.1") is None  # v4-mapped is looked up as v4
+    assert m.classify("not an ip") is None
+
+
+def test_matches_a_brute_force_longest_prefix_oracle():
+    rng = random.Random(7)
+    lists = {label: [] for label in PRECEDENCE}
+    for _ in range(120):
+        if rng.random() < 0.6:
+            # v4 prefixes inside 10/8 so they overlap a lot
+            cidr = f"10.{rng.randrange(4)}.{rng.randrange(256)}.{rng.randrange(256)}/{rng.randrange(8, 33)}"
+        else:
+            cidr = f"2001:db8:{rng.randrange(4):x}::{rng.randrange(65536):x}/{rng.randrange(32, 129)}"
+        lists[rng.choice(list(PRECEDENCE))].append(cidr)
+    m = CIDRMatcher(lists)
+
+    probes = [f"10.{rng.randrange(5)}.{rng.randrange(256)}.{rng.randrange(256)}" for _ in range(1500)]
+    probes += [f"2001:db8:{rng.randrange(5):x}::{rng.randrange(65536):x}" for _ in range(500)]
+    # every prefix edge and the address either side of it
+    for cidrs in lists.values():
+        for cidr in cidrs:
+            net = ipaddress.ip_network(cidr, strict=False)
+            top = 2 ** net.max_prefixlen - 1
+            for edge in (int(net.network_address) - 1, int(net.network_address),
+                         int(net.broadcast_address), int(net.broadcast_address) + 1):
+                if 0 <= edge <= top:
+                    probes.append(str(ipaddress.ip_address(edge) if net.version == 4
+                                      else ipaddress.IPv6Address(edge)))
+    for ip in probes:
+        assert m.classify(ip) == oracle(lists, ip), ip
+
+
+@pytest.fixture
+def listed(tmp_path, monkeypatch):
+    (tmp_path / "deny.txt").write_text("198.51.100.0/24  # scanner\n\n2001:db8:bad::/48\n")
+    config = tmp_path / "lists.json"
+    config.write_text(json.dumps({"allow": ["8.8.8.8/32"], "deny": "deny.txt"}))
+    lists = IPLists(str(config), check_interval=3600)
+    monkeypatch.setattr(threat_intel, "ip_lists", lists)
+    return lists
+
+
+def test_listed_sources_skip_every_lookup(listed, monkeypatch):
+    def no_lookups(ip):
+        raise AssertionError(f"looked up {ip}")
+
+    for name in ("check_ip_virustotal", "check_ip_abuseipdb", "geolocate_ip", "lookup_isp"):
+        monkeypatch.setattr(threat_intel, name, no_lookups)
+
+    with threat_intel.using_intel_mode(threat_intel.LIVE):
+        internal = threat_intel.assess_ip("192.168.1.5")
+        allowed = threat_intel.assess_ip("8.8.8.8")
+        denied = threat_intel.assess_ip("198.51.100.7")
+        denied_v6 = threat_intel.assess_ip("2001:db8:bad::1")
+
+    assert (internal["ip_list"], internal["threat_score"], internal["isp"]) == (INTERNAL, 0, "internal")
+    assert (allowed["ip_list"], allowed["threat_score"], allowed["isp"]) == (ALLOW, 0, "allowlisted")
+    assert (denied["ip_list"], denied["threat_score"]) == (DENY, 100)
+    assert denied_v6["ip_list"] == DENY
+    assert listed.counts[DENY] == 2
+
+
+def test_unlisted_sources_are_enriched(listed, monkeypatch):
+    looked_up = []
+    monkeypatch.setattr(threat_intel, "check_ip_virustotal", lambda ip: looked_up.append(ip) or {})
+    monkeypatch.setattr(threat_intel, "check_ip_abuseipdb", lambda ip: 0)
+    monkeypatch.setattr(threat_intel, "geolocate_ip", lambda ip: dict(threat_intel.UNKNOWN_GEO))
+    monkeypatch.setattr(threat_intel, "lookup_isp", lambda ip: "unknown")
+
+    with threat_intel.using_intel_mode(threat_intel.LIVE):
+        assert threat_intel.assess_ip("9.9.9.9")["ip_list"] is None
+    assert looked_up == ["9.9.9.9"]
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from app import maintenance
+from app.database import AsyncSessionLocal, SessionLocal, init_db
+from app.maintenance import DAY, HOUR, floor_hour, prune, roll_up, rollup_watermark
+from app.models import Alert, AlertRollup
+from app.routes.alerts import get_alert_stats
+
+
+@pytest.fixture
+def db():
+    init_db()
+    session = SessionLocal()
+    session.execute(delete(Alert))
+    session.execute(delete(AlertRollup))
+    session.commit()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def add_alerts(db, *created, alert_type="Port Scan Detected", severity="high"):
+    for at in created:
+        db.add(Alert(type=alert_type, created_at=at, threat_score=5,
+                     details={"severity": severity, "src_ip": "10.0.0.1"}))
+    db.commit()
+
+
+def rollup_total(db, resolution):
+    return db.scalar(select(func.coalesce(func.sum(AlertRollup.count), 0))
+                     .where(AlertRollup.resolution == resolution))
+
+
+def test_roll_up_moves_the_watermark_and_counts_each_hour_once(db):
+    now = datetime(2026, 10, 19, 12, 30)
+    add_alerts(db, datetime(2026, 10, 19, 9, 5), datetime(2026, 10, 19, 9, 50),
+               datetime(2026, 10, 19, 11, 59), datetime(2026, 10, 19, 12, 10))
+
+    assert roll_up(db, now) == {"hours": 2, "alerts": 3}
+    # the current hour isn't complete yet
+    assert rollup_watermark(db) == datetime(2026, 10, 19, 12, 0)
+    assert (rollup_total(db, HOUR), rollup_total(db, DAY)) == (3, 3)
+
+    # nothing new behind the watermark: a second run adds nothing
+    assert roll_up(db, now) == {"hours": 0, "alerts": 0}
+    assert (rollup_total(db, HOUR), rollup_total(db, DAY)) == (3, 3)
+
+    # the next run picks up where the watermark left off, and adds to the day row
+    assert roll_up(db, now + timedelta(hours=1)) == {"hours": 1, "alerts": 1}
+    assert rollup_watermark(db) == datetime(2026, 10, 19, 13, 0)
+    assert (rollup_total(db, HOUR), rollup_total(db, DAY)) == (4, 4)
+    day_rows = db.scalars(select(AlertRollup).where(AlertRollup.resolution == DAY)).all()
+    assert [(r.bucket, r.count) for r in day_rows] == [(datetime(2026, 10, 19), 4)]
+
+
+def test_prune_only_deletes_rolled_up_alerts(db, monkeypatch):
+    monkeypatch.setattr(maintenance, "ALERT_RETENTION_DAYS", 1)
+    now = datetime(2026, 10, 19, 12, 30)
+    old = now - timedelta(days=3)
+    add_alerts(db, old, old + timedelta(minutes=5))
+
+    # not rolled up yet: retention must wait for the watermark
+    assert prune(db, now) == {"alerts": 0, "rollups": 0}
+    assert db.scalar(select(func.count()).select_from(Alert)) == 2
+
+    roll_up(db, now)
+    assert prune(db, now)["alerts"] == 2
+    assert db.scalar(select(func.count()).select_from(Alert)) == 0
+    assert rollup_total(db, DAY) == 2  # the counts outlive the rows
+
+
+@pytest.mark.anyio
+async def test_stats_do_not_double_count_rolled_up_hours(db):
+    now = datetime.utcnow()
+    this_hour = floor_hour(now)
+    add_alerts(db, this_hour - timedelta(minutes=290), this_hour - timedelta(minutes=179),
+               this_hour - timedelta(minutes=140))
+    # one rolled up hour and one still raw, on either side of the watermark
+    add_alerts(db, this_hour - timedelta(minutes=20), now - timedelta(seconds=1),
+               alert_type="DNS Tunneling Suspected", severity="medium")
+
+    async def stats(**kwargs):
+        async with AsyncSessionLocal() as session:
+            params = {"hours": 24, "group_by": "type", "limit": 20}
+            params.update(kwargs)
+            return await get_alert_stats(db=session, **params)
+
+    before = await stats()
+    assert before["rolled_up_until"] is None
+    assert before["total"] == 5
+
+    roll_up(db, now)
+    after = await stats()
+    assert after["rolled_up_until"] == this_hour.isoformat()
+    assert after["total"] == 5
+    assert dict(after["groups"]) == {"Port Scan Detected": 3, "DNS Tunneling Suspected": 2}
+    assert after["series"] == before["series"]
+
+    # daily resolution reads the day rows up to the watermark, raw after it
+    daily = await stats(hours=24 * 7)
+    assert daily["resolution"] == DAY
+    assert daily["total"] == 5
+    assert (await stats(group_by="severity"))["groups"] == [["high", 3], ["medium", 2]]
@@ -0,0 +1,48 @@
+import asyncio
+import threading
+
+import pytest
+
+from app import notifications
+from app.routes.alerts import STAGE_NOTIFY, notify_alert
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+        self.threads = []
+        self.received = asyncio.Event()
+
+    async def send_text(self, text):
+        self.threads.append(threading.current_thread())
+        self.sent.append(text)
+        self.received.set()
+
+
+@pytest.fixture
+def socket(monkeypatch):
+    ws = FakeSocket()
+    monkeypatch.setattr(notifications, "active_connections", [ws])
+    yield ws
+    notifications.bind_loop(None)
+
+
+@pytest.mark.anyio
+async def test_worker_thread_notifications_run_on_the_server_loop(socket):
+    notifications.bind_loop(asyncio.get_running_loop())
+    before = STAGE_NOTIFY.count
+
+    await asyncio.to_thread(notify_alert, "🚨 Port Scan Detected from 10.0.0.66")
+    await asyncio.wait_for(socket.received.wait(), 2)
+    await asyncio.sleep(0)  # let the done callback run
+
+    assert socket.sent == ["🚨 Port Scan Detected from 10.0.0.66"]
+    assert socket.threads == [threading.main_thread()]
+    assert STAGE_NOTIFY.count == before + 1
+
+
+def test_no_bound_loop_sends_nothing(socket):
+    before = STAGE_NOTIFY.count
+    assert notifications.notify_threadsafe("ignored") is None
+    notify_alert("ignored")
+    assert socket.sent == [] and STAGE_NOTIFY.count == before
@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.profiler import RequestTimingMiddleware, slow_requests
+
+
+def busy_a(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def busy_b(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+app = FastAPI()
+app.add_middleware(RequestTimingMiddleware, threshold_ms=50)
+
+
+@app.get("/work/{which}")
+def work(which: str):
+    (busy_a if which == "a" else busy_b)(0.4)
+    return {"which": which}
+
+
+@pytest.mark.anyio
+async def test_concurrent_slow_requests_keep_their_own_samples():
+    slow_requests.clear()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await asyncio.gather(client.get("/work/a"), client.get("/work/b"))
+
+    by_path = {r["path"]: r for r in slow_requests}
+    assert set(by_path) == {"/work/a", "/work/b"}
+    for path, own, other in (("/work/a", "busy_a", "busy_b"), ("/work/b", "busy_b", "busy_a")):
+        stacks = [s["stack"] for s in by_path[path]["stacks"]]
+        assert any(own in s for s in stacks)
+        assert not any(other in s for s in stacks)
+        assert by_path[path]["route"] == "/work/{which}"
+
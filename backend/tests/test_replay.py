@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+import pyshark
+
+from app.routes import replay
+from app.routes.replay import pyshark_pkt_to_model, pyshark_record, pyshark_tcp_flags
+from app.rules import rule_engine
+from app.scans import ScanDetector
+
+
+def tshark_packet(flags, dport):
+    # the attributes pyshark exposes for an IPv4 TCP packet
+    return SimpleNamespace(
+        ip=SimpleNamespace(src="10.0.0.9", dst="10.0.0.1", proto="6"),
+        tcp=SimpleNamespace(srcport="443", dstport=str(dport), flags=flags),
+        length="60", sniff_timestamp="1700000000.0",
+    )
+
+
+def replayed_scans(flags):
+    scans = ScanDetector()
+    found = []
+    for port in range(1000, 1200):
+        pkt = tshark_packet(flags, port)
+        found += scans.observe(pyshark_record(pkt, pyshark_pkt_to_model(pkt)))
+    return found
+
+
+def test_tshark_flags_are_parsed():
+    assert pyshark_tcp_flags(tshark_packet("0x0012", 80)) == 0x12
+    assert pyshark_tcp_flags(SimpleNamespace()) is None
+
+
+def test_server_replies_are_not_a_port_scan():
+    assert replayed_scans("0x0012") == []  # SYN-ACKs from a busy server
+    assert "Port Scan Detected" in [a["type"] for a in replayed_scans("0x0002")]
+
+
+class FakeCapture(list):
+    def close(self):
+        pass
+
+
+def test_upload_uses_its_own_detectors(monkeypatch):
+    packets = FakeCapture(tshark_packet("0x0002", port) for port in range(1000, 1200))
+    monkeypatch.setattr(pyshark, "FileCapture", lambda path, keep_packets: packets)
+    live_hits = {r.name: r.hits for r in rule_engine.rules}
+
+    _, alerts = replay._analyze_pcap("upload.pcap", None, None, None, None, None)
+
+    types = [a.type for a in alerts]
+    assert "Port Scan Detected" in types
+    assert types.count("Unusual Port") == 200
+    scan = next(a for a in alerts if a.type == "Port Scan Detected")
+    # enriched the way live alerts are
+    assert scan.details["src_ip"] == "10.0.0.9" and "city" in scan.details and scan.isp
+    assert {r.name: r.hits for r in rule_engine.rules} == live_hits
@@ -0,0 +1,35 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.database import init_db
+from app.cache import response_cache
+from app.routes import alerts
+
+app = FastAPI()
+app.include_router(alerts.router, prefix="/api/alerts")
+client = TestClient(app)
+
+
+def test_rule_stats_require_a_token():
+    assert client.get("/api/alerts/rules").status_code == 401
+    assert client.post("/api/alerts/rules/reload").status_code == 401
+
+
+def test_alert_list_etag_and_304(monkeypatch):
+    # no coalescing window, so the body is rebuilt as soon as the version moves
+    monkeypatch.setattr(response_cache, "ttl", 0)
+    init_db()
+    first = client.get("/api/alerts/")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    cached = client.get("/api/alerts/", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    assert client.post("/api/alerts/test").status_code == 200  # a write bumps the store version
+    fresh = client.get("/api/alerts/", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["etag"] != etag
+    assert any(a["type"] == "Synthetic Test Alert" for a in fresh.json())
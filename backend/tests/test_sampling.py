@@ -0,0 +1,96 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from scapy.all import DNS, DNSQR, IP, TCP, UDP
+
+from app import flows, sampling
+from app.database import SessionLocal
+from app.routes import alerts
+from app.sampling import AdaptiveSampler, classify
+
+
+def tcp(src, dst, sport, dport, flags="A"):
+    return IP(src=src, dst=dst) / TCP(sport=sport, dport=dport, flags=flags)
+
+
+def loaded(n, method="flow"):
+    """A sampler already shedding 1 in ``n``."""
+    sampler = AdaptiveSampler("test", mode="adaptive", method=method, max_n=n, interval=3600)
+    sampler.n = n
+    return sampler
+
+
+def test_idle_sampler_keeps_everything_at_weight_one():
+    sampler = AdaptiveSampler("test", mode="adaptive", rate_limit=1e9, interval=0)
+    weights = [sampler.weight(tcp("10.0.0.1", "10.0.0.2", 40000 + i, 443), queue_fill=0.0) for i in range(500)]
+    assert set(weights) == {1}
+    assert (sampler.n, sampler.shed) == (1, 0)
+
+
+def test_overload_raises_n_and_kept_packets_carry_it():
+    sampler = AdaptiveSampler("test", mode="adaptive", rate_limit=1e9, queue_high=0.5, max_n=16, interval=0)
+    weights = [sampler.weight(tcp("10.0.0.1", "10.0.0.2", 40000 + i, 443), queue_fill=0.9) for i in range(400)]
+    assert sampler.n == 16
+    kept = [w for w in weights[20:] if w]
+    assert kept and set(kept) == {16}
+    assert sampler.shed == weights.count(0)
+    # the weights of what's kept stand in for what was shed, give or take a flow
+    assert abs(sum(weights) - len(weights)) < 0.5 * len(weights)
+
+    # the queue drains: n halves back down to 1
+    for i in range(10):
+        sampler.weight(tcp("10.0.0.1", "10.0.0.2", 50000 + i, 443), queue_fill=0.0)
+    assert sampler.n == 1
+
+
+def test_flow_decisions_are_consistent_in_both_directions():
+    sampler = loaded(8)
+    for port in range(40000, 40200):
+        out = [sampler.weight(tcp("10.0.0.1", "93.184.216.34", port, 443)) for _ in range(3)]
+        back = [sampler.weight(tcp("93.184.216.34", "10.0.0.1", 443, port)) for _ in range(3)]
+        assert len(set(out + back)) == 1
+        # N is a power of two, so flows kept at 1/16 are kept at 1/8 too
+        if loaded(16).weight(tcp("10.0.0.1", "93.184.216.34", port, 443)):
+            assert out[0] == 8
+
+
+def test_syns_and_dns_are_never_shed():
+    sampler = loaded(64)
+    for port in range(300):
+        assert sampler.weight(tcp("10.0.0.66", "10.0.0.1", 40000, port, flags="S")) == 1
+        assert sampler.weight(IP(src="10.0.0.7", dst="10.0.0.53") / UDP(sport=port + 1024, dport=53) /
+                              DNS(qd=DNSQR(qname="example.com"))) == 1
+    assert sampler.shed == 0
+
+
+def test_flow_hash_is_the_same_in_every_process():
+    script = ("from scapy.all import IP, TCP; from app.sampling import classify; "
+              "print(classify(IP(src='10.0.0.1', dst='10.0.0.2') / TCP(sport=40000, dport=443, flags='A'))[1])")
+    seen = set()
+    for seed in ("1", "2"):
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        out = subprocess.run([sys.executable, "-c", script], env=env, cwd=os.path.dirname(os.path.dirname(__file__)),
+                             capture_output=True, text=True, check=True)
+        seen.add(int(out.stdout.split()[-1]))
+    assert seen == {classify(tcp("10.0.0.1", "10.0.0.2", 40000, 443))[1]}
+
+
+def test_live_capture_queues_the_weight_and_counts_it(monkeypatch):
+    monkeypatch.setattr(alerts, "live_sampler", loaded(4, method="count"))
+    monkeypatch.setattr(alerts, "capture_queue", alerts.queue.Queue())
+    table = flows.FlowTable()
+    monkeypatch.setattr(flows, "flow_table", table)
+
+    packets = [tcp("10.0.0.1", "10.0.0.2", 40000, 443) for _ in range(8)]
+    for pkt in packets:
+        alerts.enqueue_packet(pkt)
+    queued = list(alerts.capture_queue.queue)
+    assert [w for _, w in queued] == [4, 4]
+
+    with SessionLocal() as db:
+        for pkt, weight in queued:
+            alerts.process_packet(pkt, db, weight)
+    (flow,) = table.flows.values()
+    assert flow.packets_fwd + flow.packets_rev == 8  # two kept packets standing for four each
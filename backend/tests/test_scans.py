@@ -0,0 +1,73 @@
+import copy
+
+from app.rules import DEFAULT_RULES, RuleEngine
+from app.scans import TCP_ACK, TCP_SYN, ScanDetector
+
+TS = 1700000000.0
+
+
+def detector(**thresholds):
+    config = copy.deepcopy(DEFAULT_RULES)
+    config["thresholds"].update(thresholds)
+    return ScanDetector(window=60, rules=RuleEngine(config))
+
+
+def syn(src, dst, dport, ts, flags=TCP_SYN):
+    return {"src": src, "dst": dst, "dport": dport, "proto": "TCP", "flags": flags, "ts": ts}
+
+
+def sweep(scans, ports, src="10.0.0.66", dst="10.0.0.1", start=TS, step=0.01):
+    found = []
+    for i, port in enumerate(ports):
+        found += scans.observe(syn(src, dst, port, start + i * step))
+    return found
+
+
+def test_vertical_scan_over_the_threshold_alerts_once():
+    scans = detector(port_scan_ports=50, distributed_scan_ports=10000)
+    assert sweep(scans, range(1000, 1030)) == []  # well under
+
+    found = sweep(scans, range(2000, 2200))
+    assert [a["type"] for a in found] == ["Port Scan Detected"]
+    assert found[0]["details"]["src"] == "10.0.0.66"
+    assert found[0]["details"]["distinct_ports"] > 50
+
+    # still the same window: no repeat, however many more ports
+    assert sweep(scans, range(3000, 3500), start=TS + 10) == []
+    # a window later the source can alert again
+    assert [a["type"] for a in sweep(scans, range(4000, 4200), start=TS + 70)] == ["Port Scan Detected"]
+
+
+def test_repeated_ports_are_not_a_scan():
+    scans = detector(port_scan_ports=50)
+    assert sweep(scans, [22, 80, 443] * 500) == []
+
+
+def test_host_sweep_and_distributed_scan():
+    scans = detector(host_scan_hosts=50, distributed_scan_ports=100, port_scan_ports=10000)
+    found = []
+    for i in range(200):
+        found += scans.observe(syn("10.0.0.66", f"10.0.1.{i}", 445, TS + i * 0.01))
+    assert [a["type"] for a in found] == ["Host Sweep Detected"]
+
+    # 300 ports of one host from 30 sources, each touching only 10
+    found = []
+    for i in range(300):
+        found += scans.observe(syn(f"10.0.2.{i % 30}", "10.0.0.9", 5000 + i, TS + i * 0.01))
+    assert [a["type"] for a in found] == ["Distributed Port Scan"]
+    assert found[0]["details"]["dst"] == "10.0.0.9"
+
+
+def test_only_connection_attempts_count():
+    scans = detector(port_scan_ports=50)
+    replies = [syn("10.0.0.1", "10.0.0.66", port, TS, TCP_SYN | TCP_ACK) for port in range(200)]
+    assert [a for r in replies for a in scans.observe(r)] == []
+    assert scans.sources == {}
+
+
+def test_tracked_keys_stay_bounded():
+    scans = ScanDetector(max_keys=20)
+    for i in range(100):
+        scans.observe(syn(f"10.1.0.{i}", f"10.2.0.{i}", 80, TS))
+    assert len(scans.sources) == len(scans.destinations) == 20
+    assert "10.1.0.99" in scans.sources
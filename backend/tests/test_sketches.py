@@ -0,0 +1,66 @@
+import math
+
+import pytest
+
+from app.scans import SCAN_SKETCH_ERROR
+from app.dns_analytics import DNS_SKETCH_ERROR
+from app.sketches import HyperLogLog, WindowedHyperLogLog, precision_for_error
+
+
+def test_precision_for_error():
+    assert precision_for_error(0.13) == 6
+    assert precision_for_error(0.065) == 8
+    assert precision_for_error(10) == 4 and precision_for_error(0.0001) == 16
+
+
+@pytest.mark.parametrize("error", [SCAN_SKETCH_ERROR, DNS_SKETCH_ERROR])
+@pytest.mark.parametrize("n", [10, 100, 1000, 20000])
+def test_estimate_within_three_standard_errors(error, n):
+    p = precision_for_error(error)
+    bound = 3 * 1.04 / math.sqrt(1 << p)
+    assert bound <= 3 * error
+    for trial in range(5):
+        hll = HyperLogLog(p)
+        for i in range(n):
+            hll.add(f"{trial}:{i}")
+        assert abs(hll.count() - n) <= bound * n, (p, n, trial, hll.count())
+
+
+def test_duplicates_and_merge():
+    a, b = HyperLogLog(8), HyperLogLog(8)
+    for i in range(500):
+        a.add(str(i))
+        a.add(str(i))
+        b.add(str(i + 250))
+    single = a.count()
+    assert a.add("1") is False  # already counted
+    a.merge(b)
+    assert abs(a.count() - 750) <= 0.2 * 750
+    assert a.count() > single
+    with pytest.raises(ValueError):
+        a.merge(HyperLogLog(6))
+
+
+def test_window_forgets_slices_as_time_moves_on():
+    w = WindowedHyperLogLog(p=8, window=60, slices=4)  # 15s slices
+    for i in range(100):
+        w.add(f"old{i}", 0.0)
+    assert abs(w.count() - 100) <= 20
+
+    # still inside the window: both batches count
+    for i in range(100):
+        w.add(f"new{i}", 50.0)
+    assert abs(w.count() - 200) <= 40
+
+    # the first slice has rolled off, the second hasn't
+    assert abs(w.count(62.0) - 100) <= 20
+    # a whole window later nothing is left
+    assert w.count(200.0) == 0
+
+
+def test_window_count_is_cached_until_it_can_change():
+    w = WindowedHyperLogLog(p=6, window=60, slices=4)
+    assert w.add("a", 1.0) is True
+    first = w.count()
+    assert w.add("a", 2.0) is False  # same register, same slice
+    assert w.count() == first
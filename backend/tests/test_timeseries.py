@@ -0,0 +1,60 @@
+import time
+
+from app.timeseries import MAX_POINTS, TrafficSeries
+
+
+def packet(ts, proto="TCP", length=100):
+    return {"ts": ts, "proto": proto, "length": length}
+
+
+def test_auto_resolution_picks_the_finest_ring_that_fits():
+    series = TrafficSeries()
+    now = time.time()
+    assert series.query(now - 300, now)["resolution"] == "second"
+    assert series.query(now - 3600, now)["resolution"] == "minute"
+    assert series.query(now - 3 * 86400, now)["resolution"] == "hour"
+    # a short window that starts before the second ring's retention
+    assert series.query(now - 900, now - 840)["resolution"] == "minute"
+
+
+def test_query_is_clipped_to_retention_and_max_points():
+    series = TrafficSeries()
+    now = time.time()
+    result = series.query(now - 3600, now, resolution="second")
+    assert len(result["timestamps"]) == 600  # the ring only holds 10 minutes
+    assert result["start"] == result["timestamps"][0] >= now - 600
+
+    result = series.query(now - 30 * 86400, now, resolution="minute")
+    assert len(result["timestamps"]) == MAX_POINTS
+    assert result["end"] - result["step"] == result["timestamps"][-1]
+
+
+def test_protocols_are_zero_filled_across_buckets():
+    series = TrafficSeries()
+    now = int(time.time())
+    series.observe_packet(packet(now - 5, "TCP"))
+    series.observe_packet(packet(now - 3, "UDP", 60), weight=4)
+    series.observe_packet(packet(now - 1, "1"))  # ICMP by protocol number
+    series.observe_alert(packet(now - 1, "1"))
+
+    result = series.query(now - 5, now - 1, resolution="second")
+    assert result["timestamps"] == list(range(now - 5, now))
+    assert result["packets"] == [1, 0, 4, 0, 1]
+    assert result["bytes"] == [100, 0, 240, 0, 100]
+    assert result["alerts"] == [0, 0, 0, 0, 1]
+    by_proto = result["by_protocol"]
+    assert by_proto["TCP"]["packets"] == [1, 0, 0, 0, 0]
+    assert by_proto["UDP"]["packets"] == [0, 0, 4, 0, 0]
+    assert by_proto["ICMP"]["packets"] == [0, 0, 0, 0, 1]
+    assert all(len(s[f]) == 5 for s in by_proto.values() for f in ("packets", "bytes", "alerts"))
+
+
+def test_future_timestamps_do_not_wipe_recent_buckets():
+    series = TrafficSeries()
+    now = int(time.time())
+    series.observe_packet(packet(now - 2))
+    # an hour ahead would land on the slot holding now - 2 in some rings
+    series.observe_packet(packet(now + 3600 - 2))
+    result = series.query(now - 2, now - 2, resolution="second")
+    assert result["packets"] == [1]
+    assert sum(series.query(now - 10, now + 10, resolution="second")["packets"]) == 2
@@ -54,3 +54,32 @@ export async function getAlerts(token: string) {
     return [];
   }
 }
+
+// --------------------
+// Alert counts from rollups (/api/alerts/stats)
+// --------------------
+export interface AlertStats {
+  resolution: "hour" | "day";
+  group_by: string;
+  total: number;
+  groups: [string, number][];
+  series: [string, number][];
+}
+
+export async function getAlertStats(
+  token: string,
+  hours = 24,
+  groupBy: "type" | "severity" | "src" | "country" = "type"
+): Promise<AlertStats | null> {
+  try {
+    const res = await axios.get(`${BASE_URL}/stats`, {
+      headers: { Authorization: `Bearer ${token}` },
+      params: { hours, group_by: groupBy },
+      timeout: 7000,
+    });
+    return res.data;
+  } catch (err) {
+    console.error("getAlertStats error:", err);
+    return null;
+  }
+}
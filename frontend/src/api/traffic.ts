@@ -28,6 +28,32 @@ export async function getTraffic(token: string) {
   }
 }
 
+// --------------------
+// Throughput time series (pre-bucketed on the backend)
+// --------------------
+export interface TrafficTimeseries {
+  resolution: string;
+  step: number;
+  timestamps: number[];
+  packets: number[];
+  bytes: number[];
+  alerts: number[];
+}
+
+export async function getTrafficTimeseries(token: string, seconds = 600): Promise<TrafficTimeseries | null> {
+  try {
+    const res = await axios.get(`${TRAFFIC_BASE}/timeseries`, {
+      headers: { Authorization: `Bearer ${token}` },
+      params: { seconds },
+      timeout: 5000,
+    });
+    return res.data;
+  } catch (err) {
+    console.error("getTrafficTimeseries error:", err);
+    return null;
+  }
+}
+
 // --------------------
 // Replay summary
 // --------------------
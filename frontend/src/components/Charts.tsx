@@ -18,16 +18,31 @@ import {
 interface ChartsProps {
   talkerHistory: { [ip: string]: number[] };
   protocolHistory: { [proto: string]: number[] };
+  throughput?: { time: string; packets: number; alerts: number }[];
+  alertTrend?: { time: string; alerts: number }[];
+  alertTypes?: { type: string; count: number }[];
+  alertTotal?: number;
 }
 
-export default function Charts({ talkerHistory, protocolHistory }: ChartsProps) {
+export default function Charts({
+  talkerHistory,
+  protocolHistory,
+  throughput = [],
+  alertTrend = [],
+  alertTypes = [],
+  alertTotal = 0,
+}: ChartsProps) {
   const COLORS = ["#22c55e", "#3b82f6", "#f59e0b", "#ef4444", "#a855f7"];
 
-  // Line chart data (latest packet count per IP)
-  const lineData = Object.entries(talkerHistory).map(([ip, counts]) => ({
-    time: ip,
-    packets: counts && counts.length > 0 ? Number(counts[counts.length - 1]) || 0 : 0,
-  }));
+  // Line chart data: packets per second from /traffic/timeseries, falling
+  // back to the latest packet count per IP while that's empty
+  const hasThroughput = throughput.some(p => p.packets > 0);
+  const lineData = hasThroughput
+    ? throughput
+    : Object.entries(talkerHistory).map(([ip, counts]) => ({
+        time: ip,
+        packets: counts && counts.length > 0 ? Number(counts[counts.length - 1]) || 0 : 0,
+      }));
 
   // Protocol pie/bar chart data (latest count per protocol)
   const protocolData = Object.entries(protocolHistory).map(([protocol, counts]) => ({
@@ -52,7 +67,8 @@ export default function Charts({ talkerHistory, protocolHistory }: ChartsProps)
                 <XAxis dataKey="time" tick={{ fill: "#c7ffe0" }} />
                 <YAxis tick={{ fill: "#c7ffe0" }} />
                 <Tooltip contentStyle={{ backgroundColor: "#111", border: "none", color: "#fff" }} />
-                <Line type="monotone" dataKey="packets" stroke="#22c55e" strokeWidth={2} dot={{ r: 3 }} />
+                <Line type="monotone" dataKey="packets" stroke="#22c55e" strokeWidth={2} dot={hasThroughput ? false : { r: 3 }} />
+                {hasThroughput && <Line type="monotone" dataKey="alerts" stroke="#ef4444" strokeWidth={2} dot={false} />}
               </LineChart>
             </ResponsiveContainer>
           )}
@@ -111,6 +127,41 @@ export default function Charts({ talkerHistory, protocolHistory }: ChartsProps)
           )}
         </div>
       </div>
+
+      {/* Alert Trend (hourly, from /alerts/stats) */}
+      <div className="bg-hackerGray p-4 rounded-xl shadow-lg sm:col-span-2">
+        <h3 className="text-lg font-semibold text-hackerGreen mb-2 text-center">
+          Alerts, Last 24h ({alertTotal})
+        </h3>
+        <div className="min-h-[220px]">
+          {alertTrend.length === 0 ? (
+            <p className="text-center text-gray-300 mt-8">No alerts in the last 24h</p>
+          ) : (
+            <>
+              <ResponsiveContainer width="100%" height={200}>
+                <BarChart data={alertTrend}>
+                  <CartesianGrid strokeDasharray="3 3" />
+                  <XAxis dataKey="time" tick={{ fill: "#c7ffe0" }} />
+                  <YAxis allowDecimals={false} tick={{ fill: "#c7ffe0" }} />
+                  <Tooltip contentStyle={{ backgroundColor: "#111", border: "none", color: "#fff" }} />
+                  <Bar dataKey="alerts" fill="#ef4444" />
+                </BarChart>
+              </ResponsiveContainer>
+              <ul className="mt-3 grid grid-cols-1 sm:grid-cols-2 gap-1 text-white text-sm">
+                {alertTypes.slice(0, 6).map((t, idx) => (
+                  <li
+                    key={idx}
+                    className="flex justify-between bg-hackerBlack/40 rounded px-2 py-1 items-center"
+                  >
+                    <span className="truncate max-w-[200px]">{t.type}</span>
+                    <span className="text-red-400 font-bold">{t.count}</span>
+                  </li>
+                ))}
+              </ul>
+            </>
+          )}
+        </div>
+      </div>
     </div>
   );
 }
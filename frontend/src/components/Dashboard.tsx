@@ -3,10 +3,14 @@ import React, { useEffect, useState } from "react";
 import LiveTable from "./LiveTable";
 import Charts from "./Charts";
 import Alerts from "./Alerts";
-import { getReplaySummary } from "../api/traffic";
+import { getReplaySummary, getTrafficTimeseries } from "../api/traffic";
+import { getAlertStats } from "../api/alerts";
 
 type TopTalker = { ip: string; count: number };
 type Protocol = { protocol: string; count: number };
+type ThroughputPoint = { time: string; packets: number; alerts: number };
+type AlertTrendPoint = { time: string; alerts: number };
+type AlertTypeCount = { type: string; count: number };
 
 interface DashboardProps {
   token: string;
@@ -20,6 +24,37 @@ export default function Dashboard({ token, role, onLogout }: DashboardProps) {
   const [topProtocols, setTopProtocols] = useState<Protocol[]>([]);
   const [talkerHistory, setTalkerHistory] = useState<{ [ip: string]: number[] }>({});
   const [protocolHistory, setProtocolHistory] = useState<{ [proto: string]: number[] }>({});
+  const [throughput, setThroughput] = useState<ThroughputPoint[]>([]);
+  const [alertTrend, setAlertTrend] = useState<AlertTrendPoint[]>([]);
+  const [alertTypes, setAlertTypes] = useState<AlertTypeCount[]>([]);
+  const [alertTotal, setAlertTotal] = useState(0);
+
+  // Last 24h of alerts per hour and per type, served from the rollups
+  const fetchAlertStats = async () => {
+    const stats = await getAlertStats(token, 24, "type");
+    if (!stats) return;
+    setAlertTotal(stats.total);
+    setAlertTypes(stats.groups.map(([type, count]) => ({ type, count })));
+    setAlertTrend(
+      stats.series.map(([bucket, count]) => ({
+        // buckets are UTC without an offset
+        time: new Date(bucket + "Z").toLocaleTimeString([], { hour: "2-digit", minute: "2-digit" }),
+        alerts: count,
+      }))
+    );
+  };
+
+  const fetchThroughput = async () => {
+    const series = await getTrafficTimeseries(token, 600);
+    if (!series) return;
+    setThroughput(
+      series.timestamps.map((ts, i) => ({
+        time: new Date(ts * 1000).toLocaleTimeString(),
+        packets: series.packets[i],
+        alerts: series.alerts[i],
+      }))
+    );
+  };
 
   const fetchReplayData = async () => {
     setLoadingSummary(true);
@@ -71,8 +106,18 @@ export default function Dashboard({ token, role, onLogout }: DashboardProps) {
 
   useEffect(() => {
     fetchReplayData();
-    const interval = setInterval(fetchReplayData, 4000);
-    return () => clearInterval(interval);
+    fetchThroughput();
+    fetchAlertStats();
+    const interval = setInterval(() => {
+      fetchReplayData();
+      fetchThroughput();
+    }, 4000);
+    // hourly buckets move slowly; no need to poll them with the live view
+    const statsInterval = setInterval(fetchAlertStats, 30000);
+    return () => {
+      clearInterval(interval);
+      clearInterval(statsInterval);
+    };
   }, [token]);
 
   return (
@@ -104,7 +149,14 @@ export default function Dashboard({ token, role, onLogout }: DashboardProps) {
 
       {/* Charts + Network Insights */}
       <div className="grid grid-cols-1 lg:grid-cols-2 gap-6">
-        <Charts talkerHistory={talkerHistory} protocolHistory={protocolHistory} />
+        <Charts
+          talkerHistory={talkerHistory}
+          protocolHistory={protocolHistory}
+          throughput={throughput}
+          alertTrend={alertTrend}
+          alertTypes={alertTypes}
+          alertTotal={alertTotal}
+        />
 
         <div className="bg-hackerGray p-4 rounded-xl shadow-lg w-full min-h-[250px]">
           <h2 className="text-xl font-bold text-hackerGreen mb-4 text-center">Network Insights</h2>